@@ -151,3 +151,12 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# -----------------------------------
+# RECIBOS (PDF)
+# -----------------------------------
+# Procesos para renderizar recibos en paralelo y recibos por proceso (bloque)
+RECEIPT_RENDER_WORKERS = int(os.environ.get("RECEIPT_RENDER_WORKERS", os.cpu_count() or 1))
+RECEIPT_SHARD_SIZE = int(os.environ.get("RECEIPT_SHARD_SIZE", 200))
+# Tamaño máximo de la caché de recibos en MEDIA_ROOT/receipts (por tenant)
+RECEIPT_CACHE_MAX_BYTES = int(os.environ.get("RECEIPT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agua.settings')
 
 application = get_wsgi_application()
+
+# Deja listos estilos, fuentes y templates de los PDF antes de la primera petición.
+# Es solo una optimización: si falla (p. ej. falta Pango o un template), el
+# worker arranca igual y los PDF se preparan en la primera petición.
+try:
+    from apps.agua.core.pdf import warm_up
+
+    warm_up()
+except Exception:
+    logging.getLogger(__name__).exception("No se pudo precargar los recursos de los PDF")
@@ -5,3 +5,5 @@ class AguaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.agua'
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,296 @@
+# core/billing.py
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from apps.agua.models import Customer, Reading, Debt, DebtDetail
+from apps.agua.core.tariffs import TariffTable, cents_to_decimals
+from apps.agua.core.registry import get_registry
+
+# Tamaño de lote para los INSERT/UPDATE masivos
+BULK_BATCH_SIZE = 1000
+
+DEBT_DESCRIPTION = "Deuda por consumo de agua/desagüe"
+
+# Concepto de caja -> campo de la lectura que lo alimenta
+DETAIL_FIELDS = (
+    ("001", "total_water"),
+    ("002", "total_sewer"),
+    ("003", "total_fixed_charge"),
+)
+
+
+def load_detail_concepts():
+    """
+    Devuelve {code: CashConcept} para agua, desagüe y cargo fijo desde el registro del tenant.
+    """
+    registry = get_registry()
+    return {code: registry.concept(code) for code, _ in DETAIL_FIELDS}
+
+
+def build_debt_details(debt, source, concepts):
+    """
+    Arma (sin guardar) los DebtDetail de una deuda a partir de los montos
+    total_water / total_sewer / total_fixed_charge de `source`.
+    """
+    details = []
+    for code, field in DETAIL_FIELDS:
+        amount = getattr(source, field)
+        if amount > 0:
+            details.append(DebtDetail(debt=debt, concept=concepts[code], amount=amount))
+    return details
+
+
+# Campos que cambian al recalcular una lectura en cascada
+RECOMPUTED_FIELDS = [
+    "previous_reading", "consumption",
+    "total_water", "total_sewer",
+    "total_fixed_charge", "total_amount",
+]
+
+
+def sync_reading_debts(readings, batch_size=BULK_BATCH_SIZE):
+    """
+    Versión por lotes de Reading._sync_debt: crea o actualiza la deuda de cada
+    lectura y reemplaza sus detalles.
+
+    Las deudas existentes se leen en una consulta; si alguna ya está pagada se
+    lanza ValidationError antes de escribir nada.
+    """
+    if not readings:
+        return []
+
+    concepts = load_detail_concepts()
+
+    keys = [(r.customer_id, date(r.period.year, r.period.month, 1)) for r in readings]
+
+    existing = {}
+    for debt in Debt.objects.filter(
+        customer_id__in={customer_id for customer_id, _ in keys},
+        period__in={period for _, period in keys}
+    ).order_by("id"):
+        existing.setdefault((debt.customer_id, debt.period), debt)
+
+    new_debts = []
+    open_debts = []
+    for reading, (customer_id, period) in zip(readings, keys):
+
+        debt = existing.get((customer_id, period))
+
+        if debt is None:
+            new_debts.append(Debt(
+                customer_id=customer_id,
+                period=period,
+                reading=reading,
+                amount=reading.total_amount,
+                description=DEBT_DESCRIPTION,
+            ))
+            continue
+
+        if debt.paid:
+
+            # 🔒 Si la deuda ya está pagada, no se puede modificar
+            raise ValidationError(
+                f"No se puede modificar la lectura de {reading.period.strftime('%Y-%m')} porque ya está pagada."
+            )
+
+        debt.reading = reading
+        debt.amount = reading.total_amount
+        open_debts.append(debt)
+
+    with transaction.atomic():
+
+        Debt.objects.bulk_create(new_debts, batch_size=batch_size)
+
+        if open_debts:
+            Debt.objects.bulk_update(open_debts, ["reading", "amount"], batch_size=batch_size)
+            DebtDetail.objects.filter(debt_id__in=[d.id for d in open_debts]).delete()
+
+        details = []
+        for debt in new_debts + open_debts:
+            details.extend(build_debt_details(debt, debt.reading, concepts))
+
+        DebtDetail.objects.bulk_create(details, batch_size=batch_size)
+
+    return new_debts + open_debts
+
+
+def cascade_reading(reading):
+    """
+    Sincroniza la deuda de `reading` y recalcula las lecturas posteriores del
+    cliente hasta la primera pagada.
+
+    La cadena se carga en una consulta y se recalcula en memoria (cada lectura
+    toma como anterior a la que le precede en la cadena); luego se escribe con un
+    bulk_update y las deudas se actualizan con sync_reading_debts.
+    """
+    return cascade_readings([reading])
+
+
+def cascade_readings(readings):
+    """
+    cascade_reading para varias lecturas, a lo sumo una por cliente: las
+    posteriores de todos los clientes salen de una sola consulta, y se
+    escriben con un bulk_update y un sync_reading_debts para todo el lote.
+    Devuelve las lecturas posteriores recalculadas.
+    """
+    if not readings:
+        return []
+
+    by_customer = {r.customer_id: r for r in readings}
+
+    later = Reading.objects.filter(
+        customer_id__in=by_customer,
+        period__gt=min(r.period for r in readings)
+    ).order_by("customer_id", "period")
+
+    chain = []
+    previous = {}  # customer_id -> última lectura de su cadena (None si se cortó)
+    for r in later:
+
+        reading = by_customer[r.customer_id]
+        if r.period <= reading.period:
+            continue
+
+        prev = previous.get(r.customer_id, reading)
+
+        # Si ya está pagada, no continuar con la cadena
+        if prev is None or r.paid:
+            previous[r.customer_id] = None
+            continue
+
+        r.customer = reading.customer
+        r.apply_previous_reading(prev.current_reading)
+        r.calculate_total()
+        chain.append(r)
+        previous[r.customer_id] = r
+
+    with transaction.atomic():
+
+        if chain:
+            Reading.objects.bulk_update(chain, RECOMPUTED_FIELDS, batch_size=BULK_BATCH_SIZE)
+
+        sync_reading_debts(list(readings) + chain)
+
+    return chain
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def generate_flat_rate_readings(period, date_of_issue=None, date_of_due=None, date_of_cute=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Genera lecturas y deudas del periodo para todos los clientes sin medidor.
+
+    Trabaja por conjuntos: una consulta para saber qué clientes ya tienen lectura
+    o deuda pagada en el periodo, los montos se calculan en memoria con la
+    TariffTable de las categorías y Reading / Debt / DebtDetail se insertan por lotes.
+
+    Devuelve {"created", "skipped_existing", "skipped_paid"}.
+    """
+    readings_in_period = Reading.objects.filter(customer=OuterRef("pk"), period=period)
+    debts_in_period = Debt.objects.filter(customer=OuterRef("pk"), period=period)
+
+    customers = list(
+        Customer.objects.filter(has_meter=False)
+        .annotate(
+            has_reading=Exists(readings_in_period),
+            has_paid_debt=Exists(debts_in_period.filter(paid=True)),
+            open_debt_id=Subquery(debts_in_period.filter(paid=False).order_by("id").values("id")[:1]),
+        )
+        .values_list("id", "category_id", "has_reading", "has_paid_debt", "open_debt_id")
+        .order_by("id")
+    )
+
+    tariffs = TariffTable(get_registry().categories.values())
+    concepts = load_detail_concepts()
+
+    created = 0
+    skipped_existing = 0
+    skipped_paid = 0
+
+    pending = []
+    for customer_id, category_id, has_reading, has_paid_debt, open_debt_id in customers:
+
+        # Mismo orden de verificación que el flujo anterior
+        if has_reading:
+            skipped_existing += 1
+            continue
+
+        if has_paid_debt:
+            skipped_paid += 1
+            continue
+
+        pending.append((customer_id, category_id, open_debt_id))
+
+    with transaction.atomic():
+
+        for chunk in _chunks(pending, batch_size):
+
+            # Sin medidor: consumo 0, se cobra la tarifa fija de la categoría
+            priced = tariffs.price(
+                np.zeros(len(chunk), dtype=np.int64),
+                [category_id for _, category_id, _ in chunk]
+            )
+            totals = zip(*(cents_to_decimals(priced[key]) for key in ("water", "sewer", "fixed_charge", "total")))
+
+            readings = []
+            for (customer_id, _, _), (total_water, total_sewer, total_fixed_charge, total_amount) in zip(chunk, totals):
+                readings.append(Reading(
+                    customer_id=customer_id,
+                    period=period,
+                    previous_reading=Decimal("0.000"),
+                    current_reading=Decimal("0.000"),
+                    consumption=Decimal("0.000"),
+                    total_water=total_water,
+                    total_sewer=total_sewer,
+                    total_fixed_charge=total_fixed_charge,
+                    total_amount=total_amount,
+                    paid=False,
+                    has_meter=False,
+                    date_of_issue=date_of_issue,
+                    date_of_due=date_of_due,
+                    date_of_cute=date_of_cute,
+                ))
+
+            Reading.objects.bulk_create(readings, batch_size=batch_size)
+
+            # Deudas: se reutiliza la deuda pendiente del periodo si ya existía
+            new_debts = []
+            open_debts = []
+            for reading, (customer_id, _, open_debt_id) in zip(readings, chunk):
+                debt = Debt(
+                    id=open_debt_id,
+                    customer_id=customer_id,
+                    period=period,
+                    description=DEBT_DESCRIPTION,
+                    amount=reading.total_amount,
+                    reading=reading,
+                )
+                (open_debts if open_debt_id else new_debts).append(debt)
+
+            Debt.objects.bulk_create(new_debts, batch_size=batch_size)
+
+            if open_debts:
+                Debt.objects.bulk_update(open_debts, ["reading", "amount"], batch_size=batch_size)
+                DebtDetail.objects.filter(debt_id__in=[d.id for d in open_debts]).delete()
+
+            details = []
+            for debt in new_debts + open_debts:
+                details.extend(build_debt_details(debt, debt.reading, concepts))
+
+            DebtDetail.objects.bulk_create(details, batch_size=batch_size)
+
+            created += len(readings)
+
+    return {
+        "created": created,
+        "skipped_existing": skipped_existing,
+        "skipped_paid": skipped_paid,
+    }
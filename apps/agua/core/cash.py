@@ -0,0 +1,141 @@
+# core/cash.py
+"""
+Agregación de los reportes de caja (reports/caja/daily.html).
+
+Los movimientos se agrupan en SQL por concepto, ticket y método de pago, y el
+rango de periodos de cada ticket sale de una sola consulta MIN/MAX sobre
+InvoiceDebt. Lo usan el reporte de la caja (por día o por rango) y el del
+cierre diario, así que dan los mismos números. Los tickets anulados y los
+movimientos sin pago no cuentan en los conceptos; en los métodos solo se
+excluyen los anulados.
+"""
+from collections import defaultdict
+
+from django.db.models import Sum, Min, Max, Count, Q
+
+from apps.agua.models import InvoiceDebt, InvoicePayment
+from apps.agua.utils import format_period
+
+# Conceptos de agua, desagüe y cargo fijo: sus tickets muestran el periodo pagado
+PERIOD_CONCEPTS = ("001", "002", "003")
+
+PAYMENT_METHOD_NAMES = dict(InvoicePayment.PAYMENT_METHODS)
+
+
+def invoice_periods(invoice_ids):
+    """{invoice_id: "Enero 2025" o "Enero 2025 - Marzo 2025"} en una consulta."""
+    rows = (
+        InvoiceDebt.objects.filter(invoice_id__in=invoice_ids)
+        .values("invoice_id")
+        .annotate(first=Min("debt__period"), last=Max("debt__period"), count=Count("id"))
+        .order_by()
+    )
+
+    return {
+        row["invoice_id"]: (
+            format_period(row["first"]) if row["count"] == 1
+            else f"{format_period(row['first'])} - {format_period(row['last'])}"
+        )
+        for row in rows
+    }
+
+
+def _concepts(movements):
+
+    rows = (
+        movements.filter(invoice_payment__isnull=False)
+        .exclude(invoice_payment__invoice__status="cancelled")
+        .values(
+            "concept__name",
+            "concept__code",
+            "invoice_payment__invoice_id",
+            "invoice_payment__invoice__code",
+            "invoice_payment__invoice__date",
+            "invoice_payment__invoice__customer__full_name",
+            "invoice_payment__invoice__customer__address",
+            "invoice_payment__method",
+        )
+        .annotate(total=Sum("total"), first=Min("id"))
+        .order_by("first")
+    )
+
+    # Concepto (por nombre) -> ticket -> fila, en el orden del primer movimiento
+    concepts = {}
+    with_period = set()
+
+    for row in rows:
+        invoices = concepts.setdefault(row["concept__name"], {})
+        invoice_id = row["invoice_payment__invoice_id"]
+
+        invoice = invoices.get(invoice_id)
+        if invoice is None:
+            invoice = invoices[invoice_id] = {
+                "id": invoice_id,
+                "code": row["invoice_payment__invoice__code"],
+                "date": row["invoice_payment__invoice__date"],
+                "cliente": row["invoice_payment__invoice__customer__full_name"],
+                "direccion": row["invoice_payment__invoice__customer__address"],
+                "pagos": defaultdict(float),
+                "total": 0,
+                "periodo": "",
+            }
+
+            if row["concept__code"] in PERIOD_CONCEPTS:
+                with_period.add((row["concept__name"], invoice_id))
+
+        invoice["pagos"][row["invoice_payment__method"]] += float(row["total"])
+        invoice["total"] += float(row["total"])
+
+    periods = invoice_periods({invoice_id for _, invoice_id in with_period})
+
+    conceptos = []
+    for name, invoices in concepts.items():
+
+        facturas = []
+        for invoice in invoices.values():
+            if (name, invoice["id"]) in with_period:
+                invoice["periodo"] = periods.get(invoice["id"], "")
+            invoice["pagos"] = dict(invoice["pagos"])
+            facturas.append(invoice)
+
+        conceptos.append({
+            "concepto": name,
+            "total": sum(f["total"] for f in facturas),
+            "facturas": facturas,
+        })
+
+    return conceptos
+
+
+def _methods(movements):
+
+    rows = (
+        movements.values("method")
+        .annotate(
+            total=Sum("total", filter=~Q(invoice_payment__invoice__status="cancelled")),
+            first=Min("id"),
+        )
+        .order_by("first")
+    )
+
+    return [
+        {
+            "metodo": PAYMENT_METHOD_NAMES.get(row["method"], row["method"]),
+            "total": row["total"] or 0,
+        }
+        for row in rows
+    ]
+
+
+def cash_report(movements):
+    """
+    Contexto de reports/caja/daily.html para un queryset de CashMovement ya
+    filtrado (caja y fecha o rango): conceptos, métodos y total general.
+    """
+    conceptos = _concepts(movements)
+
+    return {
+        "conceptos": conceptos,
+        "total_general": sum(c["total"] for c in conceptos),
+        "metodos": _methods(movements),
+    }
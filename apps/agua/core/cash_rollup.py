@@ -0,0 +1,158 @@
+# core/cash_rollup.py
+"""
+Resumen diario de caja (DailyCashRollup).
+
+Cada alta, cambio o baja de un CashMovement o CashOutflow suma o resta su
+monto en la fila de (caja, día local, concepto, método) dentro de la misma
+transacción. Así el cierre diario y los resúmenes leen pocas filas ya sumadas
+en vez de recorrer los movimientos del día.
+
+Las operaciones masivas que no pasan por save()/delete() (bulk_create,
+QuerySet.update/delete) deben llamar después a rebuild().
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Q, Sum, Count
+
+from apps.agua.models import CashMovement, CashOutflow, DailyCashRollup
+
+# Campos que se suman; los que no vienen en el delta se insertan en cero
+TOTAL_FIELDS = ("movements_total", "movements_count", "outflows_total", "outflows_count")
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _apply(cashbox_id, date, concept_id, method, **deltas):
+    """
+    Suma `deltas` en la fila de la clave con un solo INSERT ... ON CONFLICT DO
+    UPDATE: dos altas simultáneas de la misma clave no pueden crear dos filas.
+    """
+    opts = DailyCashRollup._meta
+    table = _qn(opts.db_table)
+
+    values = {"cashbox": cashbox_id, "date": date, "concept": concept_id, "method": method}
+    values.update({field: deltas.get(field, 0) for field in TOTAL_FIELDS})
+
+    columns = [_qn(opts.get_field(name).column) for name in values]
+    totals = [_qn(opts.get_field(name).column) for name in TOTAL_FIELDS]
+
+    # Cada tipo de fila tiene su índice único parcial (ver DailyCashRollup.Meta)
+    key = ["cashbox", "date", "method"] if concept_id is None else ["cashbox", "date", "concept", "method"]
+    conflict = "({}) WHERE {} IS {}NULL".format(
+        ", ".join(_qn(opts.get_field(name).column) for name in key),
+        _qn(opts.get_field("concept").column),
+        "" if concept_id is None else "NOT ",
+    )
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT {conflict} DO UPDATE SET "
+        + ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in totals)
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(values.values()))
+
+
+def record_movement(movement, sign):
+    """Suma (sign=1) o resta (sign=-1) un movimiento guardado en su día."""
+    _apply(
+        movement.cashbox_id, movement.business_date, movement.concept_id, movement.method,
+        movements_total=sign * Decimal(str(movement.total)), movements_count=sign,
+    )
+
+
+def record_outflow(outflow, sign):
+    """Suma (sign=1) o resta (sign=-1) un egreso guardado en su día."""
+    _apply(
+        outflow.cashbox_id, outflow.business_date, None, outflow.method,
+        outflows_total=sign * Decimal(str(outflow.total)), outflows_count=sign,
+    )
+
+
+def rebuild(cashbox_ids=None):
+    """Recalcula el resumen desde los movimientos y egresos (todas las cajas o las indicadas)."""
+    movements = CashMovement.objects.all()
+    outflows = CashOutflow.objects.all()
+    rollups = DailyCashRollup.objects.all()
+
+    if cashbox_ids is not None:
+        movements = movements.filter(cashbox_id__in=cashbox_ids)
+        outflows = outflows.filter(cashbox_id__in=cashbox_ids)
+        rollups = rollups.filter(cashbox_id__in=cashbox_ids)
+
+    rollups.delete()
+
+    DailyCashRollup.objects.bulk_create([
+        DailyCashRollup(
+            cashbox_id=row["cashbox_id"], date=row["business_date"], concept_id=row["concept_id"], method=row["method"],
+            movements_total=row["total"], movements_count=row["count"],
+        )
+        for row in movements.values("cashbox_id", "business_date", "concept_id", "method")
+        .annotate(total=Sum("total"), count=Count("id"))
+        .order_by()
+    ] + [
+        DailyCashRollup(
+            cashbox_id=row["cashbox_id"], date=row["business_date"], method=row["method"],
+            outflows_total=row["total"], outflows_count=row["count"],
+        )
+        for row in outflows.values("cashbox_id", "business_date", "method")
+        .annotate(total=Sum("total"), count=Count("id"))
+        .order_by()
+    ])
+
+
+def day_totals(cashbox, date):
+    """
+    Saldo inicial, ingresos y egresos de `cashbox` en `date`, en una consulta.
+    El saldo inicial es el de apertura de la caja más lo acumulado en los días
+    anteriores.
+    """
+    before, today = Q(date__lt=date), Q(date=date)
+    income = Q(concept__type="income")
+
+    totals = DailyCashRollup.objects.filter(cashbox=cashbox, date__lte=date).aggregate(
+        incomes_before=Sum("movements_total", filter=before & income),
+        outcomes_before=Sum("outflows_total", filter=before),
+        total_incomes=Sum("movements_total", filter=today & income),
+        total_outcomes=Sum("outflows_total", filter=today),
+    )
+
+    return {
+        "opening_balance": cashbox.opening_balance + (totals["incomes_before"] or 0) - (totals["outcomes_before"] or 0),
+        "total_incomes": totals["total_incomes"] or 0,
+        "total_outcomes": totals["total_outcomes"] or 0,
+    }
+
+
+def summary(cashbox, start, end):
+    """Totales por día, concepto y método entre `start` y `end` (para tableros)."""
+    rows = (
+        DailyCashRollup.objects.filter(cashbox=cashbox, date__range=(start, end))
+        .values("date", "concept__code", "concept__name", "method")
+        .annotate(
+            movements_total=Sum("movements_total"),
+            movements_count=Sum("movements_count"),
+            outflows_total=Sum("outflows_total"),
+            outflows_count=Sum("outflows_count"),
+        )
+        .order_by("date", "concept__code", "method")
+    )
+
+    return [
+        {
+            "date": row["date"],
+            "concept": row["concept__code"],
+            "concept_name": row["concept__name"],
+            "method": row["method"],
+            "movements_total": row["movements_total"],
+            "movements_count": row["movements_count"],
+            "outflows_total": row["outflows_total"],
+            "outflows_count": row["outflows_count"],
+        }
+        for row in rows
+    ]
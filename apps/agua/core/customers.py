@@ -0,0 +1,23 @@
+# core/customers.py
+from django.db.models import OuterRef, Subquery, Sum
+
+from apps.agua.models import Debt
+
+# Relaciones que usa CustomerSerializer
+CUSTOMER_RELATED = ("category", "calle__via", "zona", "meter")
+
+
+def with_outstanding_debt(customers):
+    """
+    Clientes con `outstanding_debt` (suma de sus deudas sin pagar, None si no
+    tiene) y las relaciones del serializer en la misma consulta.
+    """
+    outstanding = (
+        Debt.objects.filter(customer=OuterRef("pk"), paid=False)
+        .order_by()
+        .values("customer")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+
+    return customers.select_related(*CUSTOMER_RELATED).annotate(outstanding_debt=Subquery(outstanding))
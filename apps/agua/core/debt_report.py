@@ -0,0 +1,108 @@
+# core/debt_report.py
+"""
+Reporte global de deudas pendientes (CustomerViewSet.report).
+
+Los clientes con deudas sin pagar salen de una sola consulta agrupada
+(SUM/MIN/MAX ... GROUP BY cliente), filtrada por calle y zona. Además del PDF
+se puede descargar en CSV o XLSX; ambos se escriben mientras se recorren las
+filas con iterator(), sin cargar todos los clientes en memoria.
+"""
+import csv
+import tempfile
+from decimal import Decimal
+
+from django.db.models import Sum, Min, Max
+from openpyxl import Workbook
+
+from apps.agua.models import Customer
+
+EXPORT_CHUNK_SIZE = 2000
+
+COLUMNS = ("Codigo", "Cliente", "DNI/RUC", "Desde", "Hasta", "Total (S/)")
+
+
+def customers_with_debt(calle_id=None, zona_id=None):
+    """Clientes con deuda pendiente, anotados con total, min_period y max_period."""
+    customers = Customer.objects.filter(debts__paid=False)
+
+    if calle_id:
+        customers = customers.filter(calle_id=calle_id)
+
+    if zona_id:
+        customers = customers.filter(zona_id=zona_id)
+
+    return customers.annotate(
+        total=Sum("debts__amount"),
+        min_period=Min("debts__period"),
+        max_period=Max("debts__period"),
+    ).order_by("id")
+
+
+def report_rows(customers):
+    """`data` de customer/report.html y el total general."""
+    data = [
+        {
+            "customer": customer,
+            "min_period": customer.min_period,
+            "max_period": customer.max_period,
+            "total": customer.total,
+        }
+        for customer in customers
+    ]
+
+    return data, sum((item["total"] for item in data), Decimal("0.00"))
+
+
+def _export_rows(customers):
+    """Filas de la exportación, con el total general al final."""
+    total_general = Decimal("0.00")
+
+    for customer in customers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        total_general += customer.total
+        yield (
+            customer.codigo,
+            customer.full_name,
+            customer.number or "",
+            f"{customer.min_period:%Y-%m}",
+            f"{customer.max_period:%Y-%m}",
+            customer.total,
+        )
+
+    yield ("", "TOTAL GENERAL", "", "", "", total_general)
+
+
+class _Echo:
+    """csv.writer escribe aquí y la línea se devuelve tal cual."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(customers):
+    """Líneas del CSV, para un StreamingHttpResponse."""
+    writer = csv.writer(_Echo())
+
+    # BOM para que Excel abra bien las tildes
+    yield "\ufeff" + writer.writerow(COLUMNS)
+
+    for row in _export_rows(customers):
+        yield writer.writerow(row)
+
+
+def write_xlsx(customers):
+    """
+    Escribe el XLSX (openpyxl en modo write_only) en un archivo temporal y lo
+    devuelve abierto al inicio, listo para un FileResponse.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Deudas")
+
+    sheet.append(COLUMNS)
+    for row in _export_rows(customers):
+        sheet.append(row)
+
+    file = tempfile.TemporaryFile(suffix=".xlsx")
+    workbook.save(file)
+    file.seek(0)
+
+    return file
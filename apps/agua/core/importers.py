@@ -0,0 +1,446 @@
+# core/importers.py
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from apps.agua.models import Customer, Reading, Debt, DebtDetail, Zona, Calle, WaterMeter
+from apps.agua.core.billing import BULK_BATCH_SIZE, DEBT_DESCRIPTION, build_debt_details, load_detail_concepts
+from apps.agua.core.registry import get_registry
+from apps.agua.core.workbook import IMPORT_BATCH_SIZE, iter_batches, iter_rows
+from apps.agua.core.copy_loader import copy_load, assign_pks, reserve_pks
+from apps.agua.utils import to_decimal_or_none, to_none_if_empty, generar_periodos
+
+MONTH_LABELS = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+PAGO_LABELS = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Set", "Oct", "Nov", "Dic"]
+DEUDA_LABELS = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Setiembre", "Octubre", "Noviembre", "Diciembre",
+]
+
+# (mes, lectura, consumo, deuda, pago) por cada mes del archivo de lecturas
+READING_MONTH_COLUMNS = [
+    (month, f"Lect.{MONTH_LABELS[month - 1]}", f"M3 {MONTH_LABELS[month - 1]}", DEUDA_LABELS[month - 1], f"Pag.{PAGO_LABELS[month - 1]}")
+    for month in range(1, 13)
+]
+
+
+def _reading_rows(row, customer, tariff, total_fixed_charge, year):
+    """Lecturas de una fila del Excel, mes a mes hasta el primer mes vacío."""
+    readings = []
+
+    for month, lect_col, consumo_col, deuda_col, pago_col in READING_MONTH_COLUMNS:
+
+        current_reading = to_decimal_or_none(row.get(lect_col))
+        consumption = to_decimal_or_none(row.get(consumo_col))
+        deuda = to_decimal_or_none(row.get(deuda_col))
+        pago = to_decimal_or_none(row.get(pago_col))
+
+        # Si en este mes no hay lectura, consumo, deuda ni pago → cortamos
+        if not any([current_reading, consumption, deuda, pago]):
+            break
+
+        if consumption is not None:
+            previous_reading = (current_reading or Decimal("0.00")) - consumption
+        else:
+            previous_reading = Decimal("0.00")
+
+        if pago and pago > 0:
+            total_amount = pago
+            paid = True
+        elif deuda and deuda > 0:
+            total_amount = deuda
+            paid = False
+        else:
+            total_amount = Decimal("0.00")
+            paid = False
+
+        readings.append(Reading(
+            customer=customer,
+            period=date(year, month, 1),
+            current_reading=current_reading or Decimal("0.00"),
+            previous_reading=previous_reading or Decimal("0.00"),
+            consumption=consumption or Decimal("0.00"),
+            total_water=total_amount,
+            total_sewer=tariff.price_sewer,
+            total_fixed_charge=total_fixed_charge,
+            total_amount=total_amount + tariff.price_sewer + total_fixed_charge,
+            paid=paid
+        ))
+
+    return readings
+
+
+def import_readings(file, year=2025, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Importa el Excel de lecturas por lotes de filas.
+
+    Por lote: una consulta para los clientes y luego Reading, Debt y DebtDetail
+    se cargan con COPY (copy_load). Las lecturas que ya existen en la base se
+    omiten con ON CONFLICT (cliente, periodo) y solo las nuevas generan deuda.
+    La memoria depende del tamaño del lote, no del archivo.
+
+    Devuelve (creadas, errores).
+    """
+    registry = get_registry()
+    concepts = load_detail_concepts()
+
+    cargo_fijo = registry.concepts.get("003")
+    total_fixed_charge = cargo_fijo.total if cargo_fijo else Decimal("0.00")
+
+    created = 0
+    errores = []
+
+    with transaction.atomic():
+
+        for batch in iter_batches(file, header=2, batch_size=batch_size, dtype={"Codigo": str}):
+
+            codigos = {str(row.get("Codigo")).strip() for _, row in batch}
+            customers = {c.codigo: c for c in Customer.objects.filter(codigo__in=codigos)}
+
+            readings = []
+            for excel_row, row in batch:
+
+                codigo = str(row.get("Codigo")).strip()
+                customer = customers.get(codigo)
+
+                if not customer:
+                    errores.append({"fila": excel_row, "codigo": codigo, "error": "Cliente no encontrado"})
+                    continue
+
+                readings.extend(_reading_rows(row, customer, registry.category(customer.category_id), total_fixed_charge, year))
+
+            # Repetidas en el archivo: gana la primera; las que ya existen en la base las omite ON CONFLICT
+            unique_readings = {}
+            for reading in readings:
+                unique_readings.setdefault((reading.customer_id, reading.period), reading)
+            readings = list(unique_readings.values())
+
+            rows = copy_load(Reading, readings, conflict=("customer", "period"), returning=("id", "customer", "period"))
+            new_readings = assign_pks(readings, rows, key=("customer", "period"))
+
+            debts = [
+                Debt(
+                    customer_id=reading.customer_id,
+                    period=reading.period,
+                    description=DEBT_DESCRIPTION,
+                    amount=reading.total_amount,
+                    reading=reading
+                )
+                for reading in new_readings
+            ]
+            assign_pks(debts, copy_load(Debt, debts, returning=("id", "reading")), key=("reading",))
+
+            details = []
+            for debt in debts:
+                details.extend(build_debt_details(debt, debt.reading, concepts))
+
+            copy_load(DebtDetail, details)
+
+            created += len(new_readings)
+
+    return created, errores
+
+
+def _import_debt_batch(rows, clientes, registry, concepts, total_fixed_charge, errores, batch_size):
+    """Upsert de las deudas de un lote de filas. Devuelve la cantidad de periodos procesados."""
+    procesados = 0
+    planned = {}  # (customer_id, periodo) -> montos; la última fila del archivo gana
+
+    for excel_row, row in rows:
+
+        codigo = str(row.get("Codigo")).strip()
+        year = row.get("Año")
+        meses_texto = to_none_if_empty(row.get("Meses"))
+        total = to_decimal_or_none(row.get("Agua"))
+
+        if year == 2025:
+            continue
+
+        if not meses_texto:
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "total": total, "error": "Campo 'Meses' vacio"})
+            continue
+
+        customer = clientes.get(codigo)
+        if not customer:
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": "Cliente no encontrado"})
+            continue
+
+        # Un año con decimales (2023.5) o un monto con texto no se redondean a otro valor
+        year_number = to_decimal_or_none(year)
+        if year_number is None or year_number != year_number.to_integral_value():
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": "Año inválido"})
+            continue
+
+        if total is None and to_none_if_empty(row.get("Agua")) is not None:
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "meses": meses_texto, "error": "Monto de agua no numérico"})
+            continue
+
+        try:
+            periodos = generar_periodos(int(year_number), meses_texto)
+        except Exception as e:
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": f"Error al generar periodos: {str(e)}"})
+            continue
+
+        if not periodos:
+            errores.append({"fila": excel_row, "codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": "Rango de meses inválido"})
+            continue
+
+        # Calcular montos con precisión decimal
+        total_water = (Decimal(total) / Decimal(len(periodos))) if (total and len(periodos) > 0) else Decimal("0.00")
+        total_sewer = Decimal(registry.category(customer.category_id).price_sewer or 0)
+        amounts = SimpleNamespace(
+            total_water=total_water,
+            total_sewer=total_sewer,
+            total_fixed_charge=total_fixed_charge,
+            amount=total_water + total_sewer + total_fixed_charge,
+        )
+
+        for periodo in periodos:
+            planned[(customer.id, periodo)] = amounts
+            procesados += 1
+
+    if not planned:
+        return procesados
+
+    existing = {}
+    for debt in Debt.objects.filter(
+        customer_id__in={customer_id for customer_id, _ in planned},
+        period__in={periodo for _, periodo in planned}
+    ).order_by("id").only("id", "customer_id", "period", "amount"):
+        existing.setdefault((debt.customer_id, debt.period), debt)
+
+    new_debts = []
+    updated_debts = []
+    details = []
+
+    for (customer_id, periodo), amounts in planned.items():
+
+        debt = existing.get((customer_id, periodo))
+
+        if debt is None:
+            debt = Debt(
+                customer_id=customer_id,
+                period=periodo,
+                description="Deuda importada desde Excel",
+                amount=amounts.amount,
+                paid=False
+            )
+            new_debts.append(debt)
+        else:
+            debt.amount = amounts.amount
+            updated_debts.append(debt)
+
+        details.extend(build_debt_details(debt, amounts, concepts))
+
+    rows = copy_load(Debt, new_debts, returning=("id", "customer", "period"))
+    assign_pks(new_debts, rows, key=("customer", "period"))
+
+    if updated_debts:
+        Debt.objects.bulk_update(updated_debts, ["amount"], batch_size=batch_size)
+        DebtDetail.objects.filter(debt_id__in=[d.id for d in updated_debts]).delete()
+
+    copy_load(DebtDetail, details)
+
+    return procesados
+
+
+def import_debts(file, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Importa deudas históricas (Codigo, Año, Meses, Agua) haciendo upsert por
+    (cliente, periodo).
+
+    El archivo se lee por lotes; en cada lote se expanden los periodos de sus
+    filas, una consulta trae las deudas que ya existen, las nuevas se cargan con
+    COPY (copy_load), las existentes se actualizan con un bulk_update y sus
+    detalles se reemplazan con un solo DELETE más la carga de los nuevos. Si una
+    deuda se repite en lotes distintos, la última fila del archivo gana.
+
+    Devuelve (procesados, errores).
+    """
+    registry = get_registry()
+    concepts = load_detail_concepts()
+
+    cargo_fijo = registry.concepts.get("003")
+    total_fixed_charge = Decimal(cargo_fijo.total if cargo_fijo else 0)
+
+    errores = []
+    procesados = 0
+
+    with transaction.atomic():
+
+        for batch in iter_batches(file, header=2, batch_size=batch_size, dtype={"Codigo": str}):
+
+            # 🔹 Precargar clientes del lote
+            codigos = {str(row.get("Codigo")).strip() for _, row in batch}
+            clientes = {c.codigo: c for c in Customer.objects.filter(codigo__in=codigos)}
+
+            procesados += _import_debt_batch(batch, clientes, registry, concepts, total_fixed_charge, errores, BULK_BATCH_SIZE)
+
+    return procesados, errores
+
+
+def _customer_from_row(row, zonas, default_zona, calles):
+    """Arma el Customer de una fila del padrón (sin guardar). Lanza ValueError si la fila no es válida."""
+
+    codigo = to_none_if_empty(row.get("Codigo"))
+    if codigo is None:
+        raise ValueError("Falta el código del cliente")
+
+    # DNI/RUC
+    number = to_none_if_empty(row.get("DNI/RUC."))
+
+    identity_document_type = 0
+
+    if number and number.isdigit():
+        if len(number) == 8:
+            identity_document_type = 1  # DNI
+        elif len(number) == 11:
+            identity_document_type = 6  # RUC
+    else:
+        number = "00000000"  # Valor por defecto si está vacío o no es válido
+
+    full_name = to_none_if_empty(row.get("Usuario/Cliente"))
+
+    calle_dir = row.get("cod_direc")
+    zona_name = to_none_if_empty(row.get("Barrio"))
+
+    nro = to_none_if_empty(row.get("Nro."))
+    mz = to_none_if_empty(row.get("Mzna."))
+    lote = to_none_if_empty(row.get("Lote"))
+
+    zona = zonas.get(zona_name.strip().upper(), default_zona) if zona_name else default_zona
+
+    # Normalizar valor
+    if calle_dir is None or str(calle_dir).strip() in ("", "nan"):
+        calle_dir = 1
+    else:
+        try:
+            calle_dir = int(float(str(calle_dir).strip()))
+        except ValueError:
+            raise ValueError(f"Código de calle inválido: {calle_dir}")
+
+    calle = calles.get(calle_dir)
+    if not calle:
+        raise ValueError(f"La calle {calle_dir} no existe")
+
+    parts = [
+        f"{calle.via.name} {calle.name}",
+        f"Mz {mz}" if mz else None,
+        f"Lt {lote}" if lote else None,
+        f"N° {nro}" if nro else None,
+    ]
+
+    # eliminar None y unir
+    address = " ".join([p for p in parts if p])
+
+    # Medidor
+    code = to_none_if_empty(row.get("Cod.Medidor"))
+    tiene_medidor_excel = to_none_if_empty(row.get("T.Med."))
+
+    if tiene_medidor_excel == "si":
+        has_meter = True
+    elif tiene_medidor_excel == "no":
+        has_meter = False
+    else:
+        has_meter = True if code else False
+
+    # Categoría
+    category = to_none_if_empty(row.get("cod_categ")) or 6
+    try:
+        category_id = int(float(category))
+    except ValueError:
+        raise ValueError(f"Categoría inválida: {category}")
+
+    customer = Customer(
+        codigo=codigo,
+        identity_document_type=identity_document_type,
+        full_name=full_name,
+        number=number,
+        address=address,
+        nro=nro,
+        mz=mz,
+        lote=lote,
+        has_meter=has_meter,
+        category_id=category_id,
+        calle=calle,
+        zona=zona
+    )
+
+    return customer, code
+
+
+def import_customers(file, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Importa el padrón de clientes.
+
+    Zonas, calles (con su vía) y códigos de medidor existentes se precargan en
+    diccionarios; los clientes y sus medidores se cargan con COPY (copy_load)
+    en bloques de `batch_size`. Las filas que no se pueden importar se
+    devuelven en `omitidos`.
+
+    El archivo se lee por lotes con iter_rows. Devuelve (creados, omitidos).
+    """
+    zonas = {z.name.strip().upper(): z for z in Zona.objects.all()}
+    # Obtenemos la zona por defecto (sin zona)
+    default_zona = zonas.get("SIN ZONA")
+    calles = Calle.objects.select_related("via").in_bulk()
+    meter_codes = set(WaterMeter.objects.values_list("code", flat=True))
+    categories = get_registry().categories
+
+    created = 0
+    omitidos = []
+    installation_date = localdate()
+
+    customer_fields = [field.name for field in Customer._meta.concrete_fields]
+
+    def flush(pending):
+
+        # codigo no es único: los ids se reservan antes para enlazar los medidores
+        customers = reserve_pks(customer for customer, _ in pending)
+        copy_load(Customer, customers, fields=customer_fields)
+
+        meters = [
+            WaterMeter(customer=customer, code=code, installation_date=installation_date)
+            for customer, code in pending if code
+        ]
+        copy_load(WaterMeter, meters)
+
+        return len(customers)
+
+    with transaction.atomic():
+
+        pending = []
+        for excel_row, row in iter_rows(file, header=2, batch_size=batch_size, dtype={"Codigo": str}):
+
+            try:
+                customer, code = _customer_from_row(row, zonas, default_zona, calles)
+            except ValueError as e:
+                omitidos.append({"fila": excel_row, "codigo": str(row.get("Codigo")), "error": str(e)})
+                continue
+
+            if customer.category_id not in categories:
+                omitidos.append({"fila": excel_row, "codigo": customer.codigo, "error": f"La categoría {customer.category_id} no existe"})
+                continue
+
+            # Crear medidor solo si aplica y no existe
+            if not (customer.has_meter and code):
+                code = None
+            elif code in meter_codes:
+                omitidos.append({"fila": excel_row, "codigo": customer.codigo, "error": f"El medidor {code} ya existe; cliente importado sin medidor"})
+                code = None
+            else:
+                meter_codes.add(code)
+
+            pending.append((customer, code))
+
+            if len(pending) >= batch_size:
+                created += flush(pending)
+                pending = []
+
+        if pending:
+            created += flush(pending)
+
+    return created, omitidos
@@ -0,0 +1,264 @@
+# core/pdf.py
+"""
+Renderizado de PDF con WeasyPrint.
+
+Por proceso se reutilizan las hojas de estilo ya parseadas, una sola
+FontConfiguration y los templates compilados; warm_up() los carga al arrancar
+(ver agua/wsgi.py) para que el primer ticket no pague ese costo.
+
+Los recibos masivos se renderizan en paralelo: el proceso web arma el HTML
+(necesita la base y las plantillas) y los workers solo convierten HTML a PDF,
+así no heredan conexiones ni el estado de Django. Cada bloque (shard) se
+renderiza por separado y los PDF se unen en el mismo orden con PdfMerger.
+"""
+import io
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, unquote
+
+from django.conf import settings
+from django.template.loader import get_template
+from PyPDF2 import PdfMerger
+from weasyprint import HTML, CSS, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+# Un worker se recicla después de tantos bloques, para que su memoria no crezca sin límite
+WORKER_MAX_TASKS = 20
+
+# Hojas de estilo vendorizadas (rutas dentro de static) que se aplican a los recibos
+RECEIPT_STYLESHEETS = ("css/vendor/bootstrap-5.0.2.receipt.css",)
+TICKET_STYLESHEETS = ("css/ticket.css",)
+
+# Lo que warm_up() deja cargado al iniciar el proceso
+PRELOADED_STYLESHEETS = RECEIPT_STYLESHEETS + TICKET_STYLESHEETS + ("css/invoice_style.css", "css/reports/reading.css")
+PRELOADED_TEMPLATES = (
+    "agua/recibo.html",
+    "agua/invoice.html",
+    "reports/caja/daily.html",
+    "customer/report.html",
+    "customer/customer_debt_history.html",
+)
+
+# Archivos más grandes no se guardan en la caché en memoria del fetcher
+FETCH_CACHE_MAX_FILE = 2 * 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_fetch_cache = {}  # ruta absoluta -> (bytes, mime_type)
+_stylesheets = {}  # ruta en static -> CSS ya parseado
+_templates = {}  # nombre -> template compilado
+_font_config = None
+_cache_lock = threading.Lock()
+
+
+def _get_executor():
+
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECEIPT_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=WORKER_MAX_TASKS,
+            )
+
+    return _executor
+
+
+def _safe_join(root, relative):
+
+    root = os.path.abspath(root)
+    path = os.path.abspath(os.path.join(root, relative))
+
+    return path if path.startswith(root + os.sep) else None
+
+
+def local_path(url):
+    """Ruta en disco de una URL de /static/ o /media/, o None si no es local."""
+    path = unquote(urlsplit(url).path)
+
+    if path.startswith(settings.STATIC_URL):
+        relative = path[len(settings.STATIC_URL):]
+        roots = [*settings.STATICFILES_DIRS, settings.STATIC_ROOT]
+    elif settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
+        relative = path[len(settings.MEDIA_URL):]
+        roots = [settings.MEDIA_ROOT]
+    else:
+        return None
+
+    for root in roots:
+        candidate = _safe_join(root, relative) if root else None
+        if candidate and os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+def _read_cached(path):
+
+    cached = _fetch_cache.get(path)
+    if cached is not None:
+        return cached
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    cached = (data, mimetypes.guess_type(path)[0] or "application/octet-stream")
+
+    if len(data) <= FETCH_CACHE_MAX_FILE:
+        with _cache_lock:
+            _fetch_cache[path] = cached
+
+    return cached
+
+
+def url_fetcher(url, *args, **kwargs):
+    """
+    url_fetcher de WeasyPrint: /static/ y /media/ se leen del disco
+    (STATICFILES_DIRS, STATIC_ROOT, MEDIA_ROOT) con caché de bytes en memoria,
+    sin pedirle por HTTP las imágenes a nuestro propio servidor. El resto de
+    URLs va al fetcher por defecto.
+    """
+    if url.startswith(("http://", "https://", "file://")) or url.startswith("/"):
+        path = local_path(url)
+
+        if path:
+            data, mime_type = _read_cached(path)
+            return {"string": data, "mime_type": mime_type, "redirected_url": url}
+
+    return default_url_fetcher(url, *args, **kwargs)
+
+
+def font_config():
+    """FontConfiguration compartida por todos los PDF del proceso."""
+    global _font_config
+
+    if _font_config is None:
+        with _cache_lock:
+            if _font_config is None:
+                _font_config = FontConfiguration()
+
+    return _font_config
+
+
+def stylesheet(static_path):
+    """Hoja de estilo de static/ parseada una sola vez por proceso."""
+    css = _stylesheets.get(static_path)
+
+    if css is None:
+        path = local_path(settings.STATIC_URL + static_path)
+        if path is None:
+            raise FileNotFoundError(f"No existe la hoja de estilo {static_path} en static")
+
+        css = CSS(
+            string=_read_cached(path)[0].decode("utf-8"),
+            base_url=path,
+            url_fetcher=url_fetcher,
+            font_config=font_config(),
+        )
+        with _cache_lock:
+            _stylesheets[static_path] = css
+
+    return css
+
+
+def template(name):
+    """
+    Template compilado una sola vez por proceso (con DEBUG=True Django no usa
+    el cached loader y volvería a leerlo en cada PDF).
+    """
+    compiled = _templates.get(name)
+
+    if compiled is None:
+        compiled = get_template(name)
+        with _cache_lock:
+            _templates[name] = compiled
+
+    return compiled
+
+
+def write_pdf(html, base_url=None, stylesheets=()):
+    """HTML -> bytes del PDF. También se ejecuta dentro de los workers."""
+    return HTML(string=html, base_url=base_url, url_fetcher=url_fetcher).write_pdf(
+        stylesheets=[stylesheet(path) for path in stylesheets],
+        font_config=font_config(),
+    )
+
+
+def render_pdf(template_name, context, stylesheets=(), base_url=None):
+    """Renderiza un template a PDF con los estilos ya parseados y devuelve los bytes."""
+    return write_pdf(template(template_name).render(context), base_url, stylesheets)
+
+
+def warm_up():
+    """
+    Carga por adelantado estilos, fuentes y templates de los PDF. Se llama al
+    iniciar el proceso; lo que falte (p. ej. un CSS borrado) se omite.
+    """
+    font_config()
+
+    for static_path in PRELOADED_STYLESHEETS:
+        try:
+            stylesheet(static_path)
+        except FileNotFoundError:
+            pass
+
+    for name in PRELOADED_TEMPLATES:
+        template(name)
+
+    # Primer layout: inicializa Pango y las fuentes del sistema
+    write_pdf("<p>.</p>")
+
+
+def _shards(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def merge_pdfs(parts):
+
+    merger = PdfMerger()
+    for part in parts:
+        merger.append(io.BytesIO(part))
+
+    output = io.BytesIO()
+    merger.write(output)
+    merger.close()
+
+    return output.getvalue()
+
+
+def render_receipts_pdf(readings_context, company, base_url=None, shard_size=None, workers=None):
+    """
+    Renderiza agua/recibo.html para `readings_context` (ver core.receipts) y
+    devuelve los bytes del PDF.
+
+    Con más de un bloque y más de un worker, los bloques se convierten en el
+    pool de procesos y se unen en orden; si no, se renderiza en este proceso.
+    """
+    shard_size = shard_size or settings.RECEIPT_SHARD_SIZE
+    workers = settings.RECEIPT_RENDER_WORKERS if workers is None else workers
+
+    receipt = template("agua/recibo.html")
+
+    htmls = [
+        receipt.render({"readings_context": shard, "company": company})
+        for shard in _shards(readings_context, shard_size)
+    ] or [receipt.render({"readings_context": [], "company": company})]
+
+    if len(htmls) == 1 or workers <= 1:
+        parts = [write_pdf(html, base_url, RECEIPT_STYLESHEETS) for html in htmls]
+    else:
+        parts = list(_get_executor().map(
+            write_pdf, htmls, [base_url] * len(htmls), [RECEIPT_STYLESHEETS] * len(htmls)
+        ))
+
+    if len(parts) == 1:
+        return parts[0]
+
+    return merge_pdfs(parts)
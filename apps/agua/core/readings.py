@@ -0,0 +1,221 @@
+# core/readings.py
+from collections import namedtuple, defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from apps.agua.models import Customer, Reading, Debt
+from apps.agua.core.billing import cascade_readings
+from apps.agua.utils import next_month_date, to_decimal_or_none
+
+PreviousReading = namedtuple("PreviousReading", ["period", "current_reading"])
+
+
+def previous_readings(period):
+    """
+    Lecturas anteriores a `period`, por cliente y de la más reciente a la más
+    antigua: la primera de cada cliente es su "lectura anterior". Es la única
+    definición; la usan facturación e importación (resolve_previous_readings)
+    y validación (annotate_reading_facts).
+    """
+    return Reading.objects.filter(period__lt=period).order_by("customer_id", "-period", "-id")
+
+
+def resolve_previous_readings(period, customer_ids=None):
+    """
+    Devuelve {customer_id: PreviousReading} con la última lectura anterior a
+    `period` de cada cliente, en una sola consulta (DISTINCT ON sobre
+    previous_readings).
+
+    `customer_ids` puede ser una lista o un queryset de ids (p. ej. los clientes
+    de una zona), en cuyo caso va como subconsulta en la misma ida a la base.
+    """
+    qs = previous_readings(period)
+
+    if customer_ids is not None:
+        qs = qs.filter(customer_id__in=customer_ids)
+
+    rows = qs.distinct("customer_id").values_list("customer_id", "period", "current_reading")
+
+    return {customer_id: PreviousReading(prev_period, value) for customer_id, prev_period, value in rows}
+
+
+def apply_consumption(readings):
+    """
+    Calcula previous_reading y consumption de varias lecturas con una consulta
+    por periodo distinto (normalmente una sola). Las lecturas deben traer
+    `customer` y `customer.category` ya cargados.
+    """
+    by_period = defaultdict(list)
+    for reading in readings:
+        by_period[reading.period].append(reading)
+
+    for period, items in by_period.items():
+
+        previous = resolve_previous_readings(period, [r.customer_id for r in items])
+
+        for reading in items:
+            prev = previous.get(reading.customer_id)
+            reading.apply_previous_reading(prev.current_reading if prev else None)
+
+    return readings
+
+
+def annotate_reading_facts(customers, period, exclude_id=None):
+    """
+    Anota sobre un queryset de Customer todo lo que hace falta para validar una
+    lectura de `period`, en la misma consulta:
+
+    - existing_reading_id: lectura del mismo mes (duplicado), sin contar `exclude_id`
+    - prev_period / prev_reading: lectura anterior (la misma de resolve_previous_readings)
+    - next_period / next_reading: lectura siguiente
+    - has_paid_later: hay lecturas posteriores pagadas
+    - has_paid_debt: la deuda del periodo ya está pagada
+    """
+    month_start = date(period.year, period.month, 1)
+
+    same_month = Reading.objects.filter(
+        customer=OuterRef("pk"),
+        period__gte=month_start,
+        period__lt=next_month_date(month_start)
+    )
+    if exclude_id:
+        same_month = same_month.exclude(id=exclude_id)
+
+    earlier = previous_readings(period).filter(customer=OuterRef("pk"))
+    later = Reading.objects.filter(customer=OuterRef("pk"), period__gt=period).order_by("period")
+
+    return customers.annotate(
+        existing_reading_id=Subquery(same_month.values("id")[:1]),
+        prev_period=Subquery(earlier.values("period")[:1]),
+        prev_reading=Subquery(earlier.values("current_reading")[:1]),
+        next_period=Subquery(later.values("period")[:1]),
+        next_reading=Subquery(later.values("current_reading")[:1]),
+        has_paid_later=Exists(later.filter(paid=True)),
+        has_paid_debt=Exists(Debt.objects.filter(customer=OuterRef("pk"), period=month_start, paid=True)),
+    )
+
+
+def reading_error(customer, period, current_reading):
+    """
+    Reglas de validación de una lectura sobre un cliente anotado con
+    annotate_reading_facts. Devuelve el detalle del error (str o dict) o None.
+    """
+    # 1) Evitar lecturas duplicadas en el mismo mes y cliente
+    if customer.existing_reading_id:
+        return "Ya existe una lectura registrada para este cliente en el mismo mes."
+
+    if customer.prev_period and current_reading < customer.prev_reading:
+        return {"current_reading": f"La lectura no puede ser menor que la de {customer.prev_period} ({customer.prev_reading})."}
+
+    if customer.next_period and current_reading > customer.next_reading:
+        return {"current_reading": f"La lectura no puede ser mayor que la de {customer.next_period} ({customer.next_reading})."}
+
+    # 2) Evitar registrar un mes anterior si ya existe uno posterior pagado
+    if customer.has_paid_later:
+        return "No se puede editar porque existen lecturas posteriores ya pagadas."
+
+    # 3) Verificar que no se salten meses
+    if customer.prev_period:
+        expected_next_date = next_month_date(customer.prev_period)
+
+        if (period.year != expected_next_date.year) or (period.month != expected_next_date.month):
+            return (
+                "Debes registrar el mes consecutivo. El siguiente mes esperado es: "
+                f"{expected_next_date.strftime('%B %Y')}"
+            )
+
+    if customer.has_paid_debt:
+        return f"No se puede modificar la lectura de {period.strftime('%Y-%m')} porque ya está pagada."
+
+    return None
+
+
+def capture_readings(period, rows, calle_id=None, zona_id=None, dates=None):
+    """
+    Registra en lote las lecturas de una ruta (calle o zona) para un periodo.
+
+    `rows` es una lista de {"customer": id, "current_reading": valor}. Todas las
+    validaciones salen de una sola consulta (annotate_reading_facts); las filas
+    válidas se guardan en una transacción y las demás se devuelven en el
+    reporte de errores con su número de fila.
+
+    Devuelve (lecturas_creadas, errores).
+    """
+    dates = dates or {}
+    errors = []
+    valid = []
+    seen = set()
+
+    for index, row in enumerate(rows, start=1):
+
+        customer_id = row.get("customer")
+        current_reading = to_decimal_or_none(row.get("current_reading"))
+
+        try:
+            customer_id = int(customer_id)
+        except (TypeError, ValueError):
+            errors.append({"fila": index, "customer": customer_id, "error": "Cliente inválido."})
+            continue
+
+        if current_reading is None or current_reading < 0:
+            errors.append({"fila": index, "customer": customer_id, "error": "Lectura inválida."})
+            continue
+
+        if customer_id in seen:
+            errors.append({"fila": index, "customer": customer_id, "error": "Cliente repetido en el lote."})
+            continue
+
+        seen.add(customer_id)
+        valid.append((index, customer_id, current_reading))
+
+    customers = Customer.objects.filter(id__in=seen).select_related("category")
+
+    if calle_id:
+        customers = customers.filter(calle_id=calle_id)
+    if zona_id:
+        customers = customers.filter(zona_id=zona_id)
+
+    customers = {c.id: c for c in annotate_reading_facts(customers, period)}
+
+    readings = []
+    for index, customer_id, current_reading in valid:
+
+        customer = customers.get(customer_id)
+
+        if not customer:
+            errors.append({"fila": index, "customer": customer_id, "error": "El cliente no pertenece a la ruta indicada."})
+            continue
+
+        if not customer.has_meter:
+            errors.append({"fila": index, "customer": customer_id, "error": "El cliente no tiene medidor."})
+            continue
+
+        error = reading_error(customer, period, current_reading)
+        if error:
+            errors.append({"fila": index, "customer": customer_id, "error": error})
+            continue
+
+        reading = Reading(
+            customer=customer,
+            period=period,
+            current_reading=current_reading,
+            date_of_issue=dates.get("date_of_issue"),
+            date_of_due=dates.get("date_of_due"),
+            date_of_cute=dates.get("date_of_cute"),
+        )
+        reading.apply_previous_reading(customer.prev_reading if customer.prev_period else None)
+        reading.calculate_total()
+        readings.append(reading)
+
+    with transaction.atomic():
+
+        Reading.objects.bulk_create(readings)
+
+        # Deudas de todo el lote y, si hay meses posteriores, su recálculo en bloque
+        cascade_readings(readings)
+
+    errors.sort(key=lambda e: e["fila"])
+
+    return readings, errors
@@ -0,0 +1,165 @@
+# core/receipt_cache.py
+"""
+Caché en disco de los PDF de recibos, por tenant, en MEDIA_ROOT/receipts/<schema>/.
+
+El nombre de cada archivo es "<prefijo>-<hash>.pdf", donde el hash sale del
+contenido que se imprime (lectura, cliente, resumen de deudas anteriores,
+empresa) y de la versión del template y sus estilos. Si algo cambia, el hash
+cambia y el PDF se vuelve a generar, así que un archivo viejo nunca se sirve:
+los que ya no se piden se borran cuando la carpeta supera
+RECEIPT_CACHE_MAX_BYTES (los menos usados primero). Solo un cambio de la
+empresa borra de una vez todos los del tenant.
+
+Prefijos: "c<customer_id>" para el recibo individual y "p<AAAAMM>" para los
+documentos masivos de un periodo.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.forms.models import model_to_dict
+from django.template.loader import get_template
+
+from apps.agua.core.pdf import RECEIPT_STYLESHEETS, local_path
+
+_version = None
+_version_lock = threading.Lock()
+
+
+def cache_dir(schema_name=None):
+    return os.path.join(settings.MEDIA_ROOT, "receipts", schema_name or connection.schema_name)
+
+
+def template_version():
+    """Hash del template del recibo y de sus hojas de estilo (una vez por proceso)."""
+    global _version
+
+    if _version is None:
+        digest = hashlib.sha256()
+
+        with open(get_template("agua/recibo.html").origin.name, "rb") as f:
+            digest.update(f.read())
+
+        for static_path in RECEIPT_STYLESHEETS:
+            with open(local_path(settings.STATIC_URL + static_path), "rb") as f:
+                digest.update(f.read())
+
+        with _version_lock:
+            _version = digest.hexdigest()[:16]
+
+    return _version
+
+
+def _fingerprint(readings_context, company):
+
+    customer_fields = ("id", "codigo", "full_name", "number", "address", "category_id")
+
+    parts = [template_version(), sorted(model_to_dict(company).items()) if company else None]
+
+    for ctx in readings_context:
+        reading = ctx["reading"]
+        customer = reading.customer
+        meter = getattr(customer, "meter", None)
+
+        parts.append((
+            sorted(model_to_dict(reading).items()),
+            [getattr(customer, field) for field in customer_fields],
+            customer.category.name,
+            meter.code if meter else None,
+            [(d["year"], d["total"], d["from_month"], d["to_month"]) for d in ctx["grouped_debts"]],
+            str(ctx["total_previous_debt"]),
+            str(ctx["total_general"]),
+        ))
+
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def cached_receipts_pdf(prefix, readings_context, company, render):
+    """
+    PDF de `readings_context`, abierto en modo binario (lo cierra quien lo
+    usa, p. ej. FileResponse). Si no está en la caché se genera con `render()`
+    (que devuelve los bytes) y se guarda.
+
+    Se devuelve abierto y no la ruta porque las señales o evict() pueden borrar
+    el archivo en cualquier momento: ya abierto se sigue leyendo igual, y si se
+    borró antes de abrirlo se trata como si no estuviera.
+    """
+    directory = cache_dir()
+    path = os.path.join(directory, f"{prefix}-{_fingerprint(readings_context, company)}.pdf")
+
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            # Marca de uso para el LRU
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return f
+
+    pdf_bytes = render()
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+
+    evict(directory, keep=path)
+
+    return io.BytesIO(pdf_bytes)
+
+
+def evict(directory, max_bytes=None, keep=None):
+    """
+    Borra los PDF menos usados hasta que la carpeta quede bajo `max_bytes`.
+    `keep` (el que se acaba de guardar) no se borra aunque solo él lo supere.
+    """
+    max_bytes = settings.RECEIPT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                total += stat.st_size
+                if entry.path != keep:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _remove(schema_name, should_remove):
+
+    directory = cache_dir(schema_name)
+    if not os.path.isdir(directory):
+        return
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            prefix = entry.name.split("-", 1)[0]
+            if entry.name.endswith(".pdf") and should_remove(prefix):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def clear(schema_name):
+    """Borra todos los recibos del tenant (p. ej. si cambió la empresa)."""
+    _remove(schema_name, lambda prefix: True)
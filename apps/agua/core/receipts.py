@@ -0,0 +1,88 @@
+# core/receipts.py
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from babel.dates import format_date
+from django.db.models import Sum, Min, Max, QuerySet
+from django.db.models.functions import ExtractYear
+
+from apps.agua.models import Debt
+
+# Relaciones que usa agua/recibo.html
+RECEIPT_RELATED = ("customer", "customer__category", "customer__meter")
+
+MONTH_NAMES = {
+    month: format_date(date(2000, month, 1), "MMMM", locale="es").capitalize()
+    for month in range(1, 13)
+}
+
+
+def with_receipt_relations(readings):
+    """Queryset de lecturas con todo lo que el recibo necesita en la misma consulta."""
+    return readings.select_related(*RECEIPT_RELATED)
+
+
+def grouped_previous_debts(customer_ids, period):
+    """
+    Deudas pendientes anteriores a `period`, agrupadas por cliente y año en una
+    sola consulta (GROUP BY): {customer_id: [{"year", "total", "from_month", "to_month"}, ...]}
+    con los años de mayor a menor.
+    """
+    rows = (
+        Debt.objects.filter(customer_id__in=customer_ids, paid=False, period__lt=period)
+        .annotate(year=ExtractYear("period"))
+        .values("customer_id", "year")
+        .annotate(total=Sum("amount"), first=Min("period"), last=Max("period"))
+        .order_by("customer_id", "-year")
+    )
+
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row["customer_id"]].append({
+            "year": row["year"],
+            "total": f"{row['total']:.2f}",
+            "amount": row["total"],
+            "from_month": MONTH_NAMES[row["first"].month],
+            "to_month": MONTH_NAMES[row["last"].month],
+        })
+
+    return grouped
+
+
+def build_receipts_context(readings):
+    """
+    Arma el `readings_context` de agua/recibo.html para un lote de lecturas.
+
+    Las deudas anteriores se calculan con una consulta GROUP BY por periodo
+    distinto del lote (normalmente uno solo) y, si se pasa un queryset, los
+    datos del cliente llegan con select_related.
+    """
+    if isinstance(readings, QuerySet):
+        readings = with_receipt_relations(readings)
+
+    readings = list(readings)
+
+    by_period = defaultdict(list)
+    for reading in readings:
+        by_period[reading.period].append(reading.customer_id)
+
+    previous = {}
+    for period, customer_ids in by_period.items():
+        for customer_id, groups in grouped_previous_debts(customer_ids, period).items():
+            previous[(customer_id, period)] = groups
+
+    context = []
+    for reading in readings:
+
+        grouped_debts = previous.get((reading.customer_id, reading.period), [])
+        total_previous_debt = sum((d["amount"] for d in grouped_debts), Decimal("0.00")) if grouped_debts else 0
+
+        context.append({
+            "reading": reading,
+            "grouped_debts": grouped_debts,
+            "total_previous_debt": total_previous_debt,
+            "total_general": reading.total_amount + total_previous_debt,
+        })
+
+    return context
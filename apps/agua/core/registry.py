@@ -0,0 +1,90 @@
+# core/registry.py
+import threading
+import time
+
+from django.db import connection
+from django.db.models import F
+
+from apps.agua.models import CashConcept, Category, RegistryVersion
+
+# Cada cuántos segundos un proceso vuelve a leer la versión de la base; los
+# cambios hechos en el mismo proceso se ven de inmediato
+VERSION_CHECK_SECONDS = 2
+
+_lock = threading.Lock()
+_registries = {}  # schema_name -> Registry
+
+
+class Registry:
+    """
+    Datos de referencia de un tenant (conceptos de caja y categorías) en memoria.
+    """
+
+    def __init__(self, version, concepts, categories):
+
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.concepts = {c.code: c for c in concepts}
+        self.categories = {c.id: c for c in categories}
+
+    def concept(self, code):
+
+        try:
+            return self.concepts[code]
+        except KeyError:
+            raise CashConcept.DoesNotExist(f"No existe el concepto de caja {code}")
+
+    def category(self, category_id):
+
+        try:
+            return self.categories[category_id]
+        except KeyError:
+            raise Category.DoesNotExist(f"No existe la categoría {category_id}")
+
+
+def _version():
+
+    version = RegistryVersion.objects.values_list("version", flat=True).first()
+
+    if version is None:
+        version = RegistryVersion.objects.get_or_create(pk=1)[0].version
+
+    return version
+
+
+def get_registry():
+    """
+    Registro del tenant activo. Cada VERSION_CHECK_SECONDS lee el contador de
+    versión (RegistryVersion, en la base del tenant) y solo recarga si cambió,
+    así todos los procesos ven los cambios hechos por cualquiera de ellos.
+    """
+    schema_name = connection.schema_name
+
+    registry = _registries.get(schema_name)
+    if registry is not None and time.monotonic() - registry.checked_at < VERSION_CHECK_SECONDS:
+        return registry
+
+    version = _version()
+
+    if registry is not None and registry.version == version:
+        registry.checked_at = time.monotonic()
+        return registry
+
+    registry = Registry(version, CashConcept.objects.all(), Category.objects.all())
+
+    with _lock:
+        _registries[schema_name] = registry
+
+    return registry
+
+
+def invalidate(schema_name=None):
+    """Descarta el registro local y sube la versión para el resto de procesos."""
+    schema_name = schema_name or connection.schema_name
+
+    with _lock:
+        _registries.pop(schema_name, None)
+
+    # Atómico en la base: dos invalidaciones a la vez suben dos versiones
+    if not RegistryVersion.objects.filter(pk=1).update(version=F("version") + 1):
+        RegistryVersion.objects.get_or_create(pk=1, defaults={"version": 1})
@@ -0,0 +1,59 @@
+# core/streaming_zip.py
+"""
+ZIP que se arma mientras se envía (StreamingHttpResponse).
+
+zipfile escribe sobre un buffer que no se puede rebobinar (usa descriptores
+de datos al final de cada entrada) y, después de cada entrada, se entrega lo
+acumulado. En memoria queda a lo sumo una entrada.
+"""
+import shutil
+import zipfile
+
+# Bytes que se copian por vez desde un archivo abierto
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _DrainBuffer:
+    """Destino de escritura sin seek: guarda los bytes hasta que se piden."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """
+    Genera los bytes de un ZIP con `entries`, un iterable (puede ser perezoso)
+    de (nombre, contenido), donde contenido son bytes, la ruta de un archivo
+    o un archivo ya abierto en modo binario (se cierra después de copiarlo).
+    """
+    buffer = _DrainBuffer()
+
+    with zipfile.ZipFile(buffer, "w", compression) as zip_file:
+        for name, content in entries:
+
+            if isinstance(content, (bytes, bytearray)):
+                zip_file.writestr(name, content)
+            elif hasattr(content, "read"):
+                with content, zip_file.open(name, "w") as dest:
+                    shutil.copyfileobj(content, dest, COPY_CHUNK_SIZE)
+            else:
+                zip_file.write(content, arcname=name)
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # Directorio central
+    yield buffer.drain()
@@ -0,0 +1,340 @@
+# core/validation.py
+"""
+Validación en seco (`?dry_run=1`) de los archivos de importación.
+
+Cada validador revisa un DataFrame completo con operaciones vectorizadas de
+pandas (sin recorrer celda por celda) y acumula por fila, sin escribir nada
+en la base, lo mismo que hará el importador: en `errores` las filas que va a
+omitir y en `avisos` las que importa igual pero de otra forma que la escrita
+(p. ej. sin medidor o con la última fila repetida). El índice del DataFrame
+debe ser el número de fila del Excel; `validate_batches` recibe los lotes de
+workbook.iter_batches y los duplicados entre lotes se detectan igual.
+"""
+import numpy as np
+import pandas as pd
+
+from apps.agua.models import Customer, Calle, WaterMeter
+from apps.agua.core.registry import get_registry
+from apps.agua.core.importers import READING_MONTH_COLUMNS
+from apps.agua.utils import generar_periodos, to_none_if_empty
+
+TRUE_VALUES = ("1", "true", "si", "yes")
+
+
+def wants_dry_run(params):
+    """True si la petición trae ?dry_run=1 (o true/si)."""
+    return str(params.get("dry_run", "")).strip().lower() in TRUE_VALUES
+
+
+def _text(series):
+    """Texto sin espacios; vacíos y NaN quedan como <NA>."""
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def _number(series):
+    """(valores numéricos, máscara de celdas con texto no numérico)."""
+    values = pd.to_numeric(series, errors="coerce")
+    return values, values.isna() & _text(series).notna()
+
+
+def _valid_months(meses):
+    """True si generar_periodos (el del importador) entiende el rango y no queda vacío."""
+    try:
+        return bool(generar_periodos(2000, meses))
+    except Exception:
+        return False
+
+
+def _integer_code(series):
+    """Códigos numéricos como texto sin decimales ("3.0" -> "3")."""
+    text = _text(series)
+    values = pd.to_numeric(text, errors="coerce")
+    integral = values.notna() & (values == values.round())
+    return text.where(~integral, values.where(integral).astype("Int64").astype("string"))
+
+
+class ImportValidator:
+
+    # Columnas que el archivo debe traer
+    required_columns = ()
+    code_column = "Codigo"
+
+    def __init__(self):
+
+        self.rows = 0
+        self.errors = []
+        self.warnings = []
+
+    def validate(self, df):
+
+        missing = [c for c in self.required_columns if c not in df.columns]
+        if missing:
+            if not self.rows:
+                self.errors.append({"fila": None, "codigo": None, "error": f"Faltan columnas: {', '.join(missing)}"})
+            self.rows += len(df)
+            return self
+
+        self.rows += len(df)
+        self.check(df)
+
+        return self
+
+    def validate_batches(self, batches):
+        """Valida los lotes de (fila_excel, dict) de workbook.iter_batches."""
+        for batch in batches:
+            self.validate(pd.DataFrame([row for _, row in batch], index=[fila for fila, _ in batch]))
+
+        return self
+
+    def check(self, df):
+        """Revisa un lote con las columnas requeridas; cada validador define la suya."""
+
+    def add(self, df, mask, message, target=None):
+        """Registra `message` para las filas donde `mask` es True (en errores, o en `target`)."""
+        target = self.errors if target is None else target
+
+        mask = np.asarray(mask.fillna(False) if hasattr(mask, "fillna") else mask, dtype=bool)
+        if not mask.any():
+            return
+
+        codes = _text(df[self.code_column]) if self.code_column in df.columns else pd.Series(pd.NA, index=df.index)
+
+        for fila, codigo in zip(df.index[mask], codes[mask]):
+            target.append({
+                "fila": int(fila),
+                "codigo": None if pd.isna(codigo) else codigo,
+                "error": message,
+            })
+
+    def warn(self, df, mask, message):
+        """Como add(), para filas que el importador sí carga."""
+        self.add(df, mask, message, target=self.warnings)
+
+    def repeated(self, keys, seen):
+        """Máscara de claves repetidas en el archivo (también entre lotes); actualiza `seen`."""
+        present = keys.notna()
+        mask = present & (keys.duplicated() | keys.isin(seen))
+        seen.update(keys[present].tolist())
+        return mask
+
+    def report(self):
+
+        for rows in (self.errors, self.warnings):
+            rows.sort(key=lambda e: (e["fila"] is not None, e["fila"] or 0))
+
+        return {
+            "dry_run": True,
+            "filas": self.rows,
+            "errores": self.errors,
+            "avisos": self.warnings,
+        }
+
+
+class CustomerFileValidator(ImportValidator):
+    """Padrón de clientes (CustomerViewSet.import_excel)."""
+
+    required_columns = ("Codigo",)
+
+    def __init__(self):
+
+        super().__init__()
+        self.seen_codes = set()
+        self.seen_meters = set()
+        self.categories = set(get_registry().categories)
+        self.calles = set(Calle.objects.values_list("id", flat=True))
+
+    def check(self, df):
+
+        codigo = _text(df["Codigo"])
+        self.add(df, codigo.isna(), "Falta el código del cliente")
+
+        # El importador no exige códigos únicos: estos clientes se crean igual
+        self.warn(df, self.repeated(codigo, self.seen_codes), "Código repetido en el archivo; se crea otro cliente")
+
+        existing = set(Customer.objects.filter(codigo__in=codigo.dropna().unique().tolist()).values_list("codigo", flat=True))
+        self.warn(df, codigo.isin(existing), "El cliente ya existe; se crea otro con el mismo código")
+
+        if "DNI/RUC." in df.columns:
+            number = _integer_code(df["DNI/RUC."])
+            valid = number.str.fullmatch(r"\d{8}|\d{11}")
+            self.warn(df, number.notna() & ~valid.fillna(False), "Documento inválido (debe tener 8 u 11 dígitos)")
+
+        if "cod_categ" in df.columns:
+            category, invalid = _number(df["cod_categ"])
+            # El importador toma la parte entera (int(float(...)))
+            self.add(df, invalid | ~np.trunc(category.fillna(6)).isin(self.categories), "Categoría no existe")
+
+        if "cod_direc" in df.columns:
+            calle, invalid = _number(df["cod_direc"])
+            self.add(df, invalid | ~np.trunc(calle.fillna(1)).isin(self.calles), "Calle no existe")
+
+        if "Cod.Medidor" in df.columns:
+            meter = _text(df["Cod.Medidor"])
+
+            if "T.Med." in df.columns:
+                meter = meter.mask(_text(df["T.Med."]).fillna("") == "no")
+
+            # El importador crea el cliente sin medidor
+            self.warn(df, self.repeated(meter, self.seen_meters), "Medidor repetido en el archivo; cliente importado sin medidor")
+
+            existing = set(WaterMeter.objects.filter(code__in=meter.dropna().unique().tolist()).values_list("code", flat=True))
+            self.warn(df, meter.isin(existing), "El medidor ya existe; cliente importado sin medidor")
+
+
+class ReadingFileValidator(ImportValidator):
+    """Lecturas mensuales por cliente (ReadingViewSet.import_excel)."""
+
+    required_columns = ("Codigo",)
+
+    def __init__(self):
+
+        super().__init__()
+        self.seen_codes = set()
+
+    def check(self, df):
+
+        codigo = _text(df["Codigo"])
+        self.add(df, codigo.isna(), "Falta el código del cliente")
+        self.add(df, self.repeated(codigo, self.seen_codes), "Código repetido en el archivo")
+
+        existing = set(Customer.objects.filter(codigo__in=codigo.dropna().unique().tolist()).values_list("codigo", flat=True))
+        self.add(df, codigo.notna() & ~codigo.isin(existing), "Cliente no encontrado")
+
+        readings = {}
+        for _, lect_col, *other_cols in READING_MONTH_COLUMNS:
+            for column in (lect_col, *other_cols):
+                if column not in df.columns:
+                    continue
+
+                values, invalid = _number(df[column])
+                self.add(df, invalid, f"Valor no numérico en {column}")
+
+                if column == lect_col:
+                    readings[column] = values
+
+        if not readings:
+            return
+
+        # Cada lectura debe ser mayor o igual que la última lectura informada antes
+        lect = pd.DataFrame(readings)
+        previous = lect.ffill(axis=1).shift(axis=1)
+        decreasing = lect < previous
+
+        bad = decreasing.any(axis=1)
+        first_bad = decreasing.idxmax(axis=1)
+
+        for column in lect.columns:
+            self.add(df, bad & (first_bad == column), f"La lectura de {column} es menor que la anterior")
+
+
+class DebtFileValidator(ImportValidator):
+    """Deudas históricas: Codigo, Año, Meses, Agua (DebtViewSet.import_excel)."""
+
+    required_columns = ("Codigo", "Año", "Meses", "Agua")
+
+    def __init__(self):
+
+        super().__init__()
+        self.seen_keys = set()
+
+    def check(self, df):
+
+        # El importador ignora las filas del 2025
+        year, invalid_year = _number(df["Año"])
+        df = df[year != 2025]
+        year, invalid_year = year[df.index], invalid_year[df.index]
+
+        # Como el importador: un año con decimales no se redondea
+        integral = year.notna() & (year == year.round()) & year.between(1, 9999)
+
+        codigo = _text(df["Codigo"])
+        existing = set(Customer.objects.filter(codigo__in=codigo.dropna().unique().tolist()).values_list("codigo", flat=True))
+        meses = df["Meses"].map(to_none_if_empty)
+        # Mismo parseo que el importador (el año no cambia los meses)
+        valid_months = meses.map(_valid_months, na_action="ignore").fillna(False).astype(bool)
+        _, invalid_total = _number(df["Agua"])
+
+        checks = [
+            (codigo.isna(), "Falta el código del cliente"),
+            (invalid_year | ~integral, "Año inválido"),
+            (codigo.notna() & ~codigo.isin(existing), "Cliente no encontrado"),
+            (meses.isna(), "Campo 'Meses' vacio"),
+            (meses.notna() & ~valid_months, "Rango de meses inválido"),
+            (invalid_total, "Monto de agua no numérico"),
+        ]
+
+        rejected = pd.Series(False, index=df.index)
+        for mask, message in checks:
+            mask = mask.fillna(False).astype(bool)
+            self.add(df, mask, message)
+            rejected |= mask
+
+        # El importador se queda con la última fila de cada cliente y periodo
+        replaces = pd.Series(False, index=df.index)
+        for fila in df.index[~rejected]:
+            keys = {(codigo[fila], period) for period in generar_periodos(int(year[fila]), meses[fila])}
+            replaces[fila] = not keys.isdisjoint(self.seen_keys)
+            self.seen_keys.update(keys)
+
+        self.warn(df, replaces, "Periodos repetidos en el archivo; esta fila reemplaza a la anterior")
+
+
+class CategoryFileValidator(ImportValidator):
+    """Categorías: codigo, descrip, agua (CategoryViewSet.import_excel)."""
+
+    required_columns = ("codigo", "descrip", "agua")
+    code_column = "codigo"
+
+    def __init__(self):
+
+        super().__init__()
+        self.seen_codes = set()
+
+    def check(self, df):
+
+        codigo = _integer_code(df["codigo"]).str.zfill(2)
+        self.add(df, codigo.isna(), "Falta el código de la categoría")
+        self.add(df, codigo.str.len() > 2, "El código debe tener 2 dígitos")
+        self.add(df, self.repeated(codigo, self.seen_codes), "Código repetido en el archivo")
+
+        self.add(df, _text(df["descrip"]).isna(), "Falta la descripción")
+
+        price, invalid = _number(df["agua"])
+        self.add(df, invalid | price.isna() | (price < 0), "Precio de agua inválido")
+
+
+class StreetFileValidator(ImportValidator):
+    """Vías y calles: tipo_dir, abrv, codigo, nombre (ViaViewSet.import_excel)."""
+
+    required_columns = ("tipo_dir", "abrv", "codigo", "nombre")
+    code_column = "codigo"
+
+    def __init__(self):
+
+        super().__init__()
+        self.seen_codes = set()
+        self.seen_streets = set()
+        # codigo de calle -> "nombre|codigo de vía" de la calle que ya lo usa
+        self.calles = {
+            codigo: f"{name}|{via_codigo}"
+            for codigo, name, via_codigo in Calle.objects.values_list("codigo", "name", "via__codigo")
+        }
+
+    def check(self, df):
+
+        via = _integer_code(df["tipo_dir"]).str.zfill(2)
+        name = _text(df["nombre"])
+        codigo = _text(df["codigo"])
+
+        self.add(df, via.isna(), "Falta el código de vía (tipo_dir)")
+        self.add(df, via.str.len() > 2, "El código de vía debe tener 2 dígitos")
+        self.add(df, name.isna(), "Falta el nombre de la calle")
+
+        street = name + "|" + via
+        self.add(df, self.repeated(street, self.seen_streets), "Calle repetida en el archivo")
+        self.add(df, self.repeated(codigo, self.seen_codes), "Código de calle repetido en el archivo")
+
+        # Un código ya usado por otra calle haría fallar el INSERT
+        used_by = codigo.map(self.calles)
+        self.add(df, used_by.notna() & (used_by != street.fillna("")), "El código de calle ya pertenece a otra calle")
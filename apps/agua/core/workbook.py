@@ -0,0 +1,199 @@
+# core/workbook.py
+"""
+Lector compartido de archivos de importación (.xlsx, .xls y .csv).
+
+Las filas se leen en streaming y se entregan en lotes de (fila_excel, dict),
+así la memoria depende del tamaño del lote y no del archivo.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Filas del archivo que se entregan por lote
+IMPORT_BATCH_SIZE = 1000
+
+INTEGER_RE = re.compile(r"^-?\d+$")
+DECIMAL_RE = re.compile(r"^-?\d*\.\d+$")
+
+
+class WorkbookError(Exception):
+    """El archivo no se pudo leer (formato no soportado o archivo dañado)."""
+
+
+def _extension(file):
+    return os.path.splitext(getattr(file, "name", "") or "")[1].lower()
+
+
+def _csv_value(value):
+    """Tipa una celda de CSV como lo haría Excel: entero, decimal o texto."""
+    if value is None:
+        return None
+
+    value = value.strip()
+
+    if value == "":
+        return None
+    if INTEGER_RE.match(value):
+        return int(value)
+    if DECIMAL_RE.match(value):
+        return float(value)
+
+    return value
+
+
+def _xls_value(value):
+    # xlrd devuelve todos los números como float
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+
+    return value
+
+
+def _iter_xlsx(file):
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_xls(file):
+
+    import xlrd
+
+    book = xlrd.open_workbook(file_contents=file.read(), on_demand=True)
+
+    try:
+        sheet = book.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            yield [_xls_value(value) for value in sheet.row_values(index)]
+    finally:
+        book.release_resources()
+
+
+def _iter_csv(file, delimiter=None):
+
+    text = io.TextIOWrapper(getattr(file, "file", file), encoding="utf-8-sig", newline="")
+
+    try:
+        if delimiter is None:
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+            except csv.Error:
+                delimiter = ","
+
+        # Las celdas quedan como texto; se tipan al armar la fila según `dtype`
+        for values in csv.reader(text, delimiter=delimiter):
+            yield [value if value.strip() else None for value in values]
+    finally:
+        # No cerrar el archivo subido junto con el wrapper
+        text.detach()
+
+
+def _iter_values(file):
+
+    """(filas, celdas_en_texto) según la extensión del archivo."""
+    extension = _extension(file)
+
+    if extension == ".csv":
+        return _iter_csv(file), True
+    if extension == ".xls":
+        return _iter_xls(file), False
+
+    return _iter_xlsx(file), False
+
+
+def _typed(value, converter):
+
+    if value is None:
+        return None
+    if converter is str:
+        return str(value).strip()
+
+    return converter(value)
+
+
+def iter_batches(file, header=0, batch_size=IMPORT_BATCH_SIZE, dtype=None):
+    """
+    Lee la primera hoja (o el CSV) y devuelve lotes de (fila_excel, dict).
+
+    `header` es el índice (desde 0) de la fila de encabezados, como en
+    pd.read_excel; `dtype` es {columna: conversor}, p. ej. {"Codigo": str}.
+    Las filas vacías se omiten. Lanza WorkbookError si el archivo no se puede leer.
+    """
+    dtype = dtype or {}
+
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+    try:
+        rows, as_text = _iter_values(file)
+
+        for _ in range(header):
+            next(rows, None)
+
+        columns = [
+            str(name).strip() if name is not None else f"Unnamed: {i}"
+            for i, name in enumerate(next(rows, None) or [])
+        ]
+
+        # Con dos columnas del mismo nombre el dict de la fila se quedaría con la última
+        repeated = sorted({column for column in columns if columns.count(column) > 1})
+        if repeated:
+            raise WorkbookError(f"Encabezados repetidos: {', '.join(repeated)}")
+        # Sin conversor explícito, las celdas de un CSV se tipan como en Excel
+        default = _csv_value if as_text else None
+        converters = [dtype.get(column, default) for column in columns]
+
+        batch = []
+        for excel_row, values in enumerate(rows, start=header + 2):
+
+            if not any(v is not None and str(v).strip() != "" for v in values):
+                continue
+
+            batch.append((excel_row, {
+                column: _typed(value, converter) if converter else value
+                for column, converter, value in zip(columns, converters, values)
+            }))
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    except (InvalidFileException, zipfile.BadZipFile, UnicodeDecodeError, csv.Error) as e:
+        raise WorkbookError(str(e)) from e
+    except Exception as e:
+        # xlrd tiene su propia jerarquía de errores
+        if type(e).__module__.startswith("xlrd"):
+            raise WorkbookError(str(e)) from e
+        raise
+
+
+def iter_rows(file, header=0, batch_size=IMPORT_BATCH_SIZE, dtype=None):
+    """Como iter_batches, pero fila por fila."""
+    for batch in iter_batches(file, header=header, batch_size=batch_size, dtype=dtype):
+        yield from batch
+
+
+def sorted_rows(file, column, header=0, dtype=None):
+    """
+    Todas las filas del archivo ordenadas por `column` (las vacías al final,
+    como DataFrame.sort_values). Carga el archivo entero: solo para catálogos
+    chicos (categorías, vías y calles).
+    """
+    rows = iter_rows(file, header=header, dtype=dtype)
+    return sorted(rows, key=lambda item: (item[1].get(column) is None, str(item[1].get(column))))
@@ -0,0 +1,95 @@
+# management/commands/_bench.py
+"""
+Utilidades comunes de los comandos bench_* (no es un comando: empieza con "_").
+"""
+import statistics
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from apps.agua.core import pdf
+
+
+def timed(fn):
+    """Ejecuta `fn` y devuelve los milisegundos que tomó."""
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def summarize(samples):
+    """p50/p95/máximo de una lista de milisegundos."""
+    samples = sorted(samples)
+
+    return {
+        "n": len(samples),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+class _TimedTemplate:
+
+    def __init__(self, template, stages):
+        self.template = template
+        self.stages = stages
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.template.render(*args, **kwargs)
+        finally:
+            self.stages["template_ms"] += (time.perf_counter() - start) * 1000
+
+
+class _TimedExecutor:
+    """Pool de core.pdf que mide el map completo como escritura del PDF."""
+
+    def __init__(self, executor, stages, write_pdf):
+        self.executor = executor
+        self.stages = stages
+        self.write_pdf = write_pdf
+
+    def map(self, fn, *iterables):
+        start = time.perf_counter()
+        try:
+            # Al pool va la función original: la medida no se puede serializar
+            return list(self.executor.map(self.write_pdf, *iterables))
+        finally:
+            self.stages["pdf_ms"] += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def pdf_stages():
+    """
+    Mide por separado, dentro de core.pdf, el render de los templates, la
+    escritura del PDF (en este proceso o en el pool) y la unión de los bloques.
+    Devuelve el dict de milisegundos, que se completa al salir.
+    """
+    stages = {"template_ms": 0.0, "pdf_ms": 0.0, "merge_ms": 0.0}
+
+    template, write_pdf, merge_pdfs, get_executor = pdf.template, pdf.write_pdf, pdf.merge_pdfs, pdf._get_executor
+
+    def timed_write_pdf(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return write_pdf(*args, **kwargs)
+        finally:
+            stages["pdf_ms"] += (time.perf_counter() - start) * 1000
+
+    def timed_merge_pdfs(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return merge_pdfs(*args, **kwargs)
+        finally:
+            stages["merge_ms"] += (time.perf_counter() - start) * 1000
+
+    with mock.patch.object(pdf, "template", lambda name: _TimedTemplate(template(name), stages)), \
+            mock.patch.object(pdf, "write_pdf", timed_write_pdf), \
+            mock.patch.object(pdf, "merge_pdfs", timed_merge_pdfs), \
+            mock.patch.object(pdf, "_get_executor", lambda: _TimedExecutor(get_executor(), stages, write_pdf)):
+        yield stages
+
+    for key in stages:
+        stages[key] = round(stages[key], 2)
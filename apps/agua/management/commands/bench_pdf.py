@@ -0,0 +1,346 @@
+# management/commands/bench_pdf.py
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate, now
+from django_tenants.utils import tenant_context
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.tenant.models import Client
+from apps.user.models import User
+from apps.agua import views
+from apps.agua.core import receipt_cache, cash_rollup
+from apps.agua.core.billing import DETAIL_FIELDS
+from apps.agua.models import (
+    Company, CashConcept, Category, Via, Calle, Zona, Customer, WaterMeter, Reading, Debt, DebtDetail,
+    ReadingGeneration, CashBox, CashOutflow, CashMovement, Invoice, InvoiceDebt, InvoicePayment
+)
+from apps.agua.utils import generate_daily_report
+
+from ._bench import timed, summarize, pdf_stages
+
+SEED_BATCH_SIZE = 2000
+
+CALLES = 20
+ZONAS = 5
+
+# Meses de deuda anteriores al periodo del recibo
+PREVIOUS_MONTHS = 6
+
+# Un cliente de cada tantos tiene un ticket pagado hoy (para los reportes de caja)
+INVOICE_EVERY = 10
+
+# Acciones medidas: nombre -> (viewset, acción, pk, parámetros); el pk sale de la semilla
+ACTIONS = {
+    "receipt": (views.ReadingViewSet, "receipt", "customer", {}),
+    "download_all_receipts": (views.ReadingGenerationViewSet, "download_all_receipts", "generation", {}),
+    "download_receipts": (views.ReadingGenerationViewSet, "download_receipts", "generation", {}),
+    "ticket_pdf": (views.InvoiceViewSet, "ticket_pdf", "invoice", {}),
+    "customer_debt_report": (views.CustomerViewSet, "report", None, {}),
+    "cashbox_report": (views.CashBoxViewSet, "report", "cashbox", {}),
+    "daily_cash_report": (views.DailyCashReportViewSet, "report", "daily_report", {}),
+}
+
+# Acciones que pasan por la caché de recibos (core.receipt_cache)
+CACHED_ACTIONS = ("receipt", "download_all_receipts", "download_receipts")
+
+
+def seed(size, user):
+    """
+    Llena el tenant activo con `size` clientes sintéticos: una lectura y su
+    deuda en el periodo actual, PREVIOUS_MONTHS deudas anteriores y un ticket
+    pagado hoy por cada INVOICE_EVERY clientes. Devuelve los pk que usan las
+    acciones medidas.
+    """
+    today = localdate()
+    period = today.replace(day=1)
+
+    Company.objects.create(name="EMPRESA DE PRUEBA", ruc="20000000001", address="AV. PRINCIPAL 100")
+
+    concepts = {
+        code: CashConcept.objects.create(code=code, name=name, type="income")
+        for code, name in (("001", "Agua"), ("002", "Desagüe"), ("003", "Cargo fijo"))
+    }
+    category = Category.objects.create(
+        codigo="01", name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50"),
+        price_fixed_charge=Decimal("1.00"),
+    )
+
+    via = Via.objects.create(codigo="01", name="JIRON")
+    calles = Calle.objects.bulk_create([Calle(codigo=f"{i:04d}", via=via, name=f"CALLE {i}") for i in range(1, CALLES + 1)])
+    zonas = Zona.objects.bulk_create([Zona(codigo=f"{i:02d}", name=f"ZONA {i}") for i in range(1, ZONAS + 1)])
+
+    customers = Customer.objects.bulk_create([
+        Customer(
+            codigo=f"{i:05d}", full_name=f"CLIENTE DE PRUEBA {i}", number=f"{40000000 + i}",
+            address=f"JR. LIMA {i}", category=category, calle=calles[i % CALLES], zona=zonas[i % ZONAS],
+        )
+        for i in range(1, size + 1)
+    ], batch_size=SEED_BATCH_SIZE)
+
+    WaterMeter.objects.bulk_create([
+        WaterMeter(customer=customer, code=f"M{customer.codigo}", installation_date=period - relativedelta(years=2))
+        for customer in customers
+    ], batch_size=SEED_BATCH_SIZE)
+
+    readings = []
+    for i, customer in enumerate(customers):
+        reading = Reading(
+            customer=customer, period=period, date_of_issue=today,
+            date_of_due=today + timedelta(days=15), date_of_cute=today + timedelta(days=20),
+            previous_reading=Decimal(100 + i % 50), current_reading=Decimal(112 + i % 50 + i % 7), has_meter=True,
+        )
+        reading.consumption = reading.current_reading - reading.previous_reading
+        reading.total_water = reading.consumption * category.price_water
+        reading.total_sewer = category.price_sewer
+        reading.total_fixed_charge = category.price_fixed_charge
+        reading.total_amount = reading.total_water + reading.total_sewer + reading.total_fixed_charge
+        readings.append(reading)
+
+    Reading.objects.bulk_create(readings, batch_size=SEED_BATCH_SIZE)
+
+    debts = [
+        Debt(customer=r.customer, period=period, reading=r, amount=r.total_amount, description="Deuda por consumo de agua/desagüe")
+        for r in readings
+    ]
+    for months in range(1, PREVIOUS_MONTHS + 1):
+        debts += [
+            Debt(customer=r.customer, period=period - relativedelta(months=months), amount=r.total_amount,
+                 description="Deuda por consumo de agua/desagüe")
+            for r in readings
+        ]
+
+    Debt.objects.bulk_create(debts, batch_size=SEED_BATCH_SIZE)
+
+    reading_by_customer = {r.customer_id: r for r in readings}
+    DebtDetail.objects.bulk_create([
+        DebtDetail(debt=debt, concept=concepts[code], amount=getattr(reading_by_customer[debt.customer_id], field))
+        for debt in debts
+        for code, field in DETAIL_FIELDS
+    ], batch_size=SEED_BATCH_SIZE)
+
+    # Tickets de hoy: pagan la deuda más antigua de uno de cada INVOICE_EVERY clientes
+    oldest = period - relativedelta(months=PREVIOUS_MONTHS)
+    paid = [d for d in debts if d.period == oldest][::INVOICE_EVERY]
+
+    cashbox = CashBox.objects.create(user=user, opening_balance=Decimal("100.00"))
+    methods = [code for code, _ in InvoicePayment.PAYMENT_METHODS]
+
+    invoices = Invoice.objects.bulk_create([
+        Invoice(code=f"{n:07d}", customer=debt.customer, total=debt.amount)
+        for n, debt in enumerate(paid, start=1)
+    ], batch_size=SEED_BATCH_SIZE)
+
+    InvoiceDebt.objects.bulk_create([
+        InvoiceDebt(invoice=invoice, debt=debt, total=debt.amount) for invoice, debt in zip(invoices, paid)
+    ], batch_size=SEED_BATCH_SIZE)
+
+    payments = InvoicePayment.objects.bulk_create([
+        InvoicePayment(invoice=invoice, cashbox=cashbox, method=methods[n % len(methods)], total=invoice.total)
+        for n, invoice in enumerate(invoices)
+    ], batch_size=SEED_BATCH_SIZE)
+
+    CashMovement.objects.bulk_create([
+        CashMovement(
+            cashbox=cashbox, concept=concepts[code], method=payment.method, invoice_payment=payment,
+            total=getattr(reading_by_customer[debt.customer_id], field),
+        )
+        for payment, debt in zip(payments, paid)
+        for code, field in DETAIL_FIELDS
+    ], batch_size=SEED_BATCH_SIZE)
+
+    Debt.objects.filter(id__in=[d.id for d in paid]).update(paid=True)
+
+    # bulk_create no pasa por CashMovement.save()
+    cash_rollup.rebuild([cashbox.id])
+
+    CashOutflow.objects.create(cashbox=cashbox, method="cash", total=Decimal("50.00"), notes="Depósito")
+
+    generation = ReadingGeneration.objects.create(
+        period=period, date_of_issue=today, date_of_due=today + timedelta(days=15),
+        date_of_cute=today + timedelta(days=20), total_generated=size,
+    )
+
+    return {
+        "customer": customers[0].id,
+        "generation": generation.id,
+        "invoice": invoices[0].id,
+        "cashbox": cashbox.id,
+        "daily_report": generate_daily_report(cashbox, today).id,
+    }
+
+
+def existing_pks():
+    """pk de las acciones en un tenant ya sembrado (--reuse)."""
+    cashbox = CashBox.objects.order_by("id").first()
+
+    return {
+        "customer": Reading.objects.order_by("customer__codigo").values_list("customer_id", flat=True).first(),
+        "generation": ReadingGeneration.objects.order_by("-period").values_list("id", flat=True).first(),
+        "invoice": Invoice.objects.order_by("id").values_list("id", flat=True).first(),
+        "cashbox": cashbox.id if cashbox else None,
+        "daily_report": generate_daily_report(cashbox, localdate()).id if cashbox else None,
+    }
+
+
+def _consume(response):
+    """Bytes del cuerpo, también de las respuestas en streaming (ZIP, FileResponse)."""
+    try:
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+    finally:
+        response.close()
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Crea tenants sintéticos (100, 1k y 10k clientes por defecto) y mide tiempo y memoria de los "
+        "recibos, tickets y reportes en PDF, con el render del template y la escritura del PDF por separado. "
+        "El resultado es JSON para comparar corridas antes y después de un cambio."
+    )
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--sizes", default="100,1000,10000", help="Clientes por tenant, separados por coma")
+        parser.add_argument("--actions", default=",".join(ACTIONS), help="Acciones a medir, separadas por coma")
+        parser.add_argument("--iterations", type=int, default=3)
+        parser.add_argument("--output", help="Archivo JSON de salida (por defecto se imprime)")
+        parser.add_argument("--keep", action="store_true", help="No borrar los schemas bench_* al terminar")
+        parser.add_argument("--reuse", action="store_true", help="Usar los schemas bench_* existentes sin volver a sembrar")
+
+    def handle(self, *args, **options):
+
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        actions = [name.strip() for name in options["actions"].split(",") if name.strip()]
+
+        unknown = set(actions) - set(ACTIONS)
+        if unknown:
+            raise CommandError(f"Acciones desconocidas: {', '.join(sorted(unknown))}")
+
+        user, _ = User.objects.get_or_create(
+            username="bench", defaults={"email": "bench@example.com", "name": "Benchmark"}
+        )
+
+        result = {
+            "fecha": now().isoformat(),
+            "commit": self.commit(),
+            "python": platform.python_version(),
+            "receipt_render_workers": settings.RECEIPT_RENDER_WORKERS,
+            "receipt_shard_size": settings.RECEIPT_SHARD_SIZE,
+            "iteraciones": options["iterations"],
+            "tenants": {},
+        }
+
+        for size in sizes:
+            result["tenants"][str(size)] = self.bench_tenant(size, user, actions, options)
+
+        output = json.dumps(result, indent=2, default=str)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def commit(self):
+
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR
+            ).stdout.strip() or None
+        except OSError:
+            return None
+
+    def bench_tenant(self, size, user, actions, options):
+
+        schema_name = f"bench_{size}"
+        tenant = Client.objects.filter(schema_name=schema_name).first()
+
+        if tenant and not options["reuse"]:
+            tenant.delete()
+            tenant = None
+
+        created = tenant is None
+        if created:
+            tenant = Client(schema_name=schema_name)
+            tenant.save()
+
+        try:
+            with tenant_context(tenant):
+
+                report = {"seed_ms": None, "acciones": {}}
+
+                if created:
+                    self.stderr.write(f"Sembrando {size} clientes en {schema_name}...")
+                    start = time.perf_counter()
+                    pks = seed(size, user)
+                    report["seed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                else:
+                    pks = existing_pks()
+
+                for name in actions:
+                    self.stderr.write(f"  {schema_name}: {name}")
+                    report["acciones"][name] = self.bench_action(name, pks, user, schema_name, options["iterations"])
+
+            return report
+
+        finally:
+            if created and not options["keep"]:
+                tenant.delete()
+
+    def bench_action(self, name, pks, user, schema_name, iterations):
+
+        viewset, action, pk_key, params = ACTIONS[name]
+        view = viewset.as_view({"get": action})
+        kwargs = {"pk": pks[pk_key]} if pk_key else {}
+
+        factory = APIRequestFactory()
+        last = {}
+
+        def call():
+            request = factory.get(f"/bench/{name}/", params)
+            force_authenticate(request, user=user)
+            response = view(request, **kwargs)
+            last["status"], last["bytes"] = response.status_code, _consume(response)
+
+        samples, stages, peaks = [], [], []
+
+        for _ in range(iterations):
+
+            # Sin caché: se mide el render completo
+            receipt_cache.clear(schema_name)
+
+            tracemalloc.start()
+            with pdf_stages() as stage:
+                samples.append(timed(call))
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+            tracemalloc.stop()
+
+            stages.append(stage)
+
+        report = {
+            "status": last["status"],
+            "bytes": last["bytes"],
+            "total": summarize(samples),
+            "template": summarize([s["template_ms"] for s in stages]),
+            "pdf": summarize([s["pdf_ms"] for s in stages]),
+            "merge": summarize([s["merge_ms"] for s in stages]),
+            "peak_python_mb": round(max(peaks), 1),
+        }
+
+        if name in CACHED_ACTIONS:
+            # Una vez más sin limpiar: el PDF sale de la caché
+            report["cache_hit_ms"] = round(timed(call), 2)
+
+        return report
@@ -0,0 +1,76 @@
+# management/commands/bench_ticket_pdf.py
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+
+from apps.agua.core import pdf
+from apps.agua.models import Customer, Invoice, InvoiceDebt, InvoiceConcept, Debt, CashConcept
+
+from ._bench import timed, summarize
+
+
+def ticket_context(items):
+    """Contexto de agua/invoice.html con objetos sin guardar (no toca la base)."""
+    customer = Customer(codigo="00001", full_name="CLIENTE DE PRUEBA", number="12345678", address="JR. LIMA 123")
+    invoice = Invoice(code="T000001", customer=customer, date=date.today(), total=Decimal("0.00"), status="active")
+
+    payments = [
+        InvoiceDebt(invoice=invoice, debt=Debt(customer=customer, period=date(2025, month, 1)), total=Decimal("12.50"))
+        for month in range(1, items + 1)
+    ]
+    concepts = [InvoiceConcept(invoice=invoice, concept=CashConcept(code="001", name="Reconexión"), total=Decimal("10.00"))]
+
+    invoice.total = sum((p.total for p in payments + concepts), Decimal("0.00"))
+
+    return {
+        "invoice": invoice,
+        "customer": customer,
+        "concepts": concepts,
+        "payments": payments,
+        "total_paid": sum((p.total for p in payments), 0),
+        "total_paid_concept": sum((p.total for p in concepts), 0),
+        "company_name": "Empresa",
+        "company_ruc": "99999999999",
+        "company_logo": None,
+    }
+
+
+class Command(BaseCommand):
+
+    help = "Mide la latencia del ticket de pago en PDF (una página): sin precarga y con core.pdf ya calentado."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--items", type=int, default=3, help="Meses de deuda pagados en el ticket")
+
+    def handle(self, *args, **options):
+
+        iterations = options["iterations"]
+        context = ticket_context(options["items"])
+        css_path = pdf.local_path(settings.STATIC_URL + pdf.TICKET_STYLESHEETS[0])
+
+        def uncached():
+            # Como antes: template, CSS y fuentes se resuelven en cada ticket
+            html = get_template("agua/invoice.html").render(context)
+            HTML(string=html).write_pdf(stylesheets=[CSS(filename=css_path)])
+
+        def cached():
+            pdf.render_pdf("agua/invoice.html", context, stylesheets=pdf.TICKET_STYLESHEETS)
+
+        first = timed(uncached)
+        warm_up = timed(pdf.warm_up)
+
+        result = {
+            "primer_ticket_ms": round(first, 2),
+            "warm_up_ms": round(warm_up, 2),
+            "sin_precarga": summarize([timed(uncached) for _ in range(iterations)]),
+            "con_precarga": summarize([timed(cached) for _ in range(iterations)]),
+        }
+
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Resumen diario de los movimientos y egresos existentes (igual que core.cash_rollup.rebuild)."""
+    CashMovement = apps.get_model('agua', 'CashMovement')
+    CashOutflow = apps.get_model('agua', 'CashOutflow')
+    DailyCashRollup = apps.get_model('agua', 'DailyCashRollup')
+
+    movements = (
+        CashMovement.objects.annotate(day=TruncDate('created_at'))
+        .values('cashbox_id', 'day', 'concept_id', 'method')
+        .annotate(total=Sum('total'), count=Count('id'))
+        .order_by()
+    )
+    outflows = (
+        CashOutflow.objects.annotate(day=TruncDate('created_at'))
+        .values('cashbox_id', 'day', 'method')
+        .annotate(total=Sum('total'), count=Count('id'))
+        .order_by()
+    )
+
+    DailyCashRollup.objects.bulk_create([
+        DailyCashRollup(
+            cashbox_id=row['cashbox_id'], date=row['day'], concept_id=row['concept_id'], method=row['method'],
+            movements_total=row['total'], movements_count=row['count'],
+        )
+        for row in movements
+    ] + [
+        DailyCashRollup(
+            cashbox_id=row['cashbox_id'], date=row['day'], method=row['method'],
+            outflows_total=row['total'], outflows_count=row['count'],
+        )
+        for row in outflows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0003_category_price_fixed_charge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCashRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('method', models.CharField(choices=[('cash', 'Efectivo'), ('yape', 'Yape'), ('plin', 'Plin'), ('card', 'Tarjeta')], max_length=10)),
+                ('movements_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('movements_count', models.IntegerField(default=0)),
+                ('outflows_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('outflows_count', models.IntegerField(default=0)),
+                ('cashbox', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='agua.cashbox')),
+                ('concept', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='agua.cashconcept')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cashbox', 'date'], name='agua_rollup_cashbox_date')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:13
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_business_date(apps, schema_editor):
+    """Día de caja de los registros existentes: la fecha de created_at en hora local (TIME_ZONE)."""
+    for model_name in ('CashMovement', 'CashOutflow'):
+        apps.get_model('agua', model_name).objects.update(business_date=TruncDate('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0004_daily_cash_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashmovement',
+            name='business_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cashoutflow',
+            name='business_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.RunPython(backfill_business_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cashmovement',
+            index=models.Index(fields=['cashbox', 'business_date'], name='agua_movement_box_date'),
+        ),
+        migrations.AddIndex(
+            model_name='cashoutflow',
+            index=models.Index(fields=['cashbox', 'business_date'], name='agua_outflow_box_date'),
+        ),
+    ]
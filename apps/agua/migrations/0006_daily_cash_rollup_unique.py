@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:23
+
+from django.db import migrations, models
+from django.db.models import Sum, Count, Min
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    """Junta en una sola fila las claves que quedaron repetidas antes de la restricción."""
+    DailyCashRollup = apps.get_model('agua', 'DailyCashRollup')
+
+    duplicates = (
+        DailyCashRollup.objects.values('cashbox_id', 'date', 'concept_id', 'method')
+        .annotate(
+            keep=Min('id'), rows=Count('id'),
+            movements_total_sum=Sum('movements_total'), movements_count_sum=Sum('movements_count'),
+            outflows_total_sum=Sum('outflows_total'), outflows_count_sum=Sum('outflows_count'),
+        )
+        .filter(rows__gt=1)
+        .order_by()
+    )
+
+    for row in duplicates:
+        rows = DailyCashRollup.objects.filter(
+            cashbox_id=row['cashbox_id'], date=row['date'], concept_id=row['concept_id'], method=row['method']
+        )
+        rows.exclude(id=row['keep']).delete()
+        rows.filter(id=row['keep']).update(
+            movements_total=row['movements_total_sum'], movements_count=row['movements_count_sum'],
+            outflows_total=row['outflows_total_sum'], outflows_count=row['outflows_count_sum'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0005_cash_business_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailycashrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('concept__isnull', False)), fields=('cashbox', 'date', 'concept', 'method'), name='agua_rollup_unique_movement'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycashrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('concept__isnull', True)), fields=('cashbox', 'date', 'method'), name='agua_rollup_unique_outflow'),
+        ),
+    ]
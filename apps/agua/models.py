@@ -1,10 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from apps.base.models import BaseModel
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from datetime import timedelta, date
 from dateutil.relativedelta import relativedelta
-from django.utils.timezone import now
+from django.utils.timezone import now, localdate
 from django.conf import settings
 
 class Company(models.Model):
@@ -160,6 +160,19 @@ class CashConcept(models.Model):
 
     def __str__(self):
         return f"{self.code} - {self.name} ({self.get_type_display()})"
+
+class RegistryVersion(models.Model):
+
+    """
+    Versión de los conceptos de caja y categorías del tenant (core.registry).
+    Una sola fila por esquema: se incrementa con UPDATE ... SET version =
+    version + 1, que es atómico y lo ven los procesos de todos los servidores.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.version)
   
 class Customer(models.Model):
 
@@ -236,22 +249,48 @@ class Reading(models.Model):
     # -------------------------------
     # Cálculos de consumo y tarifas
     # -------------------------------
+    def tariff(self):
+
+        """Categoría del cliente; si no viene cargada se toma del registro del tenant (sin consulta)"""
+
+        if Customer.category.is_cached(self.customer):
+            return self.customer.category
+
+        from .core.registry import get_registry
+
+        return get_registry().category(self.customer.category_id)
+
     def calculate_consumption(self):
 
-        tariff = self.customer.category
+        tariff = self.tariff()
 
-        self.has_meter = self.customer.has_meter
+        previous_value = None
 
         if tariff.has_meter:
+
+            from .core.readings import resolve_previous_readings
+
             # Buscar lectura anterior
-            previous = Reading.objects.filter(
-                customer=self.customer,
-                period__lt=self.period
-            ).order_by('-period').first()
+            previous = resolve_previous_readings(self.period, [self.customer_id]).get(self.customer_id)
 
             if previous:
-                self.previous_reading = previous.current_reading
-                self.consumption = self.current_reading - previous.current_reading
+                previous_value = previous.current_reading
+
+        self.apply_previous_reading(previous_value)
+
+    def apply_previous_reading(self, previous_value):
+
+        """Calcula el consumo a partir de la lectura anterior ya conocida (None si no hay)"""
+
+        tariff = self.tariff()
+
+        self.has_meter = self.customer.has_meter
+
+        if tariff.has_meter:
+
+            if previous_value is not None:
+                self.previous_reading = previous_value
+                self.consumption = self.current_reading - previous_value
             else:
                 self.previous_reading = Decimal('0.000')
                 self.consumption = self.current_reading
@@ -269,7 +308,7 @@ class Reading(models.Model):
 
     def calculate_total(self):
 
-        tariff = self.customer.category
+        tariff = self.tariff()
 
         cargo_fijo = tariff.price_fixed_charge
         total_fixed_charge = cargo_fijo if cargo_fijo else Decimal("0.00")
@@ -299,56 +338,9 @@ class Reading(models.Model):
     # -------------------------------
     def _sync_debt(self):
 
-        from .models import Debt, DebtDetail, CashConcept
-
-        normalized_period = date(self.period.year, self.period.month, 1)
-
-        debt, created = Debt.objects.get_or_create(
-            customer=self.customer,
-            period=normalized_period,
-            defaults={
-                "reading": self,
-                "amount": self.total_amount,
-                "description": "Deuda por consumo de agua/desagüe",
-            }
-        )
+        from .core.billing import sync_reading_debts
 
-        if not created:
-
-            if debt.paid:
-
-                # 🔒 Si la deuda ya está pagada, no se puede modificar
-                raise ValidationError(
-                    f"No se puede modificar la lectura de {self.period.strftime('%Y-%m')} porque ya está pagada."
-                )
-            
-            debt.reading = self
-            debt.amount = self.total_amount
-            debt.save()
-
-        # recreamos detalles
-        debt.details.all().delete()
-
-        if self.total_water > 0:
-            DebtDetail.objects.create(
-                debt=debt,
-                concept=CashConcept.objects.get(code="001"),
-                amount=self.total_water
-            )
-
-        if self.total_sewer > 0:
-            DebtDetail.objects.create(
-                debt=debt,
-                concept=CashConcept.objects.get(code="002"),
-                amount=self.total_sewer
-            )
-
-        if self.total_fixed_charge > 0:
-            DebtDetail.objects.create(
-                debt=debt,
-                concept=CashConcept.objects.get(code="003"),
-                amount=self.total_fixed_charge
-            )
+        sync_reading_debts([self])
 
     # -------------------------------
     # Guardado con cascada
@@ -356,38 +348,19 @@ class Reading(models.Model):
     def save(self, *args, skip_process=False, **kwargs):
 
         if not skip_process:
-            # Calcular consumo + total de esta lectura
-            self.calculate_consumption()
-            self.calculate_total()
 
-            # Guardar lectura actual
-            super().save(*args, **kwargs)
+            from .core.billing import cascade_reading
+
+            with transaction.atomic():
+                # Calcular consumo + total de esta lectura
+                self.calculate_consumption()
+                self.calculate_total()
+
+                # Guardar lectura actual
+                super().save(*args, **kwargs)
 
-            # Crear o actualizar deuda
-            self._sync_debt()
-
-            # 🔄 Recalcular en cascada los meses posteriores
-            next_readings = Reading.objects.filter(
-                customer=self.customer,
-                period__gt=self.period
-            ).order_by('period')
-
-            previous = self
-            for r in next_readings:
-                # Si ya está pagada, no continuar con la cadena
-                if r.paid:
-                    break
-
-                r.previous_reading = previous.current_reading
-                r.calculate_consumption()
-                r.calculate_total()
-                super(Reading, r).save(update_fields=[
-                    "previous_reading", "consumption",
-                    "total_water", "total_sewer",
-                    "total_fixed_charge", "total_amount"
-                ])
-                r._sync_debt()
-                previous = r
+                # 🔄 Deuda de esta lectura + recálculo en cascada de los meses posteriores
+                cascade_reading(self)
 
         else:
 
@@ -546,6 +519,8 @@ class CashMovement(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Día de caja (hora de Lima) del alta; los reportes filtran por aquí y no por created_at__date
+    business_date = models.DateField(default=localdate, editable=False)
 
     # Relación opcional con InvoicePayment
     invoice_payment = models.ForeignKey(
@@ -555,9 +530,31 @@ class CashMovement(models.Model):
         related_name="cash_movements"
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["cashbox", "business_date"], name="agua_movement_box_date")]
+
     def __str__(self):
         return f"{self.cashbox} - {self.concept.name} - {self.total}"
 
+    def save(self, *args, **kwargs):
+
+        from .core.cash_rollup import record_movement
+
+        # El resumen diario se actualiza en la misma transacción
+        with transaction.atomic():
+            if not self._state.adding:
+                record_movement(CashMovement.objects.get(pk=self.pk), -1)
+            super().save(*args, **kwargs)
+            record_movement(self, 1)
+
+    def delete(self, *args, **kwargs):
+
+        from .core.cash_rollup import record_movement
+
+        with transaction.atomic():
+            record_movement(self, -1)
+            return super().delete(*args, **kwargs)
+
 class CashOutflow(models.Model):
 
     cashbox = models.ForeignKey(CashBox, on_delete=models.CASCADE, related_name="outflows")
@@ -566,14 +563,70 @@ class CashOutflow(models.Model):
     reference = models.CharField(max_length=100, blank=True, null=True)  # Ej. N° de depósito
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    business_date = models.DateField(default=localdate, editable=False)
 
     class Meta:
         verbose_name = "Egreso de caja"
         verbose_name_plural = "Egresos de caja"
+        indexes = [models.Index(fields=["cashbox", "business_date"], name="agua_outflow_box_date")]
 
     def __str__(self):
         return f"{self.cashbox} - {self.concept.name} - {self.total}"
 
+    def save(self, *args, **kwargs):
+
+        from .core.cash_rollup import record_outflow
+
+        with transaction.atomic():
+            if not self._state.adding:
+                record_outflow(CashOutflow.objects.get(pk=self.pk), -1)
+            super().save(*args, **kwargs)
+            record_outflow(self, 1)
+
+    def delete(self, *args, **kwargs):
+
+        from .core.cash_rollup import record_outflow
+
+        with transaction.atomic():
+            record_outflow(self, -1)
+            return super().delete(*args, **kwargs)
+
+class DailyCashRollup(models.Model):
+
+    """
+    Totales de una caja por día (hora de Lima), concepto y método de pago.
+    Los mantienen CashMovement y CashOutflow al guardarse; los egresos van
+    en las filas sin concepto. Hay una sola fila por clave: la suma se hace
+    con INSERT ... ON CONFLICT DO UPDATE (core.cash_rollup).
+    """
+
+    cashbox = models.ForeignKey(CashBox, on_delete=models.CASCADE, related_name="rollups")
+    date = models.DateField()
+    concept = models.ForeignKey(CashConcept, on_delete=models.PROTECT, null=True, blank=True)
+    method = models.CharField(max_length=10, choices=InvoicePayment.PAYMENT_METHODS)
+
+    movements_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    movements_count = models.IntegerField(default=0)
+    outflows_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    outflows_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["cashbox", "date"], name="agua_rollup_cashbox_date")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cashbox", "date", "concept", "method"], condition=models.Q(concept__isnull=False),
+                name="agua_rollup_unique_movement",
+            ),
+            # concept es NULL en los egresos: en un índice único normal dos NULL no chocan
+            models.UniqueConstraint(
+                fields=["cashbox", "date", "method"], condition=models.Q(concept__isnull=True),
+                name="agua_rollup_unique_outflow",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.cashbox_id} - {self.date} - {self.method}"
+
 class ReadingGeneration(models.Model):
 
     period = models.DateField()
@@ -3,7 +3,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.utils.timezone import now
 from django.conf import settings
 from .models import Customer, WaterMeter, CashBox, Company, Notificacion, CashOutflow, InvoiceConcept, CashMovement, DebtDetail, CashConcept, Reading, ReadingGeneration, Invoice, Category, Via, Calle, InvoiceDebt, Zona, Debt, InvoicePayment, DailyCashReport
-from .utils import next_month_date
+from .core.readings import annotate_reading_facts, reading_error
 from django.db import transaction
 from django.db.models import Sum
 from decimal import Decimal
@@ -103,7 +103,10 @@ class CustomerSerializer(serializers.ModelSerializer):
         return data
 
     def get_total_debt(self, obj):
-        # Sumamos las deudas pendientes
+        # En los listados viene anotada (core.customers.with_outstanding_debt)
+        if hasattr(obj, "outstanding_debt"):
+            return obj.outstanding_debt or 0
+
         return obj.debts.filter(paid=False).aggregate(total=Sum("amount"))["total"] or 0
 
 class CustomerWithDebtsSerializer(serializers.ModelSerializer):
@@ -167,79 +170,18 @@ class ReadingSerializer(serializers.ModelSerializer):
             
             return data
 
-        # 1) Evitar lecturas duplicadas en el mismo mes y cliente
-        qs = Reading.objects.filter(
-            customer=customer,
-            period__year=period.year,
-            period__month=period.month
-        )
-
-        if self.instance:
-
-            qs = qs.exclude(id=self.instance.id)
-
-        if qs.exists():
-
-            raise serializers.ValidationError(
-                "Ya existe una lectura registrada para este cliente en el mismo mes."
-            )
-
-        # Buscar lectura anterior y siguiente
-        prev_reading = Reading.objects.filter(
-            customer=customer, period__lt=period
-        ).order_by("-period").first()
-
-        next_reading = Reading.objects.filter(
-            customer=customer, period__gt=period
-        ).order_by("period").first()
-
-        if prev_reading and current_reading < prev_reading.current_reading:
-            raise serializers.ValidationError(
-                {"current_reading": f"La lectura no puede ser menor que la de {prev_reading.period} ({prev_reading.current_reading})."}
-            )
-
-        if next_reading and current_reading > next_reading.current_reading:
-            raise serializers.ValidationError(
-                {"current_reading": f"La lectura no puede ser mayor que la de {next_reading.period} ({next_reading.current_reading})."}
-            )
-
-        # 2) Evitar registrar un mes anterior si ya existe uno posterior
-        future_qs = Reading.objects.filter(
-            customer=customer,
-            period__gt=period,
-            paid=True
-        )
-        if future_qs.exists():
-            raise serializers.ValidationError(
-                "No se puede editar porque existen lecturas posteriores ya pagadas."
-            )
-
-        # 3) Verificar que no se salten meses.
-        #    Obtenemos la última lectura (mes anterior) y comprobamos que la nueva sea el mes siguiente.
-        last_reading = Reading.objects.filter(
-            customer=customer,
-            period__lt=period
-        ).order_by('-period').first()
-
-        if last_reading:
-            # Calculamos la fecha del "próximo mes" a partir de la última lectura
-            expected_next_date = next_month_date(last_reading.period)
-
-            # Comparamos solo año y mes (en caso de que no uses día=1):
-            if (period.year != expected_next_date.year) or (period.month != expected_next_date.month):
-                raise serializers.ValidationError(
-                    "Debes registrar el mes consecutivo. El siguiente mes esperado es: "
-                    f"{expected_next_date.strftime('%B %Y')}"
-                )
+        # Vecinos (lectura anterior/siguiente), duplicado y pagos posteriores en una sola consulta
+        facts = annotate_reading_facts(
+            Customer.objects.filter(pk=customer.pk),
+            period,
+            exclude_id=self.instance.id if self.instance else None
+        ).first()
 
-            # (Opcional) Verificar que current_reading >= last_reading.current_reading
-            if current_reading < last_reading.current_reading:
-                raise serializers.ValidationError(
-                    "La lectura actual no puede ser menor que la última lectura registrada."
-                )
-        else:
-            # Si no hay lecturas previas, esta es la primera: no hay mes anterior que validar.
-            pass
+        error = reading_error(facts, period, current_reading)
+
+        if error:
+
+            raise serializers.ValidationError(error)
 
         return data
 
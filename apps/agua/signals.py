@@ -1,3 +1,31 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import CashConcept, Category, Company
+
+
+@receiver([post_save, post_delete], sender=CashConcept)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_registry(sender, instance, **kwargs):
+    """Los conceptos y categorías cambiaron: refrescar el registro en memoria del tenant."""
+    from .core.registry import invalidate
+
+    schema_name = connection.schema_name
+
+    # Después del commit, para que otros procesos no recarguen datos viejos
+    transaction.on_commit(lambda: invalidate(schema_name))
+
+
+@receiver([post_save, post_delete], sender=Company)
+def clear_receipt_cache(sender, instance, **kwargs):
+    """Los datos de la empresa salen en todos los recibos del tenant."""
+    from .core.receipt_cache import clear
+
+    schema_name = connection.schema_name
+
+    transaction.on_commit(lambda: clear(schema_name))
+
+
 # from django.db.models.signals import post_save
 # from django.dispatch import receiver
 # from .models import Reading, MonthlyBilling, Service
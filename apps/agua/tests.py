@@ -1,3 +1,1122 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+import csv
+import io
+import os
+import random
+import tempfile
+import zipfile
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from unittest import mock
+
+from django.utils.timezone import localdate
+
+from apps.user.models import User
+from .models import (
+    Category, Customer, Reading, Via, Calle, Zona, WaterMeter, Debt, DebtDetail, CashBox, CashConcept, CashMovement,
+    CashOutflow, DailyCashReport, DailyCashRollup, Invoice, InvoiceDebt, InvoicePayment
+)
+from .serializers import CustomerSerializer
+from .core.tariffs import TariffTable, decimals_to_units, cents_to_decimals
+from .core.debt_report import iter_csv, customers_with_debt
+from .core.importers import import_customers, import_debts, import_readings
+from .core.readings import (
+    capture_readings, previous_readings, resolve_previous_readings, annotate_reading_facts
+)
+from .core.billing import generate_flat_rate_readings
+from .core.copy_loader import copy_load, assign_pks, reserve_pks
+from .core import cash_rollup
+from .core.streaming_zip import stream_zip
+from .core.registry import invalidate as invalidate_registry
+from .core.validation import CustomerFileValidator, DebtFileValidator
+from .core.workbook import WorkbookError, iter_batches, iter_rows, sorted_rows
+
+
+def _upload(name, text):
+    """Archivo subido en memoria (CSV) para los importadores."""
+    file = io.BytesIO(text.encode("utf-8"))
+    file.name = name
+    return file
+
+
+def _reference_data(price_fixed_charge=Decimal("0.00")):
+    """Conceptos de agua, desagüe y cargo fijo, una categoría y una calle con zona."""
+    for code, name in (("001", "Agua"), ("002", "Desagüe"), ("003", "Cargo fijo")):
+        CashConcept.objects.create(code=code, name=name, type="income", total=Decimal("1.00") if code == "003" else 0)
+
+    category = Category.objects.create(
+        codigo="01", name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50"),
+        price_fixed_charge=price_fixed_charge,
+    )
+    calle = Calle.objects.create(via=Via.objects.create(codigo="01", name="JIRON"), name="LIMA", codigo="0001")
+    zona = Zona.objects.create(codigo="01", name="CENTRO")
+
+    # Las señales refrescan el registro al hacer commit, que en TestCase no llega
+    invalidate_registry()
+
+    return category, calle, zona
+
+
+class TariffTableEquivalenceTest(SimpleTestCase):
+    """
+    La tarifa por lotes debe dar los mismos montos que Reading.calculate_total
+    una vez redondeados a 2 decimales (como los guarda la base de datos).
+    """
+
+    def setUp(self):
+
+        self.categories = [
+            # Doméstico con medidor
+            Category(id=1, name="Domestico", price_water=Decimal("1.35"), price_sewer=Decimal("0.80"),
+                     price_fixed_charge=Decimal("2.50"), has_meter=True),
+            # Sin medidor: tarifa plana
+            Category(id=2, name="Social", price_water=Decimal("8.00"), price_sewer=Decimal("3.00"),
+                     price_fixed_charge=Decimal("0.00"), has_meter=False),
+            # Industrial con exceso
+            Category(id=3, name="Industrial", price_water=Decimal("2.17"), price_sewer=Decimal("5.00"),
+                     price_fixed_charge=Decimal("4.10"), has_meter=True,
+                     max_consumption=20, extra_rate=Decimal("3.33")),
+            # max_consumption en 0 se comporta como tarifa normal
+            Category(id=4, name="Comercial", price_water=Decimal("1.99"), price_sewer=Decimal("1.01"),
+                     price_fixed_charge=Decimal("0.00"), has_meter=True, max_consumption=0),
+        ]
+        self.table = TariffTable(self.categories)
+
+    def _per_row(self, category, consumption):
+
+        reading = Reading(customer=Customer(category=category), consumption=consumption)
+        reading.calculate_total()
+
+        return [
+            Decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            for value in (reading.total_water, reading.total_sewer, reading.total_fixed_charge, reading.total_amount)
+        ]
+
+    def test_matches_calculate_total(self):
+
+        rng = random.Random(2025)
+        consumptions = [Decimal(rng.randint(0, 80000)).scaleb(-3) for _ in range(2000)]
+        consumptions += [Decimal("0.000"), Decimal("20.000"), Decimal("20.001"), Decimal("19.999"), Decimal("0.005")]
+        categories = [rng.choice(self.categories) for _ in consumptions]
+
+        priced = self.table.price(
+            decimals_to_units(consumptions, 3),
+            [c.id for c in categories]
+        )
+        batch = list(zip(*(cents_to_decimals(priced[k]) for k in ("water", "sewer", "fixed_charge", "total"))))
+
+        for consumption, category, row in zip(consumptions, categories, batch):
+            self.assertEqual(list(row), self._per_row(category, consumption), (category.name, consumption))
+
+    def test_half_cent_rounds_up(self):
+
+        # 0.005 m³ * 1.35 = 0.00675 -> 0.01 ; 0.001 * 1.35 = 0.00135 -> 0.00
+        priced = self.table.price(decimals_to_units(["0.005", "0.001"], 3), [1, 1])
+        self.assertEqual(cents_to_decimals(priced["water"]), [Decimal("0.01"), Decimal("0.00")])
+
+    def test_flat_rate_ignores_consumption(self):
+
+        priced = self.table.price(decimals_to_units(["15.000"], 3), [2])
+        self.assertEqual(priced["consumption"].tolist(), [0])
+        self.assertEqual(cents_to_decimals(priced["total"]), [Decimal("11.00")])
+
+    def test_unknown_category(self):
+
+        with self.assertRaises(KeyError):
+            self.table.price(decimals_to_units(["1.000"], 3), [99])
+
+
+class _AnnotatedCustomers(list):
+    """Lista con iterator(), como el queryset de customers_with_debt."""
+
+    def iterator(self, chunk_size=None):
+        return iter(self)
+
+
+class DebtReportExportTest(SimpleTestCase):
+
+    def customer(self, codigo, number, total, first, last):
+
+        customer = Customer(codigo=codigo, full_name=f"CLIENTE {codigo}", number=number)
+        customer.total, customer.min_period, customer.max_period = Decimal(total), first, last
+        return customer
+
+    def test_csv_rows_and_total(self):
+
+        customers = _AnnotatedCustomers([
+            self.customer("00001", "12345678", "30.50", date(2024, 1, 1), date(2024, 6, 1)),
+            self.customer("00002", None, "12.00", date(2025, 3, 1), date(2025, 3, 1)),
+        ])
+
+        rows = list(csv.reader("".join(iter_csv(customers)).lstrip("\ufeff").splitlines()))
+
+        self.assertEqual(rows[1], ["00001", "CLIENTE 00001", "12345678", "2024-01", "2024-06", "30.50"])
+        self.assertEqual(rows[2][2], "")
+        self.assertEqual(rows[-1], ["", "TOTAL GENERAL", "", "", "", "42.50"])
+
+
+class CustomersWithDebtTest(TenantTestCase):
+
+    def setUp(self):
+
+        category = Category.objects.create(name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50"))
+        via = Via.objects.create(name="JIRON")
+        self.lima = Calle.objects.create(via=via, name="LIMA")
+        self.cusco = Calle.objects.create(via=via, name="CUSCO")
+        self.centro = Zona.objects.create(codigo="01", name="CENTRO")
+        self.norte = Zona.objects.create(codigo="02", name="NORTE")
+
+        def customer(codigo, calle, zona, debts):
+            customer = Customer.objects.create(codigo=codigo, full_name=f"CLIENTE {codigo}", category=category, calle=calle, zona=zona)
+            for period, amount, paid in debts:
+                Debt.objects.create(customer=customer, period=period, amount=Decimal(amount), paid=paid)
+            return customer
+
+        # Deudas pagadas y pendientes: solo suman las pendientes
+        self.mixed = customer("00001", self.lima, self.centro, [
+            (date(2024, 12, 1), "7.00", True), (date(2025, 1, 1), "10.00", False), (date(2025, 2, 1), "4.00", False),
+        ])
+        customer("00002", self.lima, self.centro, [(date(2025, 1, 1), "9.00", True)])
+        self.other_calle = customer("00003", self.cusco, self.centro, [(date(2025, 3, 1), "5.00", False)])
+        self.other_zona = customer("00004", self.lima, self.norte, [(date(2025, 4, 1), "6.00", False)])
+
+    def test_sums_only_unpaid_debts(self):
+
+        rows = {c.id: c for c in customers_with_debt()}
+
+        self.assertEqual(set(rows), {self.mixed.id, self.other_calle.id, self.other_zona.id})
+
+        mixed = rows[self.mixed.id]
+        self.assertEqual(mixed.total, Decimal("14.00"))
+        self.assertEqual((mixed.min_period, mixed.max_period), (date(2025, 1, 1), date(2025, 2, 1)))
+
+    def test_filters_by_calle_and_zona(self):
+
+        self.assertEqual([c.id for c in customers_with_debt(calle_id=self.lima.id)], [self.mixed.id, self.other_zona.id])
+        self.assertEqual([c.id for c in customers_with_debt(zona_id=self.centro.id)], [self.mixed.id, self.other_calle.id])
+        self.assertEqual([c.id for c in customers_with_debt(calle_id=self.lima.id, zona_id=self.centro.id)], [self.mixed.id])
+
+
+class CustomerSerializerQueriesTest(SimpleTestCase):
+    """SimpleTestCase no permite consultas: el serializer solo debe leer lo anotado y lo ya cargado."""
+
+    def test_reads_annotated_debt_and_cached_relations(self):
+
+        via = Via(id=1, codigo="01", name="JIRON")
+        customer = Customer(
+            id=1, codigo="00001", full_name="CLIENTE 1", has_meter=True,
+            category=Category(id=1, codigo="01", name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50")),
+            calle=Calle(id=1, codigo="0001", via=via, name="LIMA"),
+            zona=Zona(id=1, codigo="01", name="CENTRO"),
+        )
+        customer.meter = WaterMeter(id=1, code="M1", installation_date=date(2024, 1, 1))
+        customer.outstanding_debt = Decimal("12.50")
+
+        data = CustomerSerializer(customer).data
+
+        self.assertEqual(data["total_debt"], Decimal("12.50"))
+        self.assertEqual(data["calle"]["via_name"], "JIRON")
+        self.assertEqual(data["meter"]["code"], "M1")
+
+
+class CustomerListQueryCountTest(TenantTestCase):
+
+    def setUp(self):
+
+        category = Category.objects.create(name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50"))
+        calle = Calle.objects.create(via=Via.objects.create(name="JIRON"), name="LIMA")
+        zona = Zona.objects.create(codigo="01", name="CENTRO")
+
+        for i in range(1, 6):
+            customer = Customer.objects.create(
+                codigo=f"{i:05d}", full_name=f"CLIENTE {i}", category=category, calle=calle, zona=zona, has_meter=i % 2 == 0
+            )
+            if customer.has_meter:
+                WaterMeter.objects.create(customer=customer, code=f"M{i}", installation_date=date(2024, 1, 1))
+
+            Debt.objects.create(customer=customer, period=date(2025, 1, 1), amount=Decimal("10.00"))
+            Debt.objects.create(customer=customer, period=date(2025, 2, 1), amount=Decimal("4.00"))
+            Debt.objects.create(customer=customer, period=date(2024, 12, 1), amount=Decimal("7.00"), paid=True)
+
+        self.user = User.objects.create(username="caja", email="caja@example.com")
+
+    def test_page_runs_fixed_number_of_queries(self):
+
+        from .views import CustomerViewSet
+
+        view = CustomerViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get("/customers/", {"page_size": 5})
+        force_authenticate(request, user=self.user)
+
+        # COUNT de la paginación + la página, sin importar cuántas filas trae
+        with self.assertNumQueries(2):
+            response = view(request)
+            response.render()
+
+        results = response.data["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual({row["total_debt"] for row in results}, {Decimal("14.00")})
+        self.assertEqual(sum(row["meter"] is not None for row in results), 2)
+
+
+class CashReportParityTest(TenantTestCase):
+    """El reporte de la caja (por día y por rango) y el del cierre diario dan los mismos números."""
+
+    def setUp(self):
+
+        self.user = User.objects.create(username="caja", email="caja@example.com")
+        self.cashbox = CashBox.objects.create(user=self.user)
+        self.today = localdate()
+
+        agua = CashConcept.objects.create(code="001", name="Agua", type="income")
+        desague = CashConcept.objects.create(code="002", name="Desagüe", type="income")
+
+        category = Category.objects.create(name="DOMESTICO", price_water=Decimal("1.20"), price_sewer=Decimal("2.50"))
+        customer = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=category)
+
+        def ticket(status, payments, periods):
+
+            invoice = Invoice.objects.create(customer=customer, status=status)
+            for period in periods:
+                debt = Debt.objects.create(customer=customer, period=period, amount=Decimal("10.00"), paid=True)
+                InvoiceDebt.objects.create(invoice=invoice, debt=debt, total=debt.amount)
+
+            for method, concept, total in payments:
+                payment = InvoicePayment.objects.create(invoice=invoice, cashbox=self.cashbox, method=method, total=total)
+                CashMovement.objects.create(
+                    cashbox=self.cashbox, concept=concept, method=method, total=total, invoice_payment=payment
+                )
+
+        # Ticket pagado en efectivo y Yape
+        ticket("active", [("cash", agua, Decimal("10.00")), ("yape", desague, Decimal("5.00"))], [date(2025, 1, 1), date(2025, 2, 1)])
+        # Ticket anulado: no cuenta en conceptos ni en métodos
+        ticket("cancelled", [("cash", agua, Decimal("7.00"))], [date(2025, 3, 1)])
+        # Movimiento sin pago: solo cuenta en los métodos
+        CashMovement.objects.create(cashbox=self.cashbox, concept=desague, method="plin", total=Decimal("3.00"))
+
+        self.daily_report = DailyCashReport.objects.create(cashbox=self.cashbox, date=self.today)
+
+    def context(self, viewset, pk, params=None):
+
+        view = viewset.as_view({"get": "report"})
+        request = APIRequestFactory().get("/report/", params or {})
+        force_authenticate(request, user=self.user)
+
+        with mock.patch("apps.agua.views.render_pdf", return_value=b"%PDF") as render_pdf:
+            response = view(request, pk=pk)
+
+        self.assertEqual(response.status_code, 200)
+        context = render_pdf.call_args.args[1]
+
+        return {key: context[key] for key in ("conceptos", "total_general", "metodos")}
+
+    def test_cashbox_and_daily_reports_match(self):
+
+        from .views import CashBoxViewSet, DailyCashReportViewSet
+
+        day = self.today.isoformat()
+
+        by_day = self.context(CashBoxViewSet, self.cashbox.id, {"date": day})
+        by_range = self.context(CashBoxViewSet, self.cashbox.id, {"start_date": day, "end_date": day})
+        daily = self.context(DailyCashReportViewSet, self.daily_report.id)
+
+        self.assertEqual(by_day, daily)
+        self.assertEqual(by_range, daily)
+
+        self.assertEqual(daily["total_general"], 15.0)
+        self.assertEqual([c["concepto"] for c in daily["conceptos"]], ["Agua", "Desagüe"])
+        self.assertEqual(daily["conceptos"][0]["facturas"][0]["periodo"], "Enero 2025 - Febrero 2025")
+        self.assertEqual(
+            {m["metodo"]: m["total"] for m in daily["metodos"]},
+            {"Efectivo": Decimal("10.00"), "Yape": Decimal("5.00"), "Plin": Decimal("3.00")},
+        )
+
+
+class ImportDryRunParityTest(TenantTestCase):
+    """El dry run rechaza exactamente las filas que el importador omite."""
+
+    def setUp(self):
+
+        self.category, self.calle, self.zona = _reference_data()
+        Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=self.category, calle=self.calle)
+        Customer.objects.create(codigo="00002", full_name="CLIENTE 2", category=self.category, calle=self.calle)
+
+    def dry_run(self, validator, file):
+        report = validator.validate_batches(iter_batches(file, header=2, dtype={"Codigo": str})).report()
+        return report, {e["fila"] for e in report["errores"]}
+
+    def test_debts(self):
+
+        text = (
+            "Deudas historicas\n\n"
+            "Codigo,Año,Meses,Agua\n"
+            "00001,2023,DE ENERO A MARZO,30\n"      # 4: válida
+            "00001,2023,de enero a marzo,30\n"      # 5: el importador no entiende minúsculas
+            "00001,2023.5,DE ENERO A MARZO,30\n"    # 6: año con decimales
+            "00002,2022,DE MARZO A ENERO,10\n"      # 7: rango vacío
+            "00002,2022,DE ENERO A FEBRERO,abc\n"   # 8: monto con texto
+            "00009,2022,DE ENERO A ENERO,5\n"       # 9: cliente no existe
+            "00001,2023,DE MARZO A ABRIL,8\n"       # 10: marzo ya venía en la fila 4: gana esta
+            "00002,2022,,5\n"                       # 11: sin meses
+        )
+
+        report, rejected = self.dry_run(DebtFileValidator(), _upload("deudas.csv", text))
+        _, errores = import_debts(_upload("deudas.csv", text))
+
+        self.assertEqual(rejected, {e["fila"] for e in errores})
+        self.assertEqual(rejected, {5, 6, 7, 8, 9, 11})
+        self.assertEqual([w["fila"] for w in report["avisos"]], [10])
+
+        march = Debt.objects.get(customer__codigo="00001", period=date(2023, 3, 1))
+        self.assertEqual(march.amount, Decimal("4.00") + Decimal("2.50") + Decimal("1.00"))
+
+    def test_customers(self):
+
+        WaterMeter.objects.create(customer=Customer.objects.get(codigo="00001"), code="M-OLD", installation_date=date(2024, 1, 1))
+
+        text = (
+            "Padron\n\n"
+            "Codigo,Usuario/Cliente,DNI/RUC.,cod_categ,cod_direc,Cod.Medidor\n"
+            f"00010,NUEVO 10,12345678,{self.category.id},{self.calle.id},M10\n"   # 4: válida
+            f"00001,REPETIDO,123,{self.category.id},{self.calle.id},M-OLD\n"      # 5: se importa, sin medidor
+            f",SIN CODIGO,,{self.category.id},{self.calle.id},\n"                 # 6: sin código
+            f"00011,SIN CATEGORIA,,999,{self.calle.id},\n"                        # 7: categoría no existe
+            f"00012,SIN CALLE,,{self.category.id},999999,\n"                      # 8: calle no existe
+        )
+
+        report, rejected = self.dry_run(CustomerFileValidator(), _upload("padron.csv", text))
+
+        before = Customer.objects.count()
+        created, _ = import_customers(_upload("padron.csv", text))
+
+        imported = set(Customer.objects.filter(full_name__in=["NUEVO 10", "REPETIDO"]).values_list("full_name", flat=True))
+
+        self.assertEqual(rejected, {6, 7, 8})
+        self.assertEqual(created, 5 - len(rejected))
+        self.assertEqual(Customer.objects.count(), before + created)
+        self.assertEqual(imported, {"NUEVO 10", "REPETIDO"})
+        self.assertEqual({w["fila"] for w in report["avisos"]}, {5})
+
+
+class CaptureReadingsTest(TenantTestCase):
+    """Captura en lote de una ruta: reporte de errores por fila y deudas de las lecturas válidas."""
+
+    def setUp(self):
+
+        self.category, self.calle, self.zona = _reference_data()
+        other_calle = Calle.objects.create(via=self.calle.via, name="CUSCO", codigo="0002")
+
+        def customer(codigo, calle=self.calle, has_meter=True):
+            return Customer.objects.create(
+                codigo=codigo, full_name=f"CLIENTE {codigo}", category=self.category, calle=calle, has_meter=has_meter,
+            )
+
+        self.first = customer("00001")
+        self.second = customer("00002")
+        self.no_meter = customer("00003", has_meter=False)
+        self.other_route = customer("00004", calle=other_calle)
+
+        # Con lecturas de enero y marzo: la captura de febrero recalcula marzo
+        self.chained = customer("00005")
+        Reading.objects.create(customer=self.chained, period=date(2025, 1, 1), current_reading=Decimal("100"))
+        Reading.objects.create(customer=self.chained, period=date(2025, 3, 1), current_reading=Decimal("150"))
+
+    def test_mixed_rows(self):
+
+        rows = [
+            {"customer": self.first.id, "current_reading": "10"},       # 1: válida
+            {"customer": "x", "current_reading": "10"},                 # 2: cliente inválido
+            {"customer": self.second.id, "current_reading": "-1"},      # 3: lectura negativa
+            {"customer": self.first.id, "current_reading": "12"},       # 4: repetido
+            {"customer": self.other_route.id, "current_reading": "5"},  # 5: otra calle
+            {"customer": self.no_meter.id, "current_reading": "5"},     # 6: sin medidor
+            {"customer": self.chained.id, "current_reading": "120"},    # 7: válida, con marzo posterior
+        ]
+
+        readings, errors = capture_readings(date(2025, 2, 1), rows, calle_id=self.calle.id)
+
+        self.assertEqual([(e["fila"], e["error"]) for e in errors], [
+            (2, "Cliente inválido."),
+            (3, "Lectura inválida."),
+            (4, "Cliente repetido en el lote."),
+            (5, "El cliente no pertenece a la ruta indicada."),
+            (6, "El cliente no tiene medidor."),
+        ])
+        self.assertEqual({r.customer_id for r in readings}, {self.first.id, self.chained.id})
+
+        # Primera lectura: consumo = lectura; 10 * 1.20 + 2.50
+        debt = Debt.objects.get(customer=self.first, period=date(2025, 2, 1))
+        self.assertEqual(debt.amount, Decimal("14.50"))
+        self.assertEqual(
+            sorted(debt.details.values_list("concept__code", "amount")),
+            [("001", Decimal("12.00")), ("002", Decimal("2.50"))],
+        )
+
+        # Febrero toma 100 de enero; 20 * 1.20 + 2.50
+        february = Debt.objects.get(customer=self.chained, period=date(2025, 2, 1))
+        self.assertEqual(february.amount, Decimal("26.50"))
+
+        # Marzo pasa a tomar 120 de febrero; 30 * 1.20 + 2.50
+        march = Reading.objects.get(customer=self.chained, period=date(2025, 3, 1))
+        self.assertEqual((march.previous_reading, march.consumption, march.total_amount),
+                         (Decimal("120"), Decimal("30"), Decimal("38.50")))
+
+        march_debt = Debt.objects.get(customer=self.chained, period=date(2025, 3, 1))
+        self.assertEqual(march_debt.amount, Decimal("38.50"))
+        self.assertEqual(
+            sorted(march_debt.details.values_list("concept__code", "amount")),
+            [("001", Decimal("36.00")), ("002", Decimal("2.50"))],
+        )
+
+        self.assertFalse(Debt.objects.filter(customer__in=[self.second, self.no_meter, self.other_route]).exists())
+
+
+class FlatRateGenerationParityTest(TenantTestCase):
+    """generate_flat_rate_readings deja las mismas lecturas y deudas que el recorrido cliente por cliente."""
+
+    NEW = date(2025, 1, 1)
+    OLD = date(2025, 2, 1)
+
+    def setUp(self):
+
+        category, calle, zona = _reference_data(price_fixed_charge=Decimal("1.75"))
+        social = Category.objects.create(codigo="02", name="SOCIAL", price_water=Decimal("8.00"), price_sewer=Decimal("3.00"))
+        invalidate_registry()
+
+        def customer(codigo, category):
+            return Customer.objects.create(
+                codigo=codigo, full_name=f"CLIENTE {codigo}", category=category, calle=calle, zona=zona, has_meter=False,
+            )
+
+        self.customers = [customer(f"0000{i}", category if i % 2 else social) for i in range(1, 7)]
+        _, self.existing, self.paid, self.open_debt, _, _ = self.customers
+
+        # El mismo estado de partida en los dos periodos
+        for period in (self.NEW, self.OLD):
+            Reading.objects.create(customer=self.existing, period=period, current_reading=0)
+            Debt.objects.create(customer=self.paid, period=period, amount=Decimal("5.00"), paid=True)
+            Debt.objects.create(customer=self.open_debt, period=period, amount=Decimal("1.00"))
+
+    def legacy(self, period):
+        """El flujo anterior: una lectura por cliente con Reading.save y su deuda."""
+        created = skipped_existing = skipped_paid = 0
+
+        for customer in Customer.objects.filter(has_meter=False):
+
+            if Reading.objects.filter(customer=customer, period=period).exists():
+                skipped_existing += 1
+                continue
+
+            if Debt.objects.filter(customer=customer, period=period, paid=True).exists():
+                skipped_paid += 1
+                continue
+
+            Reading.objects.create(customer=customer, period=period, current_reading=0)
+            created += 1
+
+        return {"created": created, "skipped_existing": skipped_existing, "skipped_paid": skipped_paid}
+
+    def snapshot(self, period):
+        readings = {
+            r.customer_id: (r.previous_reading, r.consumption, r.total_water, r.total_sewer, r.total_fixed_charge, r.total_amount)
+            for r in Reading.objects.filter(period=period)
+        }
+        debts = {}
+        for debt in Debt.objects.filter(period=period).prefetch_related("details__concept"):
+            details = sorted((d.concept.code, d.amount) for d in debt.details.all())
+            debts.setdefault(debt.customer_id, []).append((debt.amount, debt.paid, details))
+        return readings, debts
+
+    def test_same_totals_debts_and_details(self):
+
+        result = generate_flat_rate_readings(self.NEW)
+        expected = self.legacy(self.OLD)
+
+        self.assertEqual(result, expected)
+        self.assertEqual(result, {"created": 4, "skipped_existing": 1, "skipped_paid": 1})
+        self.assertEqual(self.snapshot(self.NEW), self.snapshot(self.OLD))
+
+        # La deuda pendiente se reutiliza, no se duplica
+        debt = Debt.objects.get(customer=self.open_debt, period=self.NEW)
+        self.assertEqual(debt.amount, Decimal("11.00"))
+        self.assertEqual(Reading.objects.get(customer=self.open_debt, period=self.NEW).total_amount, Decimal("11.00"))
+
+
+class ReadingCascadeTest(TenantTestCase):
+    """Al editar un mes intermedio se recalculan los meses posteriores y sus deudas."""
+
+    def setUp(self):
+
+        category, calle, zona = _reference_data()
+        self.customer = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=category, calle=calle, zona=zona)
+
+        self.readings = {
+            month: Reading.objects.create(customer=self.customer, period=date(2025, month, 1), current_reading=Decimal(value))
+            for month, value in ((1, "10"), (2, "20"), (3, "35"), (4, "50"))
+        }
+
+    def state(self, month):
+        reading = Reading.objects.get(customer=self.customer, period=date(2025, month, 1))
+        debt = Debt.objects.get(reading=reading)
+        details = sorted(debt.details.values_list("concept__code", "amount"))
+        return (reading.previous_reading, reading.consumption, reading.total_amount), debt.amount, details
+
+    def test_edit_middle_month(self):
+
+        february = self.readings[2]
+        february.current_reading = Decimal("25")
+        february.save()
+
+        # Febrero: 15 m3; marzo toma 25 y baja a 10 m3; abril sigue en 15 m3
+        self.assertEqual(self.state(2), (
+            (Decimal("10"), Decimal("15"), Decimal("20.50")), Decimal("20.50"),
+            [("001", Decimal("18.00")), ("002", Decimal("2.50"))],
+        ))
+        self.assertEqual(self.state(3), (
+            (Decimal("25"), Decimal("10"), Decimal("14.50")), Decimal("14.50"),
+            [("001", Decimal("12.00")), ("002", Decimal("2.50"))],
+        ))
+        self.assertEqual(self.state(4), (
+            (Decimal("35"), Decimal("15"), Decimal("20.50")), Decimal("20.50"),
+            [("001", Decimal("18.00")), ("002", Decimal("2.50"))],
+        ))
+        self.assertEqual(Debt.objects.filter(customer=self.customer).count(), 4)
+
+    def test_chain_stops_at_paid_month(self):
+
+        Reading.objects.filter(pk=self.readings[3].pk).update(paid=True)
+        before = self.state(4)
+
+        february = self.readings[2]
+        february.current_reading = Decimal("25")
+        february.save()
+
+        # Marzo pagado corta la cadena: ni marzo ni abril se tocan
+        self.assertEqual(self.state(3)[0], (Decimal("20"), Decimal("15"), Decimal("20.50")))
+        self.assertEqual(self.state(4), before)
+
+
+class CopyLoadTest(TenantTestCase):
+    """copy_load: ON CONFLICT, mapeo del RETURNING y escape de los valores en el CSV de COPY."""
+
+    PERIOD = date(2025, 1, 1)
+
+    def setUp(self):
+
+        self.category, self.calle, self.zona = _reference_data()
+        self.first = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=self.category)
+        self.second = Customer.objects.create(codigo="00002", full_name="CLIENTE 2", category=self.category)
+
+        self.existing = Reading(customer=self.first, period=self.PERIOD, current_reading=Decimal("10"))
+        self.existing.save(skip_process=True)
+
+    def load_readings(self, **kwargs):
+        objs = [
+            Reading(customer=self.first, period=self.PERIOD, current_reading=Decimal("99")),
+            Reading(customer=self.second, period=self.PERIOD, current_reading=Decimal("5")),
+        ]
+        rows = copy_load(Reading, objs, conflict=("customer", "period"), returning=("id", "customer", "period"), **kwargs)
+        return objs, assign_pks(objs, rows, ("customer", "period"))
+
+    def test_conflict_skips_existing_rows(self):
+
+        objs, saved = self.load_readings()
+
+        self.assertEqual(saved, [objs[1]])
+        self.assertIsNone(objs[0].pk)
+        self.assertEqual(Reading.objects.get(pk=objs[1].pk).customer_id, self.second.id)
+        self.assertEqual(Reading.objects.get(pk=self.existing.pk).current_reading, Decimal("10"))
+
+    def test_conflict_updates_listed_fields(self):
+
+        objs, saved = self.load_readings(update=("current_reading",))
+
+        self.assertEqual(saved, objs)
+        self.assertEqual(objs[0].pk, self.existing.pk)
+        self.assertEqual(Reading.objects.get(pk=self.existing.pk).current_reading, Decimal("99"))
+        self.assertEqual(Reading.objects.filter(period=self.PERIOD).count(), 2)
+
+    def test_null_empty_string_and_quotes(self):
+
+        name = 'JUAN "EL CHATO" PEREZ, HIJO'
+        objs = [
+            Customer(codigo="00010", full_name=name, number=None, address="", category=self.category),
+            Customer(codigo="00011", full_name='"', number="", address=None, category=self.category),
+        ]
+
+        rows = copy_load(Customer, objs, returning=("id", "codigo"))
+        saved = assign_pks(objs, rows, ("codigo",))
+
+        self.assertEqual(saved, objs)
+
+        first = Customer.objects.get(pk=objs[0].pk)
+        self.assertEqual((first.codigo, first.full_name, first.number, first.address), ("00010", name, None, ""))
+
+        second = Customer.objects.get(pk=objs[1].pk)
+        self.assertEqual((second.codigo, second.full_name, second.number, second.address), ("00011", '"', "", None))
+
+
+class ImportUpsertTest(TenantTestCase):
+    """import_readings omite lo que ya existe por (cliente, periodo); import_debts hace upsert y gana la última fila."""
+
+    def setUp(self):
+
+        self.category, self.calle, self.zona = _reference_data()
+        self.first = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=self.category)
+        self.second = Customer.objects.create(codigo="00002", full_name="CLIENTE 2", category=self.category)
+
+    def details(self, debt):
+        return sorted(debt.details.values_list("concept__code", "amount"))
+
+    def test_readings_skip_existing_periods(self):
+
+        january = Reading(customer=self.first, period=date(2025, 1, 1), current_reading=Decimal("5"))
+        january.save(skip_process=True)
+
+        text = (
+            "Lecturas 2025\n\n"
+            "Codigo,Lect.Ene,M3 Ene,Enero,Pag.Ene,Lect.Feb,M3 Feb,Febrero,Pag.Feb\n"
+            "00001,10,10,12,,20,10,12,\n"   # enero ya existe: solo entra febrero
+            "00002,8,8,,9.6,,,,\n"          # enero pagado
+            "00002,99,99,50,,,,,\n"         # repetido en el archivo: gana la primera
+            "00009,1,1,1,,,,,\n"            # cliente no existe
+        )
+
+        created, errores = import_readings(_upload("lecturas.csv", text), year=2025)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(errores, [{"fila": 7, "codigo": "00009", "error": "Cliente no encontrado"}])
+
+        self.assertEqual(Reading.objects.get(pk=january.pk).current_reading, Decimal("5"))
+        self.assertFalse(Debt.objects.filter(customer=self.first, period=date(2025, 1, 1)).exists())
+
+        february = Debt.objects.get(customer=self.first, period=date(2025, 2, 1))
+        self.assertEqual(february.amount, Decimal("15.50"))
+        self.assertEqual(february.reading.current_reading, Decimal("20"))
+        self.assertEqual(self.details(february), [("001", Decimal("12.00")), ("002", Decimal("2.50")), ("003", Decimal("1.00"))])
+
+        second = Reading.objects.get(customer=self.second)
+        self.assertEqual((second.current_reading, second.paid, second.total_amount), (Decimal("8"), True, Decimal("13.10")))
+
+    def import_debts(self, batch_size):
+
+        # Deuda previa de enero con un detalle que debe reemplazarse
+        previous = Debt.objects.create(customer=self.first, period=date(2023, 1, 1), amount=Decimal("1.00"))
+        DebtDetail.objects.create(debt=previous, concept=CashConcept.objects.get(code="001"), amount=Decimal("1.00"))
+
+        text = (
+            "Deudas historicas\n\n"
+            "Codigo,Año,Meses,Agua\n"
+            "00001,2023,DE ENERO A MARZO,30\n"
+            "00002,2023,DE ENERO A ENERO,4\n"
+            "00001,2023,DE MARZO A MARZO,6\n"   # marzo otra vez: gana esta fila
+        )
+
+        processed, errores = import_debts(_upload("deudas.csv", text), batch_size=batch_size)
+
+        self.assertEqual((processed, errores), (5, []))
+
+        # Sin clave única en Debt: una sola deuda por (cliente, periodo), mapeada por el RETURNING
+        periods = list(Debt.objects.order_by("customer_id", "period").values_list("customer__codigo", "period"))
+        self.assertEqual(periods, [
+            ("00001", date(2023, 1, 1)), ("00001", date(2023, 2, 1)), ("00001", date(2023, 3, 1)),
+            ("00002", date(2023, 1, 1)),
+        ])
+
+        january = Debt.objects.get(customer=self.first, period=date(2023, 1, 1))
+        self.assertEqual((january.pk, january.amount), (previous.pk, Decimal("13.50")))
+        self.assertEqual(self.details(january), [("001", Decimal("10.00")), ("002", Decimal("2.50")), ("003", Decimal("1.00"))])
+
+        march = Debt.objects.get(customer=self.first, period=date(2023, 3, 1))
+        self.assertEqual(march.amount, Decimal("9.50"))
+        self.assertEqual(self.details(march), [("001", Decimal("6.00")), ("002", Decimal("2.50")), ("003", Decimal("1.00"))])
+
+    def test_debts_last_row_wins_in_one_batch(self):
+        self.import_debts(batch_size=100)
+
+    def test_debts_last_row_wins_across_batches(self):
+        self.import_debts(batch_size=1)
+
+
+class ImportCustomersMetersTest(TenantTestCase):
+    """Cada medidor importado queda enlazado al id reservado (reserve_pks) de su cliente."""
+
+    def setUp(self):
+
+        self.category, self.calle, self.zona = _reference_data()
+        self.existing = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=self.category)
+
+    def test_meters_follow_reserved_ids(self):
+
+        text = (
+            "Padron\n\n"
+            "Codigo,Usuario/Cliente,DNI/RUC.,cod_categ,cod_direc,Cod.Medidor\n"
+            f"00010,CLIENTE A,,{self.category.id},{self.calle.id},MA\n"
+            f"00011,CLIENTE B,,{self.category.id},{self.calle.id},\n"
+            f"00010,CLIENTE C,,{self.category.id},{self.calle.id},MC\n"   # código repetido: otro cliente
+            f"00012,CLIENTE D,,{self.category.id},{self.calle.id},MD\n"
+            f"00013,CLIENTE E,,{self.category.id},{self.calle.id},MA\n"   # medidor repetido: sin medidor
+        )
+
+        # Lotes de 2: los ids se reservan en tres flush distintos
+        created, omitidos = import_customers(_upload("padron.csv", text), batch_size=2)
+
+        self.assertEqual(created, 5)
+        self.assertEqual([o["fila"] for o in omitidos], [8])
+
+        meters = dict(WaterMeter.objects.values_list("code", "customer__full_name"))
+        self.assertEqual(meters, {"MA": "CLIENTE A", "MC": "CLIENTE C", "MD": "CLIENTE D"})
+
+        imported = Customer.objects.exclude(pk=self.existing.pk)
+        self.assertTrue(all(pk > self.existing.pk for pk in imported.values_list("pk", flat=True)))
+        self.assertFalse(WaterMeter.objects.filter(customer__full_name__in=["CLIENTE B", "CLIENTE E"]).exists())
+
+        # La secuencia avanzó: un alta normal no choca con los ids reservados
+        later = Customer.objects.create(codigo="00020", full_name="CLIENTE F", category=self.category)
+        self.assertGreater(later.pk, max(imported.values_list("pk", flat=True)))
+
+    def test_reserve_pks_uses_the_sequence(self):
+
+        customers = reserve_pks([Customer(codigo=f"0010{i}", full_name="X", category=self.category) for i in range(3)])
+        pks = [c.pk for c in customers]
+
+        self.assertEqual(len(set(pks)), 3)
+        self.assertTrue(all(pk > self.existing.pk for pk in pks))
+
+
+class CashRollupTest(TenantTestCase):
+    """El resumen diario sigue a los movimientos y egresos, y rebuild() llega a lo mismo."""
+
+    DAY1 = date(2025, 3, 10)
+    DAY2 = date(2025, 3, 11)
+    DAY3 = date(2025, 3, 12)
+
+    def setUp(self):
+
+        self.cashbox = CashBox.objects.create(
+            user=User.objects.create(username="caja", email="caja@example.com"), opening_balance=Decimal("100.00"),
+        )
+        self.agua = CashConcept.objects.create(code="001", name="Agua", type="income")
+        self.desague = CashConcept.objects.create(code="002", name="Desagüe", type="income")
+
+    def movement(self, day, concept, method, total):
+        return CashMovement.objects.create(cashbox=self.cashbox, business_date=day, concept=concept, method=method, total=Decimal(total))
+
+    def outflow(self, day, method, total):
+        return CashOutflow.objects.create(cashbox=self.cashbox, business_date=day, method=method, total=Decimal(total))
+
+    def rollups(self):
+        """Filas del resumen con algo sumado (las que quedan en cero tras un delete no cuentan)."""
+        return {
+            (r.date, r.concept_id, r.method): (r.movements_total, r.movements_count, r.outflows_total, r.outflows_count)
+            for r in DailyCashRollup.objects.filter(cashbox=self.cashbox)
+            if r.movements_count or r.outflows_count
+        }
+
+    def recompute(self):
+        """El mismo resumen sumado a mano desde los movimientos y egresos."""
+        totals = {}
+        for m in CashMovement.objects.filter(cashbox=self.cashbox):
+            row = totals.setdefault((m.business_date, m.concept_id, m.method), [Decimal("0"), 0, Decimal("0"), 0])
+            row[0] += m.total
+            row[1] += 1
+        for o in CashOutflow.objects.filter(cashbox=self.cashbox):
+            row = totals.setdefault((o.business_date, None, o.method), [Decimal("0"), 0, Decimal("0"), 0])
+            row[2] += o.total
+            row[3] += 1
+        return {key: tuple(row) for key, row in totals.items()}
+
+    def test_save_and_delete_update_the_rollup(self):
+
+        movement = self.movement(self.DAY1, self.agua, "cash", "10.00")
+        self.movement(self.DAY1, self.agua, "cash", "5.00")
+        outflow = self.outflow(self.DAY1, "cash", "4.00")
+
+        self.assertEqual(self.rollups(), {
+            (self.DAY1, self.agua.id, "cash"): (Decimal("15.00"), 2, Decimal("0.00"), 0),
+            (self.DAY1, None, "cash"): (Decimal("0.00"), 0, Decimal("4.00"), 1),
+        })
+
+        # Un cambio de monto y de método mueve el total entre filas
+        movement.total = Decimal("12.00")
+        movement.method = "yape"
+        movement.save()
+        outflow.total = Decimal("6.00")
+        outflow.save()
+
+        self.assertEqual(self.rollups(), {
+            (self.DAY1, self.agua.id, "cash"): (Decimal("5.00"), 1, Decimal("0.00"), 0),
+            (self.DAY1, self.agua.id, "yape"): (Decimal("12.00"), 1, Decimal("0.00"), 0),
+            (self.DAY1, None, "cash"): (Decimal("0.00"), 0, Decimal("6.00"), 1),
+        })
+
+        movement.delete()
+        outflow.delete()
+
+        self.assertEqual(self.rollups(), {(self.DAY1, self.agua.id, "cash"): (Decimal("5.00"), 1, Decimal("0.00"), 0)})
+        self.assertEqual(self.rollups(), self.recompute())
+
+    def test_rebuild_matches_raw_rows(self):
+
+        self.movement(self.DAY1, self.agua, "cash", "10.00")
+        self.movement(self.DAY1, self.desague, "cash", "2.50")
+        self.movement(self.DAY2, self.agua, "plin", "7.25")
+        self.outflow(self.DAY2, "cash", "3.00")
+        self.movement(self.DAY2, self.agua, "cash", "1.00").delete()
+
+        # Alta masiva sin save(): el resumen no la ve hasta rebuild()
+        CashMovement.objects.bulk_create([
+            CashMovement(cashbox=self.cashbox, business_date=self.DAY3, concept=self.agua, method="card", total=Decimal("9.99")),
+        ])
+
+        expected = self.recompute()
+        self.assertNotEqual(self.rollups(), expected)
+
+        cash_rollup.rebuild([self.cashbox.id])
+
+        self.assertEqual(self.rollups(), expected)
+
+    def test_opening_balance_adds_earlier_days(self):
+
+        self.movement(self.DAY1, self.agua, "cash", "10.00")
+        self.outflow(self.DAY1, "cash", "4.00")
+        self.movement(self.DAY2, self.desague, "yape", "5.00")
+        self.outflow(self.DAY2, "cash", "1.50")
+        self.movement(self.DAY3, self.agua, "cash", "8.00")
+
+        self.assertEqual(cash_rollup.day_totals(self.cashbox, self.DAY1), {
+            "opening_balance": Decimal("100.00"), "total_incomes": Decimal("10.00"), "total_outcomes": Decimal("4.00"),
+        })
+        self.assertEqual(cash_rollup.day_totals(self.cashbox, self.DAY2), {
+            "opening_balance": Decimal("106.00"), "total_incomes": Decimal("5.00"), "total_outcomes": Decimal("1.50"),
+        })
+        # 100 + (10 - 4) + (5 - 1.50)
+        self.assertEqual(cash_rollup.day_totals(self.cashbox, self.DAY3)["opening_balance"], Decimal("109.50"))
+
+
+class WorkbookReaderTest(SimpleTestCase):
+    """Los tres formatos entregan las mismas filas, con el número de fila de Excel y las celdas tipadas."""
+
+    HEADER = ["Codigo", "Nombre", "Lectura", "Monto"]
+    ROWS = [
+        ["00007", "ANA", 12, 3.5],
+        [None, None, None, None],   # fila vacía: se omite
+        ["00008", "LUIS", 0, None],
+    ]
+    EXPECTED = [
+        (4, {"Codigo": "00007", "Nombre": "ANA", "Lectura": 12, "Monto": 3.5}),
+        (6, {"Codigo": "00008", "Nombre": "LUIS", "Lectura": 0, "Monto": None}),
+    ]
+
+    def xlsx(self, rows):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in rows:
+            sheet.append(row)
+
+        file = io.BytesIO()
+        workbook.save(file)
+        file.seek(0)
+        file.name = "archivo.xlsx"
+        return file
+
+    def read(self, file, **kwargs):
+        return list(iter_rows(file, header=2, dtype={"Codigo": str}, **kwargs))
+
+    def test_csv(self):
+
+        # Como lo exporta Excel en español: con BOM, punto y coma y las filas completas
+        text = "\ufeffTitulo;;;\n;;;\nCodigo;Nombre;Lectura;Monto\n00007;ANA;12;3.5\n;;;\n00008;LUIS;0;\n"
+
+        self.assertEqual(self.read(_upload("archivo.csv", text)), self.EXPECTED)
+
+    def test_xlsx(self):
+
+        file = self.xlsx([["Titulo"], [], self.HEADER] + self.ROWS)
+
+        self.assertEqual(self.read(file), self.EXPECTED)
+
+    def test_xls(self):
+
+        # Sin escritor de .xls a mano: xlrd devuelve números como float y celdas vacías como ""
+        values = [["Titulo", "", "", ""], ["", "", "", ""], self.HEADER]
+        values += [[v if v is not None else "" for v in row] for row in self.ROWS]
+        values[3][2] = 12.0
+        values[5][2] = 0.0
+
+        sheet = mock.Mock(nrows=len(values), row_values=lambda index: values[index])
+        book = mock.Mock(sheet_by_index=lambda index: sheet)
+
+        file = io.BytesIO(b"")
+        file.name = "archivo.xls"
+
+        with mock.patch("xlrd.open_workbook", return_value=book):
+            self.assertEqual(self.read(file), self.EXPECTED)
+
+        book.release_resources.assert_called_once()
+
+    def test_batches_keep_row_numbers(self):
+
+        file = self.xlsx([self.HEADER] + [[f"{i:05d}", "X", i, None] for i in range(5)])
+
+        batches = list(iter_batches(file, batch_size=2, dtype={"Codigo": str}))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual([fila for batch in batches for fila, _ in batch], [2, 3, 4, 5, 6])
+
+    def test_duplicate_headers(self):
+
+        for file in (_upload("archivo.csv", "codigo,nombre,codigo\n1,A,2\n"), self.xlsx([["codigo", "nombre", "codigo"], [1, "A", 2]])):
+            with self.assertRaisesMessage(WorkbookError, "Encabezados repetidos: codigo"):
+                list(iter_batches(file))
+
+    def test_damaged_file(self):
+
+        with self.assertRaises(WorkbookError):
+            list(iter_batches(_upload("archivo.xlsx", "no es un xlsx")))
+
+    def test_sorted_rows_covers_the_whole_file(self):
+
+        text = "codigo,descrip\n03,C\n\n01,A\n,SIN CODIGO\n02,B\n"
+
+        rows = sorted_rows(_upload("archivo.csv", text), "codigo", dtype={"codigo": str})
+
+        self.assertEqual([(fila, row["codigo"]) for fila, row in rows], [(4, "01"), (6, "02"), (2, "03"), (5, None)])
+
+
+class StreamZipTest(SimpleTestCase):
+    """Los bytes que se van entregando forman un ZIP válido con las entradas en orden."""
+
+    def test_streamed_bytes_read_back(self):
+
+        pdf = os.urandom(200_000)  # datos al azar: no se comprimen
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(b"recibo en disco")
+        self.addCleanup(os.unlink, tmp.name)
+
+        def entries(handle):
+            yield "CENTRO/recibos.pdf", pdf
+            yield "NORTE/recibos.pdf", handle
+            yield "SUR/recibos.pdf", tmp.name
+            yield "vacio.txt", b""
+
+        for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            with self.subTest(compression=compression):
+
+                handle = io.BytesIO(b"recibo abierto")
+                chunks = list(stream_zip(entries(handle), compression=compression))
+
+                # Una entrega por entrada más el directorio central
+                self.assertEqual(len(chunks), 5)
+                self.assertTrue(handle.closed)
+
+                with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zip_file:
+                    self.assertIsNone(zip_file.testzip())
+                    self.assertEqual(zip_file.namelist(), ["CENTRO/recibos.pdf", "NORTE/recibos.pdf", "SUR/recibos.pdf", "vacio.txt"])
+                    self.assertEqual(zip_file.read("CENTRO/recibos.pdf"), pdf)
+                    self.assertEqual(zip_file.read("NORTE/recibos.pdf"), b"recibo abierto")
+                    self.assertEqual(zip_file.read("SUR/recibos.pdf"), b"recibo en disco")
+                    self.assertEqual(zip_file.read("vacio.txt"), b"")
+                    self.assertEqual({i.compress_type for i in zip_file.infolist()}, {compression})
+
+
+class PreviousReadingTest(TenantTestCase):
+    """La "lectura anterior" es la misma en facturación (resolve_previous_readings) y en validación (annotate_reading_facts)."""
+
+    def setUp(self):
+
+        category, calle, zona = _reference_data()
+
+        def customer(codigo, readings):
+            customer = Customer.objects.create(codigo=codigo, full_name=f"CLIENTE {codigo}", category=category)
+            for period, value in readings:
+                Reading(customer=customer, period=period, current_reading=Decimal(value)).save(skip_process=True)
+            return customer
+
+        # Dos lecturas en febrero (la del 15 es la última) y marzo sin lectura
+        self.gap = customer("00001", [(date(2025, 1, 1), "10"), (date(2025, 2, 15), "30"), (date(2025, 2, 1), "20")])
+        self.plain = customer("00002", [(date(2025, 2, 1), "7"), (date(2025, 3, 1), "9")])
+        self.first = customer("00003", [])
+
+    def test_latest_earlier_reading_per_customer(self):
+
+        period = date(2025, 4, 1)
+        expected = {
+            self.gap.id: (date(2025, 2, 15), Decimal("30")),
+            self.plain.id: (date(2025, 3, 1), Decimal("9")),
+        }
+
+        previous = resolve_previous_readings(period)
+        self.assertEqual({k: (v.period, v.current_reading) for k, v in previous.items()}, expected)
+
+        annotated = annotate_reading_facts(Customer.objects.all(), period)
+        self.assertEqual(
+            {c.id: (c.prev_period, c.prev_reading) for c in annotated if c.prev_period},
+            expected,
+        )
+        self.assertIsNone(annotated.get(pk=self.first.pk).prev_period)
+
+        # Dentro de febrero, la anterior al día 15 es la del día 1
+        self.assertEqual(resolve_previous_readings(date(2025, 2, 15), [self.gap.id])[self.gap.id].current_reading, Decimal("20"))
+
+    def test_order_is_the_single_definition(self):
+
+        self.assertEqual(previous_readings(date(2025, 4, 1)).query.order_by, ("customer_id", "-period", "-id"))
+
+
+class PaidDebtReadingTest(TenantTestCase):
+    """Una lectura cuyo mes ya tiene la deuda pagada se rechaza con 400, sin escribir nada."""
+
+    PERIOD = date(2025, 2, 1)
+    MESSAGE = "No se puede modificar la lectura de 2025-02 porque ya está pagada."
+
+    def setUp(self):
+
+        category, calle, zona = _reference_data()
+        self.user = User.objects.create(username="lector", email="lector@example.com")
+        self.customer = Customer.objects.create(codigo="00001", full_name="CLIENTE 1", category=category)
+
+        Reading.objects.create(customer=self.customer, period=date(2025, 1, 1), current_reading=Decimal("10"))
+        self.paid_debt = Debt.objects.create(customer=self.customer, period=self.PERIOD, amount=Decimal("5.00"), paid=True)
+
+    def request(self, method, data, pk=None):
+
+        from .views import ReadingViewSet
+
+        action = {"post": "create", "patch": "partial_update"}[method]
+        request = getattr(APIRequestFactory(), method)("/readings/", data, format="json")
+        force_authenticate(request, user=self.user)
+
+        return ReadingViewSet.as_view({method: action})(request, **({"pk": pk} if pk else {}))
+
+    def test_create_is_rejected(self):
+
+        response = self.request("post", {
+            "customer": self.customer.id, "period": self.PERIOD.isoformat(), "current_reading": "20",
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(self.MESSAGE, str(response.data))
+        self.assertFalse(Reading.objects.filter(customer=self.customer, period=self.PERIOD).exists())
+
+    def test_update_is_rejected(self):
+
+        # Lectura sin pagar, pero su deuda del mes se pagó
+        reading = Reading(customer=self.customer, period=self.PERIOD, current_reading=Decimal("20"))
+        reading.save(skip_process=True)
+
+        response = self.request("patch", {"current_reading": "25"}, pk=reading.pk)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(self.MESSAGE, str(response.data))
+        self.assertEqual(Reading.objects.get(pk=reading.pk).current_reading, Decimal("20"))
+
+        # annotate_reading_facts es quien lo detecta
+        facts = annotate_reading_facts(Customer.objects.filter(pk=self.customer.pk), self.PERIOD, exclude_id=reading.pk).get()
+        self.assertTrue(facts.has_paid_debt)
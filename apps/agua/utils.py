@@ -6,6 +6,7 @@ from django.utils.timezone import now, localdate
 from datetime import date
 from decimal import Decimal, InvalidOperation
 from .models import Reading, Debt, DailyCashReport, CashBox
+from .core.cash_rollup import day_totals
 
 MESES = {
     "ENERO": 1,
@@ -126,23 +127,11 @@ def generate_daily_report(cashbox: CashBox, date=None):
     if not date:
         date = localdate()
 
-    # saldo de ayer
-    previous_report = DailyCashReport.objects.filter(
-        cashbox=cashbox, date__lt=date
-    ).order_by("-date").first()
-    opening_balance = previous_report.closing_balance if previous_report else cashbox.opening_balance
-
-    # ingresos y egresos del día
-    movimientos = cashbox.movements.filter(created_at__date=date)
-    total_incomes = movimientos.filter(concept__type="income").aggregate(s=Sum("total"))["s"] or 0
-    # total_outcomes = movimientos.filter(concept__type="outcome").aggregate(s=Sum("total"))["s"] or 0
-
-    # ✅ Egresos del día (CashOutflow)
-    total_outcomes = (
-        cashbox.outflows.filter(created_at__date=date)
-        .aggregate(s=Sum("total"))["s"]
-        or 0
-    )
+    # Saldo inicial, ingresos y egresos del día desde el resumen diario (core/cash_rollup.py)
+    totals = day_totals(cashbox, date)
+    opening_balance = totals["opening_balance"]
+    total_incomes = totals["total_incomes"]
+    total_outcomes = totals["total_outcomes"]
 
     closing_balance = opening_balance + total_incomes - total_outcomes
 
@@ -1,7 +1,6 @@
 from django.shortcuts import render, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from django.template.loader import render_to_string, get_template
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from django.conf import settings
 from django.utils.timezone import now, localdate
 from django.utils.formats import date_format
@@ -19,7 +18,6 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.exceptions import ValidationError
 
 from datetime import datetime, date
-from weasyprint import HTML, CSS
 from collections import defaultdict
 from babel.dates import format_date
 from decimal import Decimal
@@ -31,20 +29,33 @@ from .serializers import (
 )
 from apps.agua.core.permissions import GlobalPermissionMixin
 
-from PyPDF2 import PdfMerger 
 import calendar
-import io
-import pandas as pd
 import os
 import tempfile
 import zipfile
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
-from .utils import ReadingFilter, DebtFilter, to_none_if_empty, to_decimal_or_none, generar_periodos, format_period, generate_daily_report
+from .utils import ReadingFilter, DebtFilter, to_none_if_empty, to_decimal_or_none, generar_periodos, generate_daily_report
 
 from django.db import connection
 
 from .core.mixins import TenantSafeMixin
+from .core.billing import generate_flat_rate_readings, load_detail_concepts
+from .core.registry import get_registry
+from .core.importers import import_readings, import_debts, import_customers
+from .core.readings import capture_readings
+from .core.receipts import build_receipts_context, with_receipt_relations
+from .core.pdf import render_receipts_pdf, render_pdf, TICKET_STYLESHEETS
+from .core.receipt_cache import cached_receipts_pdf
+from .core.streaming_zip import stream_zip
+from .core.cash import cash_report
+from .core.cash_rollup import summary as cash_summary
+from .core.customers import with_outstanding_debt
+from .core.debt_report import customers_with_debt, report_rows, iter_csv, write_xlsx
+from .core.workbook import WorkbookError, iter_batches, sorted_rows
+from .core.validation import (
+    wants_dry_run, CustomerFileValidator, ReadingFileValidator, DebtFileValidator, CategoryFileValidator, StreetFileValidator
+)
 
 class CustomPagination(PageNumberPagination):
 
@@ -62,6 +73,10 @@ class CustomerViewSet(TenantSafeMixin, GlobalPermissionMixin, viewsets.ModelView
 
     filterset_fields = ['codigo','zona','calle']  
 
+    def get_queryset(self):
+        # Deuda pendiente y relaciones del serializer en la misma consulta (sin N+1 por fila)
+        return with_outstanding_debt(super().get_queryset())
+
     def create(self, request, *args, **kwargs):
 
         data = request.data
@@ -163,167 +178,52 @@ class CustomerViewSet(TenantSafeMixin, GlobalPermissionMixin, viewsets.ModelView
             return Response({'error': 'No se proporciono un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            df = pd.read_excel(
-                file,
-                engine='openpyxl',
-                header=2,
-                dtype={'Codigo': str}
-            )
-        except Exception as e:
-            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Obtenemos la zona por defecto (sin zona)
-        default_zona = Zona.objects.filter(name__iexact="SIN ZONA").first()
-
-        for index, row in df.iterrows():
-
-            codigo = str(row.get('Codigo'))
-
-            # DNI/RUC
-            number = to_none_if_empty(row.get('DNI/RUC.'))
-
-            identity_document_type = 0
-
-            if number and number.isdigit():
-                if len(number) == 8:
-                    identity_document_type = 1  # DNI
-                elif len(number) == 11:
-                    identity_document_type = 6  # RUC
-            else:
-                number = "00000000"  # Valor por defecto si está vacío o no es válido
-
-            full_name = to_none_if_empty(row.get('Usuario/Cliente'))
-           
-            calle_dir = row.get('cod_direc')
-            print(type(calle_dir), calle_dir)
-            zona_name = to_none_if_empty(row.get('Barrio'))
-            
-            nro = to_none_if_empty(row.get("Nro."))
-            mz = to_none_if_empty(row.get("Mzna."))
-            lote = to_none_if_empty(row.get("Lote"))
-
-
-            if zona_name:
-
-                zona_name = zona_name.strip().upper()
-                zona = Zona.objects.filter(name__iexact=zona_name).first()
-                if not zona:
-                    zona = default_zona
-            else:
-
-                zona = default_zona
-
-            # Normalizar valor
-            if not calle_dir or str(calle_dir).strip() == '' or pd.isna(calle_dir):
-                calle_dir = 1
-            else:
-                calle_dir = int(str(calle_dir).strip())
-
-            print(calle_dir)
-            calle = Calle.objects.get(pk = calle_dir)
-
-            parts = [
-                f"{calle.via.name} {calle.name}",
-                f"Mz {mz}" if mz else None,
-                f"Lt {lote}" if lote else None,
-                f"N° {nro}" if nro else None,
-            ]
-
-            # eliminar None y unir
-            address = " ".join([p for p in parts if p])
-            # Medidor
-            code = to_none_if_empty(row.get('Cod.Medidor'))
-            tiene_medidor_excel = to_none_if_empty(row.get('T.Med.'))
-
-            if tiene_medidor_excel == "si":
-                has_meter = True
-            elif tiene_medidor_excel == "no":
-                has_meter = False
-            else:
-                has_meter = True if code else False
-
-            # Categoría
-            category_id = to_none_if_empty(row.get('cod_categ')) or 6
-
-            #Crear cliente
-            customer = Customer.objects.create(
-                codigo=codigo,
-                identity_document_type=identity_document_type,
-                full_name=full_name,
-                number=number,
-                address=address,
-                nro=nro,
-                mz=mz,
-                lote=lote,
-                has_meter=has_meter,
-                category_id=category_id,
-                calle = calle,
-                zona = zona
-            )
+            if wants_dry_run(request.query_params):
+                batches = iter_batches(file, header=2, dtype={'Codigo': str})
+                return Response(CustomerFileValidator().validate_batches(batches).report(), status=status.HTTP_200_OK)
 
-            # Crear medidor solo si aplica y no existe
-            if has_meter and code:
-                if not WaterMeter.objects.filter(code=code).exists():
-                    WaterMeter.objects.create(
-                        customer=customer,
-                        code=code,
-                        installation_date=now()
-                    )
+            creados, omitidos = import_customers(file)
+        except WorkbookError as e:
+            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"message": "Clientes importados correctamente"}, status=status.HTTP_200_OK)
+        return Response({
+            "message": "Clientes importados correctamente",
+            "creados": creados,
+            "omitidos": omitidos
+        }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"], url_path='report/debt')
     def report(self,request):
 
         calle_id = request.query_params.get("calle")
         zona_id = request.query_params.get("zona")
+        output = request.query_params.get("output", "pdf")
 
-        debts = Debt.objects.filter(paid=False)
-
-        data = []
-
-        total_general = Decimal("0.00")
-        customers = Customer.objects.all()
-
-        calle = None
-        zona = None
-        if calle_id:
-
-            calle = Calle.objects.get(pk=calle_id)
-            customers = customers.filter(calle_id=calle_id)
-
-        if zona_id:
+        if output not in ("pdf", "csv", "xlsx"):
+            return Response({"error": "Formato no soportado. Use pdf, csv o xlsx"}, status=400)
 
-            zona = Zona.objects.get(pk=zona_id)
-            customers = customers.filter(zona_id=zona_id)
+        calle = get_object_or_404(Calle, pk=calle_id) if calle_id else None
+        zona = get_object_or_404(Zona, pk=zona_id) if zona_id else None
 
-        for customer in customers:
+        # Una sola consulta agrupada por cliente (antes eran dos por cliente)
+        customers = customers_with_debt(calle_id, zona_id)
 
-            customers_debts = debts.filter(customer=customer)
+        if output == "csv":
+            response = StreamingHttpResponse(iter_csv(customers), content_type="text/csv; charset=utf-8")
+            response["Content-Disposition"] = 'attachment; filename="reporte_global_deudas.csv"'
+            return response
 
-            if not customers_debts.exists():
-
-               continue
-               
-            sumary = customers_debts.aggregate(
-                total=Sum("amount"),
-                min_period=Min("period"),
-                max_period=Max("period")
+        if output == "xlsx":
+            return FileResponse(
+                write_xlsx(customers),
+                as_attachment=True,
+                filename="reporte_global_deudas.xlsx",
+                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
 
-            total_general += sumary["total"] or Decimal("0.00")
-
-            data.append({
-
-                "customer" : customer,
-                "min_period" : sumary["min_period"],
-                "max_period" : sumary["max_period"],
-                "total" : sumary["total"]
-
-            })
-     
+        data, total_general = report_rows(customers)
 
-        html_string = render_to_string("customer/report.html",{
+        pdf = render_pdf("customer/report.html",{
 
             "data":data,
             "total_general":total_general,
@@ -333,7 +233,6 @@ class CustomerViewSet(TenantSafeMixin, GlobalPermissionMixin, viewsets.ModelView
 
         })
 
-        pdf = HTML(string=html_string).write_pdf()
         response = HttpResponse(pdf, content_type="application/pdf")
         response["Content-Disposition"] = f'filename="reporte_global_deudas.pdf"'
         return response
@@ -352,7 +251,7 @@ class CustomerViewSet(TenantSafeMixin, GlobalPermissionMixin, viewsets.ModelView
         total_paid = debts.filter(paid=True).aggregate(Sum('amount'))['amount__sum'] or 0
         total_pending = total_debt - total_paid
 
-        html_string = render_to_string('customer/customer_debt_history.html', {
+        pdf = render_pdf('customer/customer_debt_history.html', {
             'customer': customer,
             'debts_by_year': dict(sorted(debts_by_year.items())),
             'total_debt': total_debt,
@@ -361,7 +260,6 @@ class CustomerViewSet(TenantSafeMixin, GlobalPermissionMixin, viewsets.ModelView
             'today': datetime.now(),
         })
 
-        pdf = HTML(string=html_string).write_pdf()
         filename = f"Historial_{customer.full_name.replace(' ', '_')}.pdf"
         response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'inline; filename="{filename}"'
@@ -383,6 +281,19 @@ class CashBoxViewSet(TenantSafeMixin,viewsets.ModelViewSet):
 
         return Response({"message": f"Caja del {report.date} confirmada", "closing_balance": report.closing_balance})
 
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None, **kwargs):
+        """Totales por día, concepto y método desde el resumen diario (sin recorrer movimientos)."""
+        cashbox = self.get_object()
+
+        try:
+            start = datetime.strptime(request.query_params.get("start_date") or str(localdate()), "%Y-%m-%d").date()
+            end = datetime.strptime(request.query_params.get("end_date") or str(start), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"error": "Formato de fecha inválido (use YYYY-MM-DD)"}, status=400)
+
+        return Response(cash_summary(cashbox, start, end))
+
     @action(detail=True, methods=["get"])
     def report(self, request, pk=None, **kwargs):
 
@@ -404,8 +315,8 @@ class CashBoxViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             except ValueError:
                 return Response({"error": "Formato de fecha inválido (use YYYY-MM-DD)"}, status=400)
 
-            movimientos = movimientos.filter(created_at__date__range=(start, end))
-            egresos = egresos.filter(created_at__date__range=(start, end))
+            movimientos = movimientos.filter(business_date__range=(start, end))
+            egresos = egresos.filter(business_date__range=(start, end))
             reporte_tipo = f"Reporte entre {start} y {end}"
 
         else:
@@ -418,106 +329,17 @@ class CashBoxViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             else:
                 fecha = localdate()
 
-            movimientos = movimientos.filter(created_at__date=fecha)
-            egresos = egresos.filter(created_at__date=fecha)
+            movimientos = movimientos.filter(business_date=fecha)
+            egresos = egresos.filter(business_date=fecha)
             reporte_tipo = f"Reporte diario - {fecha}"
 
-        # ==========================
-        # AGRUPACIÓN POR CONCEPTO
-        # ==========================
-        conceptos_dict = defaultdict(list)
-
-        for mov in movimientos.select_related("concept", "invoice_payment__invoice__customer"):
-            concepto = mov.concept.name
-            conceptos_dict[concepto].append(mov)
-
-        conceptos_data = []
-
-        for concepto, movs in conceptos_dict.items():
-            facturas_dict = {}
-
-            for m in movs:
-                inv = m.invoice_payment.invoice if m.invoice_payment else None
-
-                if not inv or inv.status == "cancelled":
-                    continue  # ignoramos facturas anuladas
-
-                key = inv.id
-                if key not in facturas_dict:
-                    facturas_dict[key] = {
-                        "code": inv.code,
-                        "date": inv.date,
-                        "cliente": inv.customer.full_name,
-                        "direccion": inv.customer.address,
-                        "pagos": defaultdict(float),
-                        "total": 0,
-                        "periodo": "",  # 👈 string vacío por defecto
-                    }
-
-                    # 📌 Solo calcular periodo si el concepto es 001, 002 o 003
-                    if m.concept.code in ["001", "002", "003"]:
-                        periodos = list(
-                            inv.invoice_debts.select_related("debt")
-                            .values_list("debt__period", flat=True)
-                        )
-
-                        if periodos:
-                            periodos = sorted(periodos)
-                            if len(periodos) == 1:
-                                facturas_dict[key]["periodo"] = format_period(periodos[0])
-                            else:
-                                facturas_dict[key]["periodo"] = (
-                                    f"{format_period(periodos[0])} - {format_period(periodos[-1])}"
-                                )
-
-                metodo = m.invoice_payment.method if m.invoice_payment else "Desconocido"
-                facturas_dict[key]["pagos"][metodo] += float(m.total)
-                facturas_dict[key]["total"] += float(m.total)
-
-            # Convertir a lista
-            facturas_list = []
-            total_concepto = 0
-            for f in facturas_dict.values():
-                total_concepto += f["total"]
-                f["pagos"] = dict(f["pagos"])  # pasar defaultdict a dict normal
-                facturas_list.append(f)
-
-            conceptos_data.append({
-                "concepto": concepto,
-                "total": total_concepto,
-                "facturas": facturas_list,
-            })
-
-        total_general = sum(c["total"] for c in conceptos_data)
-
-        # Agrupar por método de pago
-        metodo_dict = defaultdict(list)
-        for mov in movimientos.select_related("invoice_payment__invoice"):
-            metodo_dict[mov.method].append(mov)
-
-        metodo_data = []
-        for metodo, movs in metodo_dict.items():
-
-            total_metodo = sum([
-                m.total if not (m.invoice_payment and m.invoice_payment.invoice.status == "cancelled") else 0
-                for m in movs
-            ])
-            metodo_data.append({
-                "metodo": dict(InvoicePayment.PAYMENT_METHODS).get(metodo, metodo),
-                "total": total_metodo,
-                "movimientos": movs
-            })
-
-        html_string = render_to_string("reports/caja/daily.html", {
+        pdf = render_pdf("reports/caja/daily.html", {
             "cashbox": cashbox,
-            "conceptos": conceptos_data,
-            "total_general": total_general,
+            **cash_report(movimientos),
             "reporte_tipo": reporte_tipo,
-            "metodos": metodo_data,
             "report": cashbox,
         })
 
-        pdf = HTML(string=html_string).write_pdf()
         response = HttpResponse(pdf, content_type="application/pdf")
         response["Content-Disposition"] = f'filename="reporte_caja_{cashbox.id}.pdf"'
         return response
@@ -536,105 +358,16 @@ class DailyCashReportViewSet(TenantSafeMixin,viewsets.ModelViewSet):
   
         fecha = daily_cash.date
 
-        movimientos = cashbox.movements.filter(created_at__date=fecha)
+        movimientos = cashbox.movements.filter(business_date=fecha)
         reporte_tipo = f"Reporte - {fecha}"
 
-        # ==========================
-        # AGRUPACIÓN POR CONCEPTO
-        # ==========================
-        conceptos_dict = defaultdict(list)
-
-        for mov in movimientos.select_related("concept", "invoice_payment__invoice__customer"):
-            concepto = mov.concept.name
-            conceptos_dict[concepto].append(mov)
-
-        conceptos_data = []
-
-        for concepto, movs in conceptos_dict.items():
-            facturas_dict = {}
-
-            for m in movs:
-                inv = m.invoice_payment.invoice if m.invoice_payment else None
-
-                if not inv or inv.status == "cancelled":
-                    continue  # ignoramos facturas anuladas
-
-                key = inv.id
-                if key not in facturas_dict:
-                    facturas_dict[key] = {
-                        "code": inv.code,
-                        "date": inv.date,
-                        "cliente": inv.customer.full_name,
-                        "direccion": inv.customer.address,
-                        "pagos": defaultdict(float),
-                        "total": 0,
-                        "periodo": "",  # 👈 string vacío por defecto
-                    }
-
-                    # 📌 Solo calcular periodo si el concepto es 001, 002 o 003
-                    if m.concept.code in ["001", "002", "003"]:
-                        periodos = list(
-                            inv.invoice_debts.select_related("debt")
-                            .values_list("debt__period", flat=True)
-                        )
-
-                        if periodos:
-                            periodos = sorted(periodos)
-                            if len(periodos) == 1:
-                                facturas_dict[key]["periodo"] = format_period(periodos[0])
-                            else:
-                                facturas_dict[key]["periodo"] = (
-                                    f"{format_period(periodos[0])} - {format_period(periodos[-1])}"
-                                )
-
-                metodo = m.invoice_payment.method if m.invoice_payment else "Desconocido"
-                facturas_dict[key]["pagos"][metodo] += float(m.total)
-                facturas_dict[key]["total"] += float(m.total)
-
-            # Convertir a lista
-            facturas_list = []
-            total_concepto = 0
-            for f in facturas_dict.values():
-                total_concepto += f["total"]
-                f["pagos"] = dict(f["pagos"])  # pasar defaultdict a dict normal
-                facturas_list.append(f)
-
-            conceptos_data.append({
-                "concepto": concepto,
-                "total": total_concepto,
-                "facturas": facturas_list,
-            })
-
-        total_general = sum(c["total"] for c in conceptos_data)
-
-        # Agrupar por método de pago
-        metodo_dict = defaultdict(list)
-        for mov in movimientos.select_related("invoice_payment__invoice"):
-            metodo_dict[mov.method].append(mov)
-
-        metodo_data = []
-        for metodo, movs in metodo_dict.items():
-
-            total_metodo = sum([
-                m.total if not (m.invoice_payment and m.invoice_payment.invoice.status == "cancelled") else 0
-                for m in movs
-            ])
-            metodo_data.append({
-                "metodo": dict(InvoicePayment.PAYMENT_METHODS).get(metodo, metodo),
-                "total": total_metodo,
-                "movimientos": movs
-            })
-
-        html_string = render_to_string("reports/caja/daily.html", {
+        pdf = render_pdf("reports/caja/daily.html", {
             "cashbox": cashbox,
-            "conceptos": conceptos_data,
-            "total_general": total_general,
+            **cash_report(movimientos),
             "reporte_tipo": reporte_tipo,
-            "metodos": metodo_data,
             "report": daily_cash,
         })
 
-        pdf = HTML(string=html_string).write_pdf()
         response = HttpResponse(pdf, content_type="application/pdf")
         response["Content-Disposition"] = f'filename="reporte_caja_{cashbox.id}.pdf"'
         return response
@@ -714,32 +447,55 @@ class ReadingViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             r.save()
             prev_value = r.current_reading
 
-    @action(detail=False, methods=['post'])
-    def import_excel(self, request):
+    @action(detail=False, methods=['post'], url_path='bulk-capture')
+    def bulk_capture(self, request):
+        """
+        Registro en lote de lecturas de una ruta (calle o zona) para un periodo
+        """
+        period_str = request.data.get("period")
+        calle_id = request.data.get("calle")
+        zona_id = request.data.get("zona")
+        rows = request.data.get("readings") or []
 
-        month_map = {
-            "Lect.Ene": 1, "Lect.Feb": 2, "Lect.Mar": 3, "Lect.Abr": 4, "Lect.May": 5,
-            "Lect.Jun": 6, "Lect.Jul": 7, "Lect.Ago": 8, "Lect.Sep": 9, "Lect.Oct": 10,
-            "Lect.Nov": 11, "Lect.Dic": 12,
-        }
+        if not period_str:
+            return Response({"error": "Falta el periodo (YYYY-MM)"}, status=status.HTTP_400_BAD_REQUEST)
 
-        consumo_map = {
-            "M3 Ene": 1, "M3 Feb": 2, "M3 Mar": 3, "M3 Abr": 4, "M3 May": 5,
-            "M3 Jun": 6, "M3 Jul": 7, "M3 Ago": 8, "M3 Sep": 9, "M3 Oct": 10,
-            "M3 Nov": 11, "M3 Dic": 12,
-        }
+        try:
+            period = datetime.strptime(period_str[:7] + "-01", "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"error": "Formato inválido de periodo"}, status=status.HTTP_400_BAD_REQUEST)
 
-        pago_map = {
-            "Pag.Ene": 1, "Pag.Feb": 2, "Pag.Mar": 3, "Pag.Abr": 4, "Pag.May": 5,
-            "Pag.Jun": 6, "Pag.Jul": 7, "Pag.Ago": 8, "Pag.Set": 9, "Pag.Oct": 10,
-            "Pag.Nov": 11, "Pag.Dic": 12,
-        }
+        if not calle_id and not zona_id:
+            return Response({"error": "Debe indicar la calle o la zona de la ruta."}, status=status.HTTP_400_BAD_REQUEST)
 
-        deuda_map = {
-            "Enero": 1, "Febrero": 2, "Marzo": 3, "Abril": 4,
-            "Mayo": 5, "Junio": 6, "Julio": 7, "Agosto": 8,
-            "Setiembre": 9, "Octubre": 10, "Noviembre": 11, "Diciembre": 12,
-        }
+        try:
+            calle_id = int(calle_id) if calle_id else None
+            zona_id = int(zona_id) if zona_id else None
+        except (TypeError, ValueError):
+            return Response({"error": "Calle o zona inválida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "No se enviaron lecturas."}, status=status.HTTP_400_BAD_REQUEST)
+
+        readings, errores = capture_readings(
+            period,
+            rows,
+            calle_id=calle_id,
+            zona_id=zona_id,
+            dates={
+                "date_of_issue": request.data.get("date_of_issue"),
+                "date_of_due": request.data.get("date_of_due"),
+                "date_of_cute": request.data.get("date_of_cute"),
+            }
+        )
+
+        return Response({
+            "creados": len(readings),
+            "errores": errores
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def import_excel(self, request):
 
         file = request.FILES.get('file')
 
@@ -747,134 +503,19 @@ class ReadingViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             return Response({'error': 'No se proporciono un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            df = pd.read_excel(
-                file,
-                engine='openpyxl',
-                header=2,
-                dtype={'Codigo': str}
-            )
-        except Exception as e:
-            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        registros_creados = 0
-        
-        registros = []
-        debts = []
-        for index, row in df.iterrows():
-        
-            codigo = str(row.get('Codigo')).strip()
-            customer = Customer.objects.get(codigo=codigo)
-
-            for lect_col, month in month_map.items():
-
-                consumo_col = [c for c, m in consumo_map.items() if m == month][0]
-                deuda_col = [c for c, m in deuda_map.items() if m == month][0]
-                pago_col = [c for c, m in pago_map.items() if m == month][0]
-
-                current_reading = to_decimal_or_none(row.get(lect_col))
-                consumption = to_decimal_or_none(row.get(consumo_col))
-                deuda = to_decimal_or_none(row.get(deuda_col))
-                pago = to_decimal_or_none(row.get(pago_col))
-
-                # Si en este mes no hay lectura, consumo, deuda ni pago → cortamos
-                if not any([current_reading, consumption, deuda, pago]):
-                    break
+            if wants_dry_run(request.query_params):
+                batches = iter_batches(file, header=2, dtype={'Codigo': str})
+                return Response(ReadingFileValidator().validate_batches(batches).report(), status=status.HTTP_200_OK)
 
-                if consumption is not None:
-                    previous_reading = current_reading - consumption
-                else:
-                    previous_reading = Decimal("0.00")
-
-                if pago and pago > 0:
-                    total_amount = pago
-                    paid = True
-                elif deuda and deuda > 0:
-                    total_amount = deuda
-                    paid = False
-                else:
-                    total_amount = Decimal("0.00")
-                    paid = False
-
-                period_date = date(2025, month, 1)
-
-                try:
-                    cargo_fijo = CashConcept.objects.get(code="003")
-                except CashConcept.DoesNotExist:
-                    cargo_fijo = None
-
-                total_fixed_charge = cargo_fijo.total if cargo_fijo else Decimal("0.00")
-
-                registros.append(
-                    Reading(
-                        customer=customer,
-                        period=date(2025, month, 1),
-                        current_reading=current_reading or Decimal("0.00"),
-                        previous_reading=previous_reading or Decimal("0.00"),
-                        consumption=consumption or Decimal("0.00"),
-                        total_water = total_amount,
-                        total_sewer = customer.category.price_sewer,
-                        total_fixed_charge = total_fixed_charge,
-                        total_amount=total_amount + customer.category.price_sewer + total_fixed_charge,
-                        paid=paid
-                    )
-                )
-
-            # print(codigo,"------")
-
-        # Inserción masiva ignorando duplicados
-        with transaction.atomic():
-            
-            # Guardar primero los readings
-            Reading.objects.bulk_create(registros, ignore_conflicts=True)
-
-            readings = Reading.objects.all()
-
-            # 3. Preparar debts
-            debts = []
-            debt_details = []
-            conceptos = {
-                "001": CashConcept.objects.get(code="001"),
-                "002": CashConcept.objects.get(code="002"),
-                "003": CashConcept.objects.get(code="003"),
-            }
-
-            for reading in readings:
-                normalized_period = date(reading.period.year, reading.period.month, 1)
+            creados, errores = import_readings(file)
+        except WorkbookError as e:
+            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
-                debt = Debt(
-                    customer=reading.customer,
-                    period=normalized_period,
-                    description="Deuda por consumo de agua/desagüe",
-                    amount=reading.total_amount,
-                    reading=reading
-                )
-                debts.append(debt)
-
-            # 4. Insertar los debts en lote
-            Debt.objects.bulk_create(debts, ignore_conflicts=True)
-
-            # 5. Recuperar debts creados
-            debts = Debt.objects.filter(reading__in=readings)
-
-            # 6. Generar DebtDetails en lote
-            for debt in debts:
-                    r = debt.reading
-                    if r.total_water > 0:
-                        debt_details.append(
-                            DebtDetail(debt=debt, concept=conceptos["001"], amount=r.total_water)
-                        )
-                    if r.total_sewer > 0:
-                        debt_details.append(
-                            DebtDetail(debt=debt, concept=conceptos["002"], amount=r.total_sewer)
-                        )
-                    if r.total_fixed_charge > 0:
-                        debt_details.append(
-                            DebtDetail(debt=debt, concept=conceptos["003"], amount=r.total_fixed_charge)
-                        )
-
-            DebtDetail.objects.bulk_create(debt_details, ignore_conflicts=True)
-
-        return Response({"message": "Lecturas importadas correctamente"}, status=status.HTTP_200_OK)
+        return Response({
+            "message": "Lecturas importadas correctamente",
+            "creados": creados,
+            "errores": errores
+        }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'])
     def receipt(self, request, pk=None, **kwargs):
@@ -882,64 +523,22 @@ class ReadingViewSet(TenantSafeMixin,viewsets.ModelViewSet):
         Generar PDF de un solo recibo (para pruebas o impresion individual)
         """ 
    
-        reading = Reading.objects.filter(customer_id=pk).order_by('-period').first()
-        debt = Debt.objects.filter(customer_id=pk).order_by('-period').first()
+        reading = with_receipt_relations(Reading.objects.filter(customer_id=pk)).order_by('-period').first()
         if not reading:
 
             return Response({"error": "No hay lecturas registradas"}, status=404)
         
         company = Company.objects.first()
 
-        # obtener deudas anteriores no pagadas
-        previous_debts = Debt.objects.filter(
-            customer=reading.customer,
-            paid=False,
-            period__lt=reading.period
-        ).order_by("period")
-
-        # Agrupar por año
-        yearly_data = defaultdict(lambda: {"total": 0, "months": []})
-        for d in previous_debts:
-            year = d.period.year
-            month = d.period.month
-            yearly_data[year]["total"] += float(d.amount)
-            yearly_data[year]["months"].append(month)
-
-        grouped_debts = []
-        for year, data in yearly_data.items():
-            min_month = min(data["months"])
-            max_month = max(data["months"])
-            grouped_debts.append({
-                "year": year,
-                "total": f"{data['total']:.2f}",
-                "from_month": format_date(date(year, min_month, 1), "MMMM", locale="es").capitalize(),
-                "to_month": format_date(date(year, max_month, 1), "MMMM", locale="es").capitalize(),
-            })
-
-        grouped_debts.sort(key=lambda x: x["year"], reverse=True)
-
-        total_previous_debt = previous_debts.aggregate(total=Sum("amount"))["total"] or 0
-        total_general = reading.total_amount + total_previous_debt
-
-        # 🚀 armamos la misma estructura que en el masivo
-        readings_context = [{
-            "debt" : debt,
-            "reading": reading,
-            "grouped_debts": grouped_debts,
-            "total_previous_debt": total_previous_debt,
-            "total_general": total_general,
-        }]
-
-        print(readings_context)
-
-        html = render_to_string("agua/recibo.html", {
-            "readings_context": readings_context,
-            "company": company,
-        })
+        # 🚀 misma estructura que en el masivo
+        readings_context = build_receipts_context([reading])
 
-        pdf_bytes = HTML(string=html, base_url=request.build_absolute_uri('/')).write_pdf()
+        pdf_file = cached_receipts_pdf(
+            f"c{reading.customer_id}", readings_context, company,
+            lambda: render_receipts_pdf(readings_context, company, base_url=request.build_absolute_uri('/'))
+        )
 
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response = FileResponse(pdf_file, content_type="application/pdf")
         response["Content-Disposition"] = f'inline; filename=recibo_{reading.customer.codigo}_{reading.period.strftime("%Y-%m")}.pdf"'
         return response
     
@@ -967,43 +566,13 @@ class ReadingGenerationViewSet(TenantSafeMixin,viewsets.ModelViewSet):
         if ReadingGeneration.objects.filter(period=period_date).exists():
             return Response({"error": f"Ya se generaron lecturas para {period_str}."}, status=400)
 
-        customers = Customer.objects.filter(has_meter=False)
-        created = 0
-        skipped_existing = 0
-        skipped_paid = 0
-
-        for customer in customers:
-            # Verificar si ya tiene una lectura para ese periodo
-            existing_reading = Reading.objects.filter(customer=customer, period=period_date).first()
-            if existing_reading:
-                skipped_existing += 1
-                continue
-
-            # Verificar si ya tiene una deuda pagada de ese periodo
-            if Debt.objects.filter(customer=customer, period=period_date, paid=True).exists():
-                skipped_paid += 1
-                continue
-
-            tariff = customer.category
-
-            # Crear lectura
-            Reading.objects.create(
-                customer=customer,
-                period=period_date,
-                previous_reading=0,
-                current_reading=0,
-                consumption=0,
-                total_water=tariff.price_water,
-                total_sewer=tariff.price_sewer,
-                total_fixed_charge=tariff.price_fixed_charge,
-                total_amount=tariff.price_water + tariff.price_sewer + tariff.price_fixed_charge,
-                paid=False,
-                date_of_issue=request.data.get("date_of_issue"),
-                date_of_due=request.data.get("date_of_due"),
-                date_of_cute=request.data.get("date_of_cute")
-            )
-
-            created += 1
+        result = generate_flat_rate_readings(
+            period_date,
+            date_of_issue=request.data.get("date_of_issue"),
+            date_of_due=request.data.get("date_of_due"),
+            date_of_cute=request.data.get("date_of_cute")
+        )
+        created = result["created"]
 
         # Registrar la generación
         generation = ReadingGeneration.objects.create(
@@ -1019,8 +588,8 @@ class ReadingGenerationViewSet(TenantSafeMixin,viewsets.ModelViewSet):
         return Response({
             "message": f"Generación completada para {period_str}.",
             "total_creados": created,
-            "omitidos_existentes": skipped_existing,
-            "omitidos_pagados": skipped_paid
+            "omitidos_existentes": result["skipped_existing"],
+            "omitidos_pagados": result["skipped_paid"]
         }, status=201)
     
     @transaction.atomic
@@ -1058,43 +627,44 @@ class ReadingGenerationViewSet(TenantSafeMixin,viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download_receipts(self, request, pk=None):
         """
-        Descargar ZIP de recibos agrupados por zona para este periodo
+        Descargar ZIP de recibos agrupados por zona para este periodo.
+        El ZIP se envía mientras se genera: una zona a la vez.
         """
         generation = self.get_object()
-        readings = (
-            Reading.objects.filter(
-                period=generation.period,
-                customer__zona__isnull=False
-            )
-            .select_related("customer", "customer__zona")
-            .order_by("customer__zona__name", "customer__codigo")
+        readings = Reading.objects.filter(
+            period=generation.period,
+            customer__zona__isnull=False
         )
 
-        if not readings.exists():
+        zonas = list(
+            Zona.objects.filter(id__in=readings.values("customer__zona_id")).order_by("name")
+        )
+
+        if not zonas:
             return Response(
                 {"error": "No hay lecturas con zona asignada para este periodo"},
                 status=400
             )
 
-        buffer = io.BytesIO()
-        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            # Agrupar lecturas por zona
-            zonas = {}
-            for reading in readings:
-                zona_name = reading.customer.zona.name
-                zonas.setdefault(zona_name, []).append(reading)
+        company = Company.objects.first()
+        base_url = request.build_absolute_uri('/')
+        prefix = f"p{generation.period:%Y%m}"
 
+        def entries():
             # Generar 1 PDF por zona
-            for zona, zona_readings in zonas.items():
-                html_content = render_to_string(
-                    "agua/recibo.html",
-                    {"readings": zona_readings, "zona": zona}
+            for zona in zonas:
+                readings_context = build_receipts_context(
+                    readings.filter(customer__zona=zona).order_by("customer__codigo")
+                )
+                # Abierto antes de entregarlo: si luego se invalida o se
+                # desaloja de la caché, el ZIP no queda cortado
+                pdf_file = cached_receipts_pdf(
+                    prefix, readings_context, company,
+                    lambda: render_receipts_pdf(readings_context, company, base_url=base_url)
                 )
-                pdf_bytes = HTML(string=html_content).write_pdf()
-                zip_file.writestr(f"{zona}.pdf", pdf_bytes)
+                yield f"{zona.name}.pdf", pdf_file
 
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type="application/zip")
+        response = StreamingHttpResponse(stream_zip(entries()), content_type="application/zip")
         response["Content-Disposition"] = (
             f'attachment; filename="recibos_{generation.period.strftime("%Y-%m")}.zip"'
         )
@@ -1112,10 +682,11 @@ class ReadingGenerationViewSet(TenantSafeMixin,viewsets.ModelViewSet):
         
         calle_id = request.query_params.get("calle")
 
-        calle = Calle.objects.get(pk = calle_id)
+        calle = None
 
         if calle_id:
-            
+
+            calle = get_object_or_404(Calle, pk=calle_id)
             readings = readings.filter(customer__calle_id=calle_id)
 
         if not readings.exists():
@@ -1124,59 +695,18 @@ class ReadingGenerationViewSet(TenantSafeMixin,viewsets.ModelViewSet):
                 status=400
             )
 
-        all_readings_context = []
-        for reading in readings:
-
-            # obtener deudas anteriores no pagadas
-            previous_debts = Debt.objects.filter(
-                customer=reading.customer,
-                paid=False,
-                period__lt=reading.period
-            ).order_by("period")
-
-            # Agrupar por año
-            yearly_data = defaultdict(lambda: {"total": 0, "months": []})
-            for d in previous_debts:
-                year = d.period.year
-                month = d.period.month
-                yearly_data[year]["total"] += float(d.amount)
-                yearly_data[year]["months"].append(month)
-
-            grouped_debts = []
-            for year, data in yearly_data.items():
-                min_month = min(data["months"])
-                max_month = max(data["months"])
-                grouped_debts.append({
-                    "year": year,
-                    "total": f"{data['total']:.2f}",
-                    "from_month": format_date(date(year, min_month, 1), "MMMM", locale="es").capitalize(),
-                    "to_month": format_date(date(year, max_month, 1), "MMMM", locale="es").capitalize(),
-                })
-
-            grouped_debts.sort(key=lambda x: x["year"], reverse=True)
-
-            total_previous_debt = previous_debts.aggregate(total=Sum("amount"))["total"] or 0
-            total_general = reading.total_amount + total_previous_debt
-
-            all_readings_context.append({
-                "reading": reading,
-                "grouped_debts": grouped_debts,
-                "total_previous_debt": total_previous_debt,
-                "total_general": total_general,
-            })
+        all_readings_context = build_receipts_context(readings.order_by("customer__codigo"))
 
-        # Renderizamos todos los recibos (un reading por página)
-        html_content = render_to_string("agua/recibo.html", {
-            "readings_context": all_readings_context,
-            "company": company,
-        })
-
-        pdf_bytes = HTML(string=html_content, base_url=request.build_absolute_uri('/')).write_pdf()
+        # Renderizamos todos los recibos (un reading por página), por bloques en paralelo; si no cambió nada se reusa el PDF en caché
+        pdf_file = cached_receipts_pdf(
+            f"p{generation.period:%Y%m}", all_readings_context, company,
+            lambda: render_receipts_pdf(all_readings_context, company, base_url=request.build_absolute_uri('/'))
+        )
 
         # Devolvemos directamente el PDF
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response = FileResponse(pdf_file, content_type="application/pdf")
         response["Content-Disposition"] = (
-            f'attachment; filename="{calle.name}_{generation.period.strftime("%Y-%m")}.pdf"'
+            f'attachment; filename="{calle.name if calle else "recibos"}_{generation.period.strftime("%Y-%m")}.pdf"'
         )
 
         return response
@@ -1211,16 +741,13 @@ class DebtViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             raise ValidationError("Ya existe una deuda para este cliente y periodo.")
 
         # Obtener conceptos
-        conceptos = {
-            "001": CashConcept.objects.get(code="001"),  # Agua
-            "002": CashConcept.objects.get(code="002"),  # Desagüe
-            "003": CashConcept.objects.get(code="003"),  # Cargo fijo
-        }
+        conceptos = load_detail_concepts()  # Agua, Desagüe, Cargo fijo
 
         # Calcular montos base
-        total_fixed_charge = customer.category.price_fixed_charge
-        total_water = customer.category.price_water
-        total_sewer = customer.category.price_sewer
+        tariff = get_registry().category(customer.category_id)
+        total_fixed_charge = tariff.price_fixed_charge
+        total_water = tariff.price_water
+        total_sewer = tariff.price_sewer
         total_amount = total_water + total_sewer + total_fixed_charge
 
         # ✅ Crear lectura asociada (sin procesos automáticos)
@@ -1306,101 +833,13 @@ class DebtViewSet(TenantSafeMixin,viewsets.ModelViewSet):
             return Response({'error': 'No se proporciono un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            df = pd.read_excel(
-                file,
-                engine='openpyxl',
-                header=2,
-                dtype={'Codigo': str}
-            )
-        except Exception as e:
-            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        errores = []
-        procesados = 0
-
-        # 🔹 Precargar conceptos
-        conceptos = {
-            "001": CashConcept.objects.get(code="001"),
-            "002": CashConcept.objects.get(code="002"),
-            "003": CashConcept.objects.get(code="003"),
-        }
+            if wants_dry_run(request.query_params):
+                batches = iter_batches(file, header=2, dtype={'Codigo': str})
+                return Response(DebtFileValidator().validate_batches(batches).report(), status=status.HTTP_200_OK)
 
-        # 🔹 Precargar clientes del Excel
-        codigos_excel = df['Codigo'].astype(str).unique()
-        clientes = {c.codigo: c for c in Customer.objects.filter(codigo__in=codigos_excel)}
-
-        debts_to_create = []
-        details_to_create = []
-
-        try:
-
-            cargo_fijo = CashConcept.objects.get(code="003")
-
-        except CashConcept.DoesNotExist:
-
-            cargo_fijo = None
-
-        total_fixed_charge = cargo_fijo.total if cargo_fijo else Decimal("0.00")
-
-        for row in df.itertuples(index=False):
-            codigo = str(row.Codigo)
-            year = row.Año
-            meses_texto = to_none_if_empty(row.Meses)
-            total = to_decimal_or_none(row.Agua)
-
-            if year != 2025:
-                if not meses_texto:
-                    errores.append({"codigo": codigo, "anio": year, "total": total, "error": "Campo 'Meses' vacio"})
-                    continue
-
-                customer = clientes.get(codigo)
-                if not customer:
-                    errores.append({"codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": "Cliente no encontrado"})
-                    continue
-
-                try:
-                    periodos = generar_periodos(int(year), meses_texto)
-                except Exception as e:
-                    errores.append({"codigo": codigo, "anio": year, "meses": meses_texto, "total": total, "error": f"Error al generar periodos: {str(e)}"})
-                    continue
-
-                # Calcular montos con precisión decimal
-                total_water = (Decimal(total) / Decimal(len(periodos))) if (total and len(periodos) > 0) else Decimal("0.00")
-                total_sewer = Decimal(customer.category.price_sewer or 0)
-                total_fixed_charge = Decimal(total_fixed_charge or 0)
-
-                amount = total_water + total_sewer + total_fixed_charge
-
-                for periodo in periodos:
-                    # 🔹 Obtener o crear debt en memoria, no en DB aún
-                    debt, created = Debt.objects.get_or_create(
-                        customer=customer,
-                        period=periodo,
-                        defaults={
-                            "description": "Deuda importada desde Excel",
-                            "amount": amount,
-                            "paid": False
-                        }
-                    )
-
-                    if not created:
-                        debt.amount = amount
-                        debt.save()
-                        debt.details.all().delete()
-
-                    # 🔹 Preparar detalles para bulk_create
-                    if total_water > 0:
-                        details_to_create.append(DebtDetail(debt=debt, concept=conceptos["001"], amount=total_water))
-                    if total_sewer > 0:
-                        details_to_create.append(DebtDetail(debt=debt, concept=conceptos["002"], amount=total_sewer))
-                    if total_fixed_charge > 0:
-                        details_to_create.append(DebtDetail(debt=debt, concept=conceptos["003"], amount=total_fixed_charge))
-
-                    procesados += 1
-
-        # 🔹 Insertar todos los detalles de una vez
-        if details_to_create:
-            DebtDetail.objects.bulk_create(details_to_create)
+            procesados, errores = import_debts(file)
+        except WorkbookError as e:
+            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
             "procesados": procesados,
@@ -1465,18 +904,10 @@ class InvoiceViewSet(TenantSafeMixin, viewsets.ModelViewSet):
             "company_logo": None
         }
 
-        template = get_template('agua/invoice.html')
-        html_string = template.render(context)
-
-        pdf_buffer = io.BytesIO()
-   
-        HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(
-            pdf_buffer
-        )
+        pdf = render_pdf('agua/invoice.html', context, stylesheets=TICKET_STYLESHEETS, base_url=request.build_absolute_uri())
 
         file_name = f"ticket_{invoice.id}.pdf"
-        pdf_buffer.seek(0)
-        response = HttpResponse(pdf_buffer.read(), content_type="application/pdf")
+        response = HttpResponse(pdf, content_type="application/pdf")
         response["Content-Disposition"] = f'inline; filename="{file_name}"'
         return response
 
@@ -1512,45 +943,40 @@ class CategoryViewSet(TenantSafeMixin,viewsets.ModelViewSet):
 
             return Response({'error': 'No se proporciono un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-
-            extension = os.path.splitext(file.name)[1].lower()
-
-            if extension == ".xls":
+        extension = os.path.splitext(file.name)[1].lower()
 
-                df = pd.read_excel(file, engine="xlrd", dtype={'codigo': str})
+        if extension not in (".xls", ".xlsx", ".csv"):
 
-            elif extension == ".xlsx":
+            return Response({'error': 'Formato no soportado. Solo .xls, .xlsx o .csv'}, status=status.HTTP_400_BAD_REQUEST)
 
-                df = pd.read_excel(file, engine="openpyxl", dtype={'codigo': str})
+        dtype = {'codigo': str}
 
-            else:
+        try:
 
-                return Response({'error': 'Formato no soportado. Solo .xls o .xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+            if wants_dry_run(request.query_params):
+                batches = iter_batches(file, dtype=dtype)
+                return Response(CategoryFileValidator().validate_batches(batches).report(), status=status.HTTP_200_OK)
 
-        except Exception as e:
+            for index, row in sorted_rows(file, 'codigo', dtype=dtype):
 
-            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+                codigo = str(row.get('codigo')).zfill(2)  # Siempre 2 dígitos
+                descrip = row.get('descrip')
+                agua = row.get('agua')
 
-        for index, row in df.sort_values(by='codigo').iterrows():
-
-            codigo = str(row.get('codigo')).zfill(2)  # Siempre 2 dígitos
-            descrip = row.get('descrip')
-            agua = row.get('agua')
-
-            # Crear o actualizar registro
-            Category.objects.update_or_create(
-                codigo=codigo,
-                defaults={
-                    'name': descrip,
-                    'price_water': agua,
-                    'price_sewer': 0,  # Si tu Excel no trae alcantarillado
-                    'has_meter': False  # Si quieres poner un valor por defecto
-                }
-            )
+                # Crear o actualizar registro
+                Category.objects.update_or_create(
+                    codigo=codigo,
+                    defaults={
+                        'name': descrip,
+                        'price_water': agua,
+                        'price_sewer': 0,  # Si tu Excel no trae alcantarillado
+                        'has_meter': False  # Si quieres poner un valor por defecto
+                    }
+                )
 
-            print(f"Importado: {codigo} - {descrip} - {agua}")
+        except WorkbookError as e:
 
+            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"message":"ubicacion cargada"}, status=status.HTTP_200_OK)
 
@@ -1571,63 +997,61 @@ class ViaViewSet(TenantSafeMixin,viewsets.ModelViewSet):
 
             return Response({'error': 'No se proporciono un archivo.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        dtype = {'tipo_dir': str, 'codigo': str}
+
         try:
-        
-            df = pd.read_excel(
-                    file,
-                    engine='openpyxl',
-                    dtype={
-                        'tipo_dir': str,
-                        'codigo': str
-                    })
 
-        except Exception as e:
+            if wants_dry_run(request.query_params):
+                batches = iter_batches(file, dtype=dtype)
+                return Response(StreetFileValidator().validate_batches(batches).report(), status=status.HTTP_200_OK)
 
-            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            # Primera pasada: vías
+            for fila, row in sorted_rows(file, 'tipo_dir', dtype=dtype):
+                name = row.get('abrv')
+                codigo = str(row.get('tipo_dir')).zfill(2)  # Siempre 2 dígitos
 
-        for index, row in df.sort_values(by='tipo_dir').iterrows():
-            name = row.get('abrv')
-            codigo = str(row.get('tipo_dir')).zfill(2)  # Siempre 2 dígitos
+                if Via.objects.filter(codigo=codigo).exists():
+                    continue
 
-            if Via.objects.filter(codigo=codigo).exists():
-                continue
+                via = Via(name=name, codigo=codigo)
+                via.save()
 
-            via = Via(name=name, codigo=codigo)
-            via.save()
+            # Segunda pasada: calles
+            errores = []
 
-        df = df.sort_values(by=['codigo'], ascending=True)
-        for index, row in df.iterrows():
+            for fila, row in sorted_rows(file, 'codigo', dtype=dtype):
 
-            codigo = str(row.get('codigo') or '').strip()
-            name = str(row.get('nombre') or '').strip()
-            codigo_via = str(row.get('tipo_dir') or '').strip()
-            # print(codigo_via)
+                codigo = str(row.get('codigo') or '').strip()
+                name = str(row.get('nombre') or '').strip()
+                codigo_via = str(row.get('tipo_dir') or '').strip()
 
-            if not name or not codigo_via:
-                
-               print(f'Fila {index + 2}: calle invalida (nombre o id_via vacio)')
-               continue
+                if not name or not codigo_via:
 
-            try:
+                    errores.append({"fila": fila, "codigo": codigo, "error": "Calle inválida (nombre o id_via vacío)"})
+                    continue
 
-                via = Via.objects.get(codigo=codigo_via)
+                try:
 
-            except Via.DoesNotExist:
+                    via = Via.objects.get(codigo=codigo_via)
 
-                print(f'Fila {index + 2}: via con codigo {codigo_via} no existe (para la calle "{name}")')
+                except Via.DoesNotExist:
 
-                continue
+                    errores.append({"fila": fila, "codigo": codigo, "error": f'La vía con código {codigo_via} no existe (para la calle "{name}")'})
+                    continue
 
-            if Calle.objects.filter(name=name, via=via).exists():
+                if Calle.objects.filter(name=name, via=via).exists():
 
-                print(f'Fila {index + 2}: ya existe la calle "{name}" en la via {via.name}')
-                continue
+                    errores.append({"fila": fila, "codigo": codigo, "error": f'Ya existe la calle "{name}" en la vía {via.name}'})
+                    continue
 
-            calle = Calle(name=name, via=via, codigo=codigo)
-            calle.save()
-    
+                calle = Calle(name=name, via=via, codigo=codigo)
+                calle.save()
 
-        return Response({"message":"ubicacion cargada"}, status=status.HTTP_200_OK)
+        except WorkbookError as e:
+
+            return Response({'error': f'Error al leer el archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "ubicacion cargada", "errores": errores}, status=status.HTTP_200_OK)
 
 class CalleViewSet(TenantSafeMixin,viewsets.ModelViewSet):
 